@@ -0,0 +1,111 @@
+'''
+    GMRES preconditioned by ILU vs. by the spanning tree preconditioner (simulator.preconditioner)
+
+    on GasLib40 (modified) and on synthetic grids of pipes: fully meshed ones and parallel pipelines with sparse cross
+    connections (closer to transmission networks). Each preconditioner is built once from the jacobian
+    of a state and applied to the jacobians of drifting states (as during Newton iterations and time steps).
+'''
+
+import numpy as np
+from scipy.sparse.linalg import gmres, spilu, LinearOperator
+
+from simulator.readerWriter.read_config_yaml import configuration
+from simulator.readerWriter.read_net_yaml import retrieve_topo_yaml, create_net
+from simulator.readerWriter.read_inic_csv import retrieve_inic_csv, create_inic
+from simulator.readerWriter.read_scene_csv import set_scenario_csv
+from simulator.resources.auxiliary import no_logger
+from simulator.preconditioner import spanning_tree_preconditioner
+
+from ad.timer import Timer
+
+
+''' provide path to configuration'''
+configPath = 'dumpedInput/g40.config.simulation.yaml'
+
+
+def grid_topology(dictTopo : dict, rows : int, cols : int, length : float = 5000.0, cross_density : float = 1.0) -> dict:
+    '''
+        :param dictTopo: *.net.yaml of GasLib40 (for the gas properties)
+        :param cross_density: probability of each pipe between neighbouring rows (the first column connects all rows)
+        :return: *.net.yaml of a rows x cols grid of pipes
+    '''
+    nodes = [{'id' : {'value' : f'N{i}_{j}'}, 'height' : {'unit' : 'm', 'value' : 0.0},
+              'x' : {'value' : length*j}, 'y' : {'value' : length*i}} for i in range(rows) for j in range(cols)]
+
+    rng = np.random.default_rng(0)
+    pipes = []
+    for i in range(rows):
+        for j in range(cols):
+            for (k, l) in [(i, j + 1), (i + 1, j)]:
+                if (k >= rows) or (l >= cols): continue
+                if (k > i) and (j > 0) and (rng.uniform() >= cross_density): continue
+                pipes.append({'id' : {'value' : f'P{i}_{j}-{k}_{l}'}, 'from' : {'value' : f'N{i}_{j}'},
+                              'to' : {'value' : f'N{k}_{l}'},
+                              'length' : {'unit' : 'm', 'value' : length*rng.uniform(0.5, 1.5)},
+                              'diameter' : {'unit' : 'm', 'value' : 1.0},
+                              'roughness' : {'unit' : 'm', 'value' : 5.0e-05}})
+
+    grid = {key : value for key, value in dictTopo.items() if not (key in ('arcsPerType', 'nodesPerType'))}
+    grid['name'] = f'grid_{rows}x{cols}'
+    grid['arcsPerType'] = {'pipe' : pipes}
+    grid['nodesPerType'] = {'innode' : nodes}
+    return grid
+
+
+def drifting_jacobians(net, x, H : float, num : int = 5, drift : float = 1.0e-2):
+    rng = np.random.default_rng(1)
+    direction = rng.normal(size = x.shape)*(1.0 + abs(x))
+    dx = np.zeros(shape = x.shape)
+    return [net.jacobian(dx, x + (k*drift)*direction, 0.0, 1.0/H) for k in range(num + 1)]
+
+
+def benchmark(name : str, jacobians, preconditioners : dict):
+    A0 = jacobians[0]
+    b = np.random.default_rng(2).normal(size = A0.shape[0])
+    print(f'{name}: dim = {A0.shape[0]}, nnz = {A0.nnz}')
+
+    for prec_name, build in preconditioners.items():
+        with Timer(prec_name, silent_mode = True) as setup_time: M = build(A0)
+        M = LinearOperator(A0.shape, matvec = M)
+
+        iterations = []
+        with Timer(prec_name, silent_mode = True) as solve_time:
+            for A in jacobians:
+                count = [0]
+                def callback(*args): count[0] += 1
+                x, info = gmres(A, b, M = M, rtol = 1.0e-10, atol = 0.0, restart = 50, maxiter = 200,
+                                callback = callback, callback_type = 'pr_norm')
+                iterations.append(count[0] if info == 0 else None)
+
+        print(f'\t{prec_name:>6}: setup {setup_time.time_msg}, solves {solve_time.time_msg}, '
+              f'GMRES iterations (drifting states): {iterations}')
+
+
+if __name__ == "__main__":
+    config = configuration(path_config_yaml = configPath)
+    dictTopo = retrieve_topo_yaml(config = config)
+
+    ''' GasLib40 '''
+    net = create_net(dictTopo = dictTopo, config = config, logger = no_logger())
+    x0 = create_inic(net = net, dictInic = retrieve_inic_csv(config = config))
+    set_scenario_csv(net = net, config = config)
+    jacobians = drifting_jacobians(net, x0, H = 180.0)
+    benchmark('GasLib40', jacobians,
+              {'ILU' : lambda A: spilu(A.tocsc(), drop_tol = 1.0e-5, fill_factor = 10.0).solve,
+               'tree' : spanning_tree_preconditioner(net)})
+
+    ''' synthetic meshed grids of pipes '''
+    for rows, cols, cross_density in [(10, 10, 1.0), (20, 20, 1.0), (40, 40, 1.0),
+                                      (20, 20, 0.1), (40, 40, 0.05), (40, 100, 0.02)]:
+        net = create_net(dictTopo = grid_topology(dictTopo, rows, cols, cross_density = cross_density),
+                         config = config, logger = no_logger())
+        for idx, nodeInstance in enumerate(net.typeReg['node']): # one pressure boundary, flow boundaries elsewhere
+            nodeInstance.behaviour = 0 if idx == 0 else 1
+            if idx == 0: nodeInstance.pBoundFunc = lambda *args, **kwargs: 70.0
+        x0 = create_inic(net = net, deadPressure = 70.0)
+        jacobians = drifting_jacobians(net, x0, H = 180.0)
+        benchmark(f'grid {rows}x{cols} (cross density {cross_density})', jacobians,
+                  {'ILU' : lambda A: spilu(A.tocsc(), drop_tol = 1.0e-5, fill_factor = 10.0).solve,
+                   'tree' : spanning_tree_preconditioner(net)})
+
+    print('script finished')
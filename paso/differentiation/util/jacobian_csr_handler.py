@@ -11,12 +11,13 @@ __credits__ = ('Lennart Jansen',) # alphabetical order of surnames
     imports
     =======
 '''
+import heapq
 import numpy as np
 from scipy.sparse import csr_matrix
 
 from paso.util.types_and_errors import Vec_t, CsrMatrix_t
 
-from typing import Callable, Optional, List, Tuple, Set, Union, Sequence
+from typing import Callable, Optional, List, Tuple, Sequence
 
 
 '''
@@ -36,11 +37,23 @@ class jac_csr(object):
                  dfun : Optional[Callable[[Vec_t], Vec_t]] = None,
                  indices : Optional[Vec_t] = None,
                  indptr : Optional[Vec_t] = None,
-                 always_to_scipy : Optional[bool] = True):
+                 always_to_scipy : Optional[bool] = True,
+                 batched : Optional[bool] = False):
         self.fun : Callable[[Vec_t], Vec_t] = fun
         self.dfun : Optional[Callable[[Vec_t], Vec_t]] = dfun # assuming that self.fun(x0) updates self.dfun, too
 
-        self.precision : float = 1.0e-8
+        self.precision : float = 1.0e-8         # relative step size of forward differences
+        self.precision_central : float = 6.0e-6 # relative step size of central differences
+        self.central_differences : bool = False
+
+        self.ordering : str = 'smallest-last' # column ordering of the coloring: 'smallest-last', 'incidence-degree' or 'natural'
+        self.colors : Optional[Vec_t] = None  # color of each column
+        self.num_colors : int = 0
+        self._color_slots : List[Tuple[Vec_t, Vec_t]] = [] # per color: slots of self.data and the rows they are read from
+        self._slot_colors : Optional[Vec_t] = None # color of the column of each slot of self.data
+        self._slot_rows : Optional[Vec_t] = None   # row of each slot of self.data
+
+        self.batched : bool = batched # fun maps a (num_colors, dim_x) batch of states onto (num_colors, dim_f) rows at once
 
         self.shape : Tuple[int, int] = shape
 
@@ -82,38 +95,94 @@ class jac_csr(object):
 
     def row(self, i : int): return self.data[self.indptr[i]:self.indptr[i + 1]]
 
-    def _get_input_to_output_relation(self) -> List[Set[int]]:
-        x_contributes_to_f : List[Set[int]] = [set() for j in range(self.dim_x)]
+    def _column_intersection_graph(self) -> csr_matrix:
+        '''
+            :return: adjacency of the column intersection graph, i.e. columns j and k are adjacent iff they share a row
+        '''
+        pattern = csr_matrix((np.ones(shape = (len(self.indices),)), self.indices, self.indptr), shape = self.shape)
+        adjacency = (pattern.T @ pattern).tocsr()
+        adjacency.setdiag(0.0)
+        adjacency.eliminate_zeros()
+        return adjacency
 
-        for i in range(self.dim_f):
-            for j in self.f_depends_on_x(i): x_contributes_to_f[j].add(i)
+    @staticmethod
+    def _vertex_ordering(adjacency : csr_matrix, ordering : str) -> np.ndarray:
+        '''
+            :param adjacency: symmetric adjacency matrix of the column intersection graph
+            :param ordering: 'smallest-last', 'incidence-degree' or 'natural'
+            :return: order in which the greedy coloring visits the columns
+        '''
+        num_vertices = adjacency.shape[0]
+        if ordering == 'natural': return np.arange(num_vertices, dtype = np.intp)
+
+        indices, indptr = adjacency.indices, adjacency.indptr
+        degrees = np.diff(indptr)
+
+        if ordering == 'smallest-last': # repeatedly remove a vertex of smallest degree; colored in reversed order
+            keys, delta, sign = degrees.copy(), -1, 1
+        elif ordering == 'incidence-degree': # repeatedly pick a vertex with most already picked neighbours
+            keys, delta, sign = np.zeros(shape = (num_vertices,), dtype = degrees.dtype), 1, -1
+        else: raise ValueError("unknown ordering '{}'!".format(ordering))
+
+        ''' lazy heap: entries with outdated keys are skipped; ties are broken by the degree (largest first) '''
+        heap = list(zip((sign*keys).tolist(), (-degrees).tolist(), range(num_vertices)))
+        heapq.heapify(heap)
+        keys = keys.tolist()
+        done = np.zeros(shape = (num_vertices,), dtype = bool)
+
+        sequence : List[int] = []
+        while heap:
+            key, neg_degree, vertex = heapq.heappop(heap)
+            if done[vertex] or (key != sign*keys[vertex]): continue
+            done[vertex] = True
+            sequence.append(vertex)
+
+            neighbours = indices[indptr[vertex]:indptr[vertex + 1]]
+            for neighbour in neighbours[~done[neighbours]].tolist():
+                keys[neighbour] += delta
+                heapq.heappush(heap, (sign*keys[neighbour], -int(degrees[neighbour]), neighbour))
+
+        if ordering == 'smallest-last': sequence.reverse()
+        return np.array(sequence, dtype = np.intp)
 
-        return x_contributes_to_f
+    @staticmethod
+    def _greedy_coloring(adjacency : csr_matrix, sequence : np.ndarray) -> np.ndarray:
+        '''
+            :param adjacency: symmetric adjacency matrix of the column intersection graph
+            :param sequence: order in which the columns are colored
+            :return: smallest color (w.r.t. the already colored neighbours) of each column
+        '''
+        indices, indptr = adjacency.indices, adjacency.indptr
+
+        colors = np.full(shape = (adjacency.shape[0],), fill_value = -1, dtype = np.intp)
+        stamp = np.full(shape = (adjacency.shape[0] + 1,), fill_value = -1, dtype = np.intp) # stamp[c] == j: c is taken
+        for j in sequence.tolist():
+            neighbour_colors = colors[indices[indptr[j]:indptr[j + 1]]]
+            stamp[neighbour_colors[neighbour_colors >= 0]] = j
+            colors[j] = np.argmax(stamp != j)
+
+        return colors
 
     def update_directions(self):
-        x_contributes_to_f : List[Union[None, Set[int]]] = self._get_input_to_output_relation()
-
-        i_of_dirs : List[Set[int]] = []
-        j_of_dirs : List[Set[int]] = []
-        for j in range(self.dim_x):
-            for idx_dir, i_of_dir in enumerate(i_of_dirs):
-                if len(x_contributes_to_f[j].intersection(i_of_dir)) == 0:
-                    i_of_dirs[idx_dir] = i_of_dir.union(x_contributes_to_f[j]) # disjunctive union
-                    j_of_dirs[idx_dir].add(j)
-                    break
-            else:
-                i_of_dirs.append(x_contributes_to_f[j])
-                j_of_dirs.append({j})
-            x_contributes_to_f[j] = None # free memory
-        del x_contributes_to_f # free memory
-        del i_of_dirs # free memory
-
-        self.dirs = []
-        for idx_dir, j_of_dir in enumerate(j_of_dirs):
-            dir_new = np.zeros(shape = (self.dim_x,))
-            for j in j_of_dir: dir_new[j] = 1.0
-            self.dirs.append(dir_new)
-        del j_of_dirs # free memory
+        '''
+            groups the columns by a distance-2 coloring of the sparsity pattern (columns of the same color don't share
+            any row) and precomputes for each color the slots of the data array together with the rows they are read
+            from.
+        '''
+        self.indices = np.asarray(self.indices, dtype = np.intp)
+        self.indptr = np.asarray(self.indptr, dtype = np.intp)
+
+        adjacency = self._column_intersection_graph()
+        self.colors = self._greedy_coloring(adjacency, self._vertex_ordering(adjacency, self.ordering))
+        self.num_colors = int(self.colors.max()) + 1 if self.dim_x > 0 else 0
+
+        self._slot_rows = np.repeat(np.arange(self.dim_f, dtype = np.intp), np.diff(self.indptr))
+        self._slot_colors = self.colors[self.indices]
+        slots = np.argsort(self._slot_colors, kind = 'stable')
+        splits = np.searchsorted(self._slot_colors[slots], np.arange(1, self.num_colors))
+        self._color_slots = [(slots_c, self._slot_rows[slots_c]) for slots_c in np.split(slots, splits)]
+
+        self.dirs = [(self.colors == color).astype(np.float64) for color in range(self.num_colors)]
 
         self.data = np.zeros(shape = (self.indptr[-1],))
 
@@ -126,17 +195,46 @@ class jac_csr(object):
         if f0 is None: f0 = fun(x0)
         return (fun(x0 + h*direction) - f0)/h, f0
 
+    def steps(self, x0 : Vec_t) -> Vec_t:
+        '''
+            :param x0: point of evaluation
+            :return: per column step sizes scaled to max(1, |x0_j|) and rounded such that (x0_j + h_j) - x0_j == h_j
+        '''
+        precision = self.precision_central if self.central_differences else self.precision
+        h = precision*np.maximum(1.0, abs(x0))
+        return (x0 + h) - x0
+
+    def _batched_differences(self, x0 : Vec_t, h : Vec_t) -> Vec_t:
+        '''
+            evaluates all colors by one call of fun on the stacked (num_colors, dim_x) states
+
+            :return: differences of fun for all slots of self.data (not yet divided by the step sizes)
+        '''
+        steps = h*np.array(self.dirs).reshape(self.num_colors, self.dim_x)
+        if self.central_differences: differences = self.fun(x0 + steps) - self.fun(x0 - steps)
+        else: differences = self.fun(x0 + steps) - self.fun(x0)
+        return differences[self._slot_colors, self._slot_rows]
+
     def __call__(self, x0 : Vec_t) -> CsrMatrix_t:
-        f0 = self.fun(x0)
-        for idx_dir, direction in enumerate(self.dirs):
-            if self.dfun is None: directional_derivative, _ = self.finite_diff(fun = self.fun, x0 = x0,
-                                                                               direction = direction,
-                                                                               h = self.precision, f0 = f0)
-            else: directional_derivative = self.dfun(direction)
-            for i in range(self.dim_f):
-                for idx_j, j in enumerate(self.f_depends_on_x(i)):
-                    if direction[j] != 0.0: self.row(i)[idx_j] = directional_derivative[i]
+        data = np.empty(shape = (self.indptr[-1],))
+
+        if self.dfun is None:
+            h = self.steps(x0)
+            if self.batched: data[:] = self._batched_differences(x0, h)
+            else:
+                if not self.central_differences: f0 = self.fun(x0)
+                for direction, (slots_c, rows_c) in zip(self.dirs, self._color_slots):
+                    step = h*direction
+                    if self.central_differences: difference = self.fun(x0 + step) - self.fun(x0 - step)
+                    else: difference = self.fun(x0 + step) - f0
+                    data[slots_c] = difference[rows_c]
+            data /= (2.0*h[self.indices]) if self.central_differences else h[self.indices]
+        else:
+            self.fun(x0) # assuming that self.fun(x0) updates self.dfun, too
+            for direction, (slots_c, rows_c) in zip(self.dirs, self._color_slots):
+                data[slots_c] = self.dfun(direction)[rows_c]
 
+        self.data = data
         if self.always_to_scipy: return csr_matrix((self.data, self.indices, self.indptr), shape = self.shape)
         return ('csr', self.data, self.indices, self.indptr, self.shape)
 
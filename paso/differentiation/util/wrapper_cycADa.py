@@ -8,7 +8,10 @@ from ad.cycADa import tape, adFloat # necessary import for AD with cycADa
     construct jacobian function of collocation method by cycADa
 '''
 
-def cycADa_wrapper(fun, ndim, return_jac_dense = False):
+def cycADa_wrapper(fun, ndim, return_jac_dense = False, return_fwd = False):
+    '''
+        :param return_fwd: additionally return (x, v) -> J(x)*v by a forward sweep (e.g. for Jacobian-free Newton-Krylov)
+    '''
     trace = tape(num_of_sets = 1, ignore_kinks = True)     # initialize cycADa and cycADa tape structure
 
     x_ad = np.array([adFloat(trace) for _ in range(ndim)]) # initialize overloaded tracing variables
@@ -16,6 +19,7 @@ def cycADa_wrapper(fun, ndim, return_jac_dense = False):
 
     trace.declare_dependent(f_ad)                          # mark output as dependent
     trace.allocJac(False)                                  # allocate cycADa memory for Jacobian
+    if return_fwd: trace.allocFwdVec()                     # allocate cycADa memory for forward sweeps
 
     def fun_ad(x):
         trace(x)
@@ -30,4 +34,111 @@ def cycADa_wrapper(fun, ndim, return_jac_dense = False):
         if return_jac_dense: return CSR_jac.toarray()
         return CSR_jac
 
+    def fun_fwd(x, v):
+        trace.fwd(x, _fwd_increment(trace, v))
+        return _fwd_result(trace)
+
+    if return_fwd: return fun_ad, fun_jac_csr, fun_fwd
     return fun_ad, fun_jac_csr
+
+
+def _fwd_increment(trace, v):
+    return np.concatenate([np.asarray(v, dtype = np.float64), np.zeros(shape = (trace.s,))]) # no increments of kinks
+
+
+def _fwd_result(trace):
+    return np.array(trace.fwd_vec)[-trace.m:] # (switching variables and) dependents
+
+
+'''
+    record the step function of implicit time integrators once and re-evaluate it for many steps
+'''
+
+class cycADa_tape_cache(object):
+
+    def __init__(self, sys_func, ndim, signature = None):
+        '''
+            records x -> sys_func(c*x + r, x, t) on a cycADa tape, where x are the independent variables and r, c
+            (and t if no signature is given) are tape parameters. Hence, the same tape serves all time steps, i.e.
+            all x_n, h and t of e.g. implicit Euler (c = 1/h, r = -x_n/h).
+
+            :param sys_func: system function of a DAE in standard form, i.e. 0 = sys_func(dx, x, t)
+            :param ndim: dimension of x
+            :param signature: (optional) callable: t -> hashable. If given, t is passed as float to sys_func and
+                              thus all t-dependent values (e.g. profile values or branches of cond_assign) are baked
+                              into the tape as constants. The tape is re-recorded whenever signature(t) changes.
+        '''
+        self.sys_func = sys_func
+        self.ndim = ndim
+        self.signature = signature
+
+        self.trace = None
+        self.f_ad = None
+        self._signature_val = None
+        self._point = None
+
+        self.num_of_recordings : int = 0
+        self.num_of_reuses : int = 0
+
+    @property
+    def t_is_param(self): return self.signature is None
+
+    def _record(self, t):
+        trace = tape(num_of_sets = 1, ignore_kinks = True)
+
+        x_ad = np.array([adFloat(trace, [True]) for _ in range(self.ndim)])  # independent variables
+        r_ad = np.array([adFloat(trace, [False]) for _ in range(self.ndim)]) # parameters
+        c_ad = adFloat(trace, [False])                                       # parameter
+        t_ad = adFloat(trace, [False]) if self.t_is_param else t             # parameter or baked in constant
+
+        f_ad = self.sys_func(x_ad*c_ad + r_ad, x_ad, t_ad)
+
+        trace.declare_dependent(f_ad)
+        trace.allocJac(False)
+        trace.allocFwdVec()
+
+        self.trace = trace
+        self.f_ad = f_ad
+        self._point = np.zeros(shape = (2*self.ndim + (2 if self.t_is_param else 1),)) # order of creation above
+        self.num_of_recordings += 1
+
+    def __call__(self, c : float, r, t : float, return_fwd : bool = False):
+        '''
+            :param c: scalar coefficient of x in dx = c*x + r
+            :param r: vector offset in dx = c*x + r
+            :param t: time point
+            :param return_fwd: additionally return (x, v) -> J(x)*v by a forward sweep
+            :return: function and its jacobian (csr) of x -> sys_func(c*x + r, x, t)
+        '''
+        signature_val = None if self.signature is None else self.signature(t)
+        if (self.trace is None) or (signature_val != self._signature_val):
+            self._record(t)
+            self._signature_val = signature_val
+        else: self.num_of_reuses += 1
+
+        n = self.ndim
+        trace, f_ad, point = self.trace, self.f_ad, self._point
+        point[n:2*n] = r
+        point[2*n] = c
+        if self.t_is_param: point[2*n + 1] = t
+
+        def fun_ad(x):
+            point[:n] = x
+            trace(point)
+
+            return np.array([entry.val for entry in f_ad])
+
+        def fun_jac_csr(x):
+            point[:n] = x
+            trace.D(point) # update Jacoby matrix
+
+            return csr_matrix((np.array(trace.data), abs(np.array(trace.indices)), np.array(trace.indptr)),
+                              shape = (trace.m, trace.n))
+
+        def fun_fwd(x, v):
+            point[:n] = x
+            trace.fwd(point, _fwd_increment(trace, v))
+            return _fwd_result(trace)
+
+        if return_fwd: return fun_ad, fun_jac_csr, fun_fwd
+        return fun_ad, fun_jac_csr
@@ -0,0 +1,478 @@
+'''
+    backward differentiation formulas (BDF) of variable order (1 to 5) and variable step size
+'''
+
+__author__ = ('Tom Streubel',)  # alphabetical order of surnames
+__credits__ = tuple()  # alphabetical order of surnames
+
+'''
+    imports
+    =======
+'''
+import numpy as np
+
+### solvers
+from paso.solvers.nlin.sparse_nl_solver.newton.core import sparse_nl_solve, sparse_newton_options, \
+                                                           NLinSolveError
+from paso.solvers.nlin.sparse_nl_solver.newton.predefined.linsolvers import spsolve_simple_wrapper, splu_reuse_wrapper
+from paso.solvers.nlin.sparse_nl_solver.newton_krylov.core import newton_krylov_solve, newton_krylov_options, \
+                                                                  Preconditioner_t
+from paso.solvers.dae.ImpEuler import differential_part, error_norm, extrapolation_weights, jacobian_reuse_cache, \
+                                      preconditioner_reuse_cache, breakpoint_schedule, trim_histories, \
+                                      cycADa_available, cycADa_wrapper, cycADa_tape_cache
+
+from paso.util.report_and_option_class import integration_report, integration_options
+from paso.util.basics import force_array
+from paso.util.types_and_errors import Vec_t, CsMatrix_t, LinSolve_t, LinSolveError
+
+from typing import Callable, Optional, Union, List, Tuple, Sequence
+
+'''
+    body
+'''
+def BDF_coefficients(ts : Sequence[float]) -> np.ndarray:
+    '''
+        coefficients of the variable step BDF of order k = len(ts) - 1, i.e. the derivative at ts[0] of the polynomial
+        interpolating the nodes ts: x'(ts[0]) ~ sum(alphas[j]*x(ts[j]) for j in range(k + 1))
+
+        :param ts: nodes t_n1, t_n, ..., t_n1-k (pairwise distinct)
+        :return: alphas
+    '''
+    ts = np.asarray(ts, dtype = np.float64)
+    d = ts[0] - ts[1:]
+
+    alphas = np.empty(shape = ts.shape)
+    alphas[0] = np.sum(1.0/d)
+    for j in range(1, len(ts)):
+        alphas[j] = np.prod(np.delete(d, j - 1))/np.prod(ts[j] - np.delete(ts, j))
+    return alphas
+
+
+def divided_difference_weights(ts : Sequence[float]) -> np.ndarray:
+    '''
+        :param ts: nodes (pairwise distinct)
+        :return: weights of the divided difference x[ts[0], ..., ts[-1]], i.e. the leading coefficient of the
+                 polynomial interpolating the nodes
+    '''
+    ts = np.asarray(ts, dtype = np.float64)
+    return np.array([1.0/np.prod(ts[j] - np.delete(ts, j)) for j in range(len(ts))])
+
+
+def BDFStep(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t],
+            x_hist : Sequence[Vec_t], t_n1 : float, alphas : np.ndarray, x_pred : Vec_t,
+            atol : float = 1.e-8, rtol : float = 1.0e-5,
+            maxit : int = 20,
+            use_cycADa : Optional[bool] = False,
+            tape_cache : Optional["cycADa_tape_cache"] = None,
+            use_jacobian : Optional[bool] = False,
+            linsolver : Optional[LinSolve_t] = None,
+            batched_jacobian : Optional[bool] = False,
+            jac_cache : Optional[jacobian_reuse_cache] = None,
+            globalization : Optional[str] = None,
+            broyden : Optional[bool] = None,
+            jacobian_free : Optional[bool] = False,
+            preconditioner : Optional[Preconditioner_t] = None,
+            precond_cache : Optional[preconditioner_reuse_cache] = None):
+    '''
+        solves 0 = sys_func(dx_n1, x_n1, t_n1) with dx_n1 = alphas[0]*x_n1 + sum(alphas[j]*x_hist[j - 1] for j >= 1)
+
+        :param x_hist: x_n, x_n-1, ... (at least len(alphas) - 1 many)
+        :param x_pred: initial guess of Newton's method
+        :return: x_n1, success, inner_step_func, number of Newton iterations
+    '''
+    dim_x : int = len(x_pred)
+    c = alphas[0]
+    r = sum(alpha*x_j for alpha, x_j in zip(alphas[1:], x_hist)) # dx_n1 == c*x_n1 + r
+
+    def inner_step_func(x_n1): return sys_func(c*x_n1 + r, x_n1, t_n1)
+
+    keep_blocks : bool = use_jacobian and (not (jac_cache is None)) and hasattr(sys_func, 'jacobian_blocks') # for other c
+
+    def inner_step_Dfunc(x_n1):
+        if keep_blocks: return jac_cache.assemble(sys_func.jacobian_blocks(c*x_n1 + r, x_n1, t_n1), c, t_n1)
+        return sys_func.jacobian(c*x_n1 + r, x_n1, t_n1, c) # c*dF/d(dx) + dF/dx
+
+    _inner_step_jvp = None # Jacobian-free Newton-Krylov: finite differences unless forward sweeps of cycADa
+    if use_jacobian: _inner_step_func, _inner_step_Dfunc = inner_step_func, inner_step_Dfunc
+    elif use_cycADa and jacobian_free:
+        if tape_cache is None: _inner_step_func, _inner_step_Dfunc, _inner_step_jvp = \
+            cycADa_wrapper(inner_step_func, dim_x, return_fwd = True)
+        else: _inner_step_func, _inner_step_Dfunc, _inner_step_jvp = tape_cache(c, r, t_n1, return_fwd = True)
+    elif use_cycADa:
+        if tape_cache is None: _inner_step_func, _inner_step_Dfunc = cycADa_wrapper(inner_step_func, dim_x)
+        else: _inner_step_func, _inner_step_Dfunc = tape_cache(c, r, t_n1)
+    else: _inner_step_func, _inner_step_Dfunc = inner_step_func, None
+
+    ''' solve nonlinear root problem '''
+    if jacobian_free:
+        options_nk_inst = newton_krylov_options(atol_range = atol, atol_dom = atol,
+                                                rtol_range = rtol, rtol_dom = rtol,
+                                                atol_root = atol, max_it = maxit)
+        try:
+            report = newton_krylov_solve(_inner_step_func,
+                                         x0 = x_pred,
+                                         jvp = _inner_step_jvp,
+                                         preconditioner = preconditioner,
+                                         options = options_nk_inst,
+                                         M0 = None if precond_cache is None else precond_cache(c, t_n1))
+        except NLinSolveError:
+            if not (precond_cache is None): precond_cache.reset()
+            raise
+        if not (precond_cache is None): precond_cache.update(report, c, t_n1)
+        return report.x, report.success, inner_step_func, report.nit
+
+    options_sn_inst = sparse_newton_options(atol_range = atol, atol_dom = atol,
+                                            rtol_range = rtol, rtol_dom = rtol,
+                                            atol_root = atol, max_it = maxit)
+    options_sn_inst.batched_jacobian = batched_jacobian
+    if not (globalization is None): options_sn_inst.globalization = globalization
+    if not (broyden is None): options_sn_inst.broyden = broyden
+    try:
+        report = sparse_nl_solve(_inner_step_func,
+                                 jac = _inner_step_Dfunc,
+                                 x0 = x_pred,
+                                 options = options_sn_inst,
+                                 linsolver = spsolve_simple_wrapper() if linsolver is None else linsolver,
+                                 J0 = None if jac_cache is None else jac_cache(c, t_n1))
+    except NLinSolveError:
+        if not (jac_cache is None): jac_cache.reset() # linsolver may hold any matrix now
+        raise
+    if not (jac_cache is None): jac_cache.update(report, c, t_n1)
+
+    return report.x, report.success, inner_step_func, report.nit
+
+
+def local_errors(x_n1 : Vec_t, t_n1 : float, x_hist : Sequence[Vec_t], t_hist : Sequence[float],
+                 x_pred : Vec_t, order : int, orders : Sequence[int]) -> dict:
+    '''
+        estimates the local errors of the BDF of the given orders for the step onto (t_n1, x_n1).
+
+        The corrector of order k and its predictor (i.e. the extrapolation of the k + 1 latest nodes) deviate from the
+        exact solution by C_c*M and C_p*M (M = x^(k+1)/(k+1)!) respectively, where
+        C_c = prod(t_n1 - t_n1-j, j = 1..k)/alphas[0] and C_p = -prod(t_n1 - t_n-j, j = 0..k). Hence, the local error
+        of the step is C_c/(C_c - C_p)*(x_n1 - x_pred). For the neighbouring orders q M is approximated by the divided
+        difference of x_n1, x_n, ..., x_n-q instead.
+
+        :param x_hist: x_n, x_n-1, ... (at least max(order, *orders) + 1 many)
+        :param t_hist: t_n, t_n-1, ...
+        :param x_pred: extrapolation of the order + 1 latest nodes
+        :param order: order of the executed step
+        :param orders: orders for which local errors shall be estimated
+        :return: {q : le_q}
+    '''
+    les = {}
+    for q in orders:
+        ts = np.array([t_n1, *t_hist[:q + 1]], dtype = np.float64)
+        d = t_n1 - ts[1:]
+        C_c = np.prod(d[:q])/np.sum(1.0/d[:q])
+
+        if q == order: les[q] = (C_c/(C_c + np.prod(d)))*(x_n1 - x_pred)
+        else: les[q] = C_c*sum(w*x_j for w, x_j in zip(divided_difference_weights(ts), [x_n1, *x_hist[:q + 1]]))
+    return les
+
+
+def filtered_local_errors(les : dict, iteration_matrix : CsMatrix_t, c : float, dF_ddx : CsMatrix_t,
+                          linsolver : LinSolve_t) -> dict:
+    '''
+        filters local error estimates by the iteration matrix A = c*dF/d(dx) + dF/dx of the step, i.e.
+        le -> A^-1*c*dF/d(dx)*le (cf. the filtered estimate of RADAU5). Smooth components are kept (A ~ c*dF/d(dx)),
+        whereas stiff ones, which the BDF damps anyway (e.g. pressure waves in pipes), are damped alike instead of
+        being counted as errors of the polynomial history.
+
+        :param les: {q : le_q}, see local_errors
+        :param iteration_matrix: c*dF/d(dx) + dF/dx at the new node
+        :param c: coefficient of dF/d(dx) of the step (i.e. alphas[0])
+        :param dF_ddx: derivative of the DAE w.r.t. dx
+        :param linsolver: linear solver factorizing the iteration matrix (once for all orders)
+        :return: {q : filtered le_q}
+    '''
+    return {q : linsolver(iteration_matrix, c*(dF_ddx @ le), A_did_change = (i == 0))
+            for i, (q, le) in enumerate(les.items())}
+
+
+def integrate(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t],
+              x0 : Vec_t,
+              t0 : float = 0.0, T : float = 1.0,
+              h : Optional[float] = None,
+              callback : Optional[Callable] = lambda *args, **kwargs: None,
+              integrator_opts = None):
+    '''
+    BDF
+
+    :param sys_func: system function of a DAE in standard form, i.e. 0 = sys_func(dx, x, t)
+    :param x0: initial value
+    :param t0: initial time point
+    :param T: final time point
+    :param h: initial step size (also bounds the step size after custom points)
+    :param callback: called with Ts, Hs, Xs after each accepted step
+    :param integrator_opts: BDF_integration_options
+    :return: integration_report
+    '''
+
+    ''' parsing '''
+    if integrator_opts is None: integrator_opts = BDF_integration_options()
+
+    _h_thresh = min(1.0e-14, T - t0)
+    h_grid = max(min(T - t0, integrator_opts.h_grid or T - t0), _h_thresh)
+    t_grid_start = t0 + integrator_opts.grid_offset
+    h_max = max(min(T - t0, integrator_opts.h_max or T - t0, h_grid), _h_thresh)
+    h_min = max(min(h_max, integrator_opts.h_min), _h_thresh)
+    if h is None: h_start : float = (T-t0)/100.0
+    else: h_start : float = h
+    if not integrator_opts.one_step: h_start : float = max(min(h_max, h_start), h_min)
+    max_order : int = max(1, min(5, integrator_opts.max_order))
+
+    x0 = force_array(x0, force_1D = True)
+    if len(x0.shape) != 1: raise AssertionError("error")
+    f0 = sys_func(np.zeros(shape = x0.shape), x0, t0)
+    if len(f0.shape) != 1: raise AssertionError("error")
+
+    customPts = breakpoint_schedule(integrator_opts.custom_time_points, t0 = t0, T = T, beyond = T + 2.0*h_max)
+
+    ''' record step function on a cycADa tape only once (if chosen) '''
+    use_jacobian : bool = integrator_opts.analytic_jacobian and hasattr(sys_func, 'jacobian')
+    if integrator_opts.cycADa and (not use_jacobian) and (not cycADa_available):
+        raise ModuleNotFoundError("cycADa was requested but isn't available (choose analytic_jacobian if possible)!")
+
+    tape_cache : Optional["cycADa_tape_cache"] = None
+    if integrator_opts.cycADa and integrator_opts.reuse_tape and (not use_jacobian):
+        tape_cache = cycADa_tape_cache(sys_func, ndim = len(x0),
+                                       signature = getattr(sys_func, 'tape_signature', None))
+
+    ''' keep the factorized iteration matrix across steps (if chosen) '''
+    linsolver : Optional[LinSolve_t] = integrator_opts.linsolver
+    jac_cache : Optional[jacobian_reuse_cache] = None
+    precond_cache : Optional[preconditioner_reuse_cache] = None
+    if integrator_opts.jacobian_free:
+        if integrator_opts.jacobian_reuse:
+            precond_cache = preconditioner_reuse_cache(max_c_change = integrator_opts.jacobian_reuse_max_h_change,
+                                                       signature = getattr(sys_func, 'tape_signature', None))
+    elif integrator_opts.jacobian_reuse:
+        if linsolver is None: linsolver = splu_reuse_wrapper() # has to keep its factorization
+        jac_cache = jacobian_reuse_cache(max_rate = integrator_opts.jacobian_reuse_max_rate,
+                                         max_c_change = integrator_opts.jacobian_reuse_max_h_change,
+                                         signature = getattr(sys_func, 'tape_signature', None))
+
+    ''' step size and order control based on local error estimates '''
+    dF_ddx : Optional[CsMatrix_t] = differential_part(sys_func, x0, t0)
+    filter_linsolver : Optional[LinSolve_t] = None # keeps its own factorization (jac_cache relies on the one of linsolver)
+    if integrator_opts.filter_error_estimates and not (dF_ddx is None): filter_linsolver = splu_reuse_wrapper()
+    h_factor_min, h_factor_max = integrator_opts.step_size_factor_range
+    num_of_rejected_steps : int = 0
+
+    def h_factor(err : float, q : int) -> float:
+        if err == 0.0: return h_factor_max
+        return min(h_factor_max, max(h_factor_min, integrator_opts.step_size_safety*err**(-1.0/(q + 1))))
+
+    ''' step loop '''
+    Ts : List[float] = [t0]
+    Hs : List[Union[None, float]] = [None]
+    Xs : List[Vec_t] = [x0]
+    Errs : List[Union[None, float]] = [None]
+    Orders : List[Union[None, int]] = [None]
+    Nits : List[Union[None, int]] = [None]
+    if not (integrator_opts.result_sink is None): integrator_opts.result_sink(t0, x0)
+
+    simul_loop : bool = True
+    simul_loop_idx : int = -1
+
+    tt_grid = t_grid_start + (c_tt := 1)*h_grid
+    customPt = next(customPts)
+    tt = min(tt_grid, customPt) # next grid or custom point; only passed on by accepted steps
+    h = h_start
+    h_mem = h_start # step size proposed by the latest error estimate (i.e. regardless of landings on grid or custom points)
+    k : int = 1 # order of the next step
+    steps_at_order : int = 0
+    restart_idx : int = 0 # nodes prior to restart_idx (i.e. across custom points) are no history of the next step
+    h_shrink_factor : float = 4.0
+    num_of_newton_iterations : int = 0
+    num_of_nl_failures : int = 0 # steps repeated with a smaller h (and order) since Newton's method failed
+
+    while simul_loop:
+        simul_loop_idx += 1
+
+        if integrator_opts.one_step: simul_loop = False
+        else:
+            ''' check h would lead beyond integration interval or across grid or custom points '''
+            if (tt == customPt) and (Ts[-1] + h_min < customPt - h_start < Ts[-1] + h):
+                h = customPt - h_start - Ts[-1] # jumps of (right continuous) profiles at custom points enter the step onto the point; keep it at h_start
+            elif (Ts[-1] + h) >= (tt - h_min): h = max(tt - Ts[-1], h_min)
+            elif (Ts[-1] + 2.0*h) > tt: h = 0.5*(tt - Ts[-1]) # no short remainder, in particular not onto a jump at a custom point
+            if (Ts[-1] + h) >= (T - h_min): h = max(T - Ts[-1], h_min) # after the custom points, which may lie within the last step
+
+        ''' history of the step '''
+        t_new = Ts[-1] + h
+        onto_customPt : bool = t_new >= customPt - h_min
+        num_of_nodes : int = len(Ts) - max(restart_idx, len(Ts) - (max_order + 2))
+        t_hist, x_hist = Ts[-num_of_nodes:][::-1], Xs[-num_of_nodes:][::-1] # latest first
+
+        order : int = 1 if (onto_customPt or integrator_opts.one_step) else min(k, num_of_nodes)
+        estimate : bool = (not onto_customPt) and (not integrator_opts.one_step) and (num_of_nodes > order)
+
+        pred_nodes = min(order + 1, num_of_nodes)
+        x_pred = sum(w*x_j for w, x_j in zip(extrapolation_weights(t_hist[:pred_nodes], t_new), x_hist[:pred_nodes]))
+
+        '''
+            step execution
+        '''
+        advance_step = False
+        err : Optional[float] = None
+        alphas = BDF_coefficients([t_new, *t_hist[:order]])
+        try:
+            x_new, success, inner_step_func, nit = BDFStep(sys_func = sys_func,
+                                                      x_hist = x_hist, t_n1 = t_new,
+                                                      alphas = alphas,
+                                                      x_pred = x_pred,
+                                                      atol = integrator_opts.atol_range,
+                                                      rtol = integrator_opts.rtol_range,
+                                                      use_cycADa = integrator_opts.cycADa,
+                                                      tape_cache = tape_cache,
+                                                      use_jacobian = use_jacobian,
+                                                      linsolver = linsolver,
+                                                      batched_jacobian = integrator_opts.batched_jacobian,
+                                                      jac_cache = jac_cache,
+                                                      globalization = integrator_opts.globalization,
+                                                      broyden = integrator_opts.broyden,
+                                                      jacobian_free = integrator_opts.jacobian_free,
+                                                      preconditioner = integrator_opts.jacobian_free_preconditioner,
+                                                      precond_cache = precond_cache)
+
+            num_of_newton_iterations += nit
+            if not success: raise RuntimeError
+            advance_step = True
+        except (RuntimeError, NLinSolveError) as e: # the following code deals with nl-solver issues only and should not be confused with step size control
+            if h <= h_min: raise e
+
+            num_of_nl_failures += 1
+            print(f"\t>>> nl solver failed with {e} ==> Try again - reduce h from: {h}", end = " ")
+            h = max(h_min, h/h_shrink_factor)
+            k, steps_at_order = max(1, order - 1), 0
+            print(f"to: {h} (order: {k})!")
+
+        '''
+            step size and order control
+        '''
+        h_next = h
+        if advance_step and estimate:
+            orders = [q for q in (order - 1, order, order + 1) if (1 <= q <= max_order) and (q < num_of_nodes)]
+            les = local_errors(x_new, t_new, x_hist, t_hist, x_pred, order, orders)
+            if not (filter_linsolver is None):
+                dx_new = alphas[0]*x_new + sum(alpha*x_j for alpha, x_j in zip(alphas[1:], x_hist))
+                try: les = filtered_local_errors(les, sys_func.jacobian(dx_new, x_new, t_new, alphas[0]), alphas[0],
+                                                 dF_ddx = dF_ddx, linsolver = filter_linsolver)
+                except LinSolveError: pass # unfiltered estimates
+            errs = {q : error_norm(le, x_hist[0], x_new,
+                                   atol = integrator_opts.atol_dom, rtol = integrator_opts.rtol_dom, dF_ddx = dF_ddx)
+                    for q, le in les.items()}
+            err = errs[order]
+
+            if not (steps_at_order > order): # keep the order for order + 1 steps (at least)
+                errs = {q : err_q for q, err_q in errs.items() if q <= order}
+            if err > 1.0: errs.pop(order + 1, None) # no order increase after a failed estimate
+            q_next = max(errs, key = lambda q: (h_factor(errs[q], q), -q))
+            h_next = h*h_factor(errs[q_next], q_next)
+            h_mem = h_next
+
+            if q_next != order: k, steps_at_order = q_next, 0
+            else: k = order
+
+            if (err > 1.0) and (h > h_min):
+                advance_step = False
+                num_of_rejected_steps += 1
+                print(f"\t>>> local error estimate {err} too large ==> reject step and reduce h from: {h}", end = " ")
+                h = max(h_min, min(h_next, h*integrator_opts.step_size_safety))
+                print(f"to: {h} (order: {k})!")
+
+        '''
+            step conclusion
+        '''
+        if advance_step:
+            Ts.append(t_new)
+            Hs.append(h)
+            Xs.append(x_new)
+            Errs.append(err)
+            Orders.append(order)
+            Nits.append(nit)
+            steps_at_order += 1
+
+            if Ts[-1] >= (T - h_min): simul_loop = False
+            h = max(h_min, min(h_max, h_next))
+            if Ts[-1] >= (tt - h_min): # grid or custom point reached
+                if tt_grid <= tt + h_min: tt_grid = t_grid_start + (c_tt := (c_tt + 1))*h_grid
+                if customPt <= tt + h_min: # restart with order one (the step beyond is taken without estimate)
+                    customPt = customPts.next_after(tt + h_min)
+                    restart_idx = len(Ts) - 1
+                    k, steps_at_order = 1, 0
+                    h = max(h_min, min(h_max, h_mem, h_start)) # the (stiffly damped) step beyond isn't bound to the short landings before
+                tt = min(tt_grid, customPt)
+
+            if not (integrator_opts.result_sink is None): integrator_opts.result_sink(t_new, x_new)
+            if not integrator_opts.keep_trajectory: # BDF formula and error estimate of the highest order
+                restart_idx = trim_histories(max_order + 2, restart_idx, Ts, Hs, Xs, Errs, Orders, Nits)
+
+            callback(Ts, Hs, Xs)
+
+            print(f"{100.0*((Ts[-1] - t0)/(T - t0)):>7.2f}%", end = " | ")
+            print(f"i : {simul_loop_idx + 1:>2d}", end = " | ")
+            print(f"order : {order}", end = " | ")
+            print(f"t_n1 = {t_new}")
+
+    simul_report = integration_report()
+    simul_report.Ts = Ts
+    simul_report.Hs = Hs
+    simul_report.Xs = Xs
+    simul_report.Errs_predicted = Errs
+    simul_report.Orders = Orders
+    simul_report.num_of_rejected_steps = num_of_rejected_steps
+    simul_report.Nits = Nits
+    simul_report.num_of_newton_iterations = num_of_newton_iterations
+    simul_report.num_of_nl_failures = num_of_nl_failures
+    if not (jac_cache is None):
+        simul_report.num_of_jacobian_reuses = jac_cache.num_of_reuses
+        simul_report.num_of_jacobian_reassemblies = jac_cache.num_of_reassemblies
+        simul_report.num_of_jacobian_refreshes = jac_cache.num_of_refreshes
+    if not (precond_cache is None):
+        simul_report.num_of_preconditioner_reuses = precond_cache.num_of_reuses
+        simul_report.num_of_preconditioner_refreshes = precond_cache.num_of_refreshes
+    simul_report.msg = "BDF integration complete"
+    if not (tape_cache is None):
+        simul_report.num_of_tape_recordings = tape_cache.num_of_recordings
+        simul_report.num_of_tape_reuses = tape_cache.num_of_reuses
+
+    return simul_report
+
+
+'''
+    options dict definition and setting default values.
+'''
+class BDF_integration_options(integration_options):
+
+    def __init__(self):
+        self.additional_keys = ['cycADa', 'reuse_tape', 'analytic_jacobian', 'linsolver', 'batched_jacobian',
+                                'max_order', 'step_size_safety', 'step_size_factor_range', 'filter_error_estimates',
+                                'jacobian_reuse', 'jacobian_reuse_max_rate', 'jacobian_reuse_max_h_change',
+                                'globalization', 'broyden',
+                                'jacobian_free', 'jacobian_free_preconditioner']
+
+        super().__init__(name = "BDF integrator options")
+
+        self.cycADa : bool = False
+        self.reuse_tape : bool = False # record sys_func once on a cycADa tape and re-evaluate it for all steps (requires cycADa)
+        self.analytic_jacobian : bool = False # use sys_func.jacobian(dx, x, t, c) == c*dF/d(dx) + dF/dx if provided (preferred over cycADa)
+        self.linsolver : Optional[LinSolve_t] = None # linear solver shared by all steps, e.g. splu_reuse_wrapper(); None: spsolve per step
+        self.batched_jacobian : bool = False # finite differences: evaluate all directions by one call of sys_func on a batch of states
+
+        self.max_order : int = 2 # 1 <= order <= max_order <= 5; BDF3-5 aren't A-stable, weakly damped pressure waves in pipes let them blow up
+        self.step_size_safety : float = 0.9
+        self.step_size_factor_range : Tuple[float, float] = (0.2, 2.0) # bounds of h_new/h per step
+        self.filter_error_estimates : bool = True # by the iteration matrix (see filtered_local_errors); requires sys_func.jacobian
+
+        self.jacobian_reuse : bool = False # keep the factorized iteration matrix across steps (see jacobian_reuse_cache)
+        self.jacobian_reuse_max_rate : float = 0.3 # refresh if Newton's method contracts the residual worse than this
+        self.jacobian_reuse_max_h_change : float = 0.2 # refresh if the coefficient of dF/d(dx) (~1/h) changes relatively by more than this
+
+        self.globalization : str = 'damping' # of Newton's method: 'damping', 'armijo' or 'trust_region' (see sparse_newton_options)
+        self.broyden : bool = False # Newton's method updates the iteration matrix by good Broyden steps between refreshes
+
+        self.jacobian_free : bool = False # Newton-Krylov on products J*v (cycADa forward sweeps or finite differences)
+        self.jacobian_free_preconditioner : Optional[Preconditioner_t] = None # e.g. simulator.preconditioner.jacobian_free_tree_preconditioner
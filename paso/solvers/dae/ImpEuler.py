@@ -10,62 +10,378 @@ __credits__ = tuple()  # alphabetical order of surnames
     =======
 '''
 import numpy as np
+from scipy.sparse import csr_matrix
+import heapq
 
 ### solvers
 from scipy.optimize import root, least_squares
 from paso.solvers.nlin.sparse_nl_solver.newton.core import sparse_nl_solve, sparse_newton_options, \
                                                            NLinSolveError
-from paso.solvers.nlin.sparse_nl_solver.newton.predefined.linsolvers import spilu_simple_wrapper, spsolve_simple_wrapper, splu_simple_wrapper
+from paso.solvers.nlin.sparse_nl_solver.newton.predefined.linsolvers import spilu_simple_wrapper, spsolve_simple_wrapper, splu_simple_wrapper, \
+                                                                        splu_reuse_wrapper
 from paso.solvers.nlin.sparse_nl_solver.newton.predefined.callbacks import callback_print_progress, callback_matrix_spy
+from paso.solvers.nlin.sparse_nl_solver.newton_krylov.core import newton_krylov_solve, newton_krylov_options, \
+                                                                  Preconditioner_t
 
 from paso.util.report_and_option_class import integration_report, integration_options
 from paso.util.basics import force_array
-from paso.util.types_and_errors import Vec_t, CsMatrix_t
-from paso.differentiation.util.wrapper_cycADa import cycADa_wrapper
+from paso.util.types_and_errors import Vec_t, CsMatrix_t, LinSolve_t
+try:
+    from paso.differentiation.util.wrapper_cycADa import cycADa_wrapper, cycADa_tape_cache
+    cycADa_available : bool = True
+except (ModuleNotFoundError, ImportError): # closed form jacobians or finite differences don't require cycADa
+    cycADa_wrapper, cycADa_tape_cache = None, None
+    cycADa_available : bool = False
 
-from typing import Callable, Optional, Union, List
+from typing import Callable, Optional, Union, List, Tuple, Sequence
 
 '''
     body
 '''
+def extrapolation_weights(ts : Sequence[float], t : float) -> np.ndarray:
+    '''
+        :param ts: nodes (pairwise distinct)
+        :param t: time point
+        :return: weights of the Lagrange polynomial through the nodes evaluated at t
+    '''
+    ts = np.asarray(ts, dtype = np.float64)
+    return np.array([np.prod((t - np.delete(ts, j))/(ts[j] - np.delete(ts, j))) for j in range(len(ts))])
+
+
+def trim_histories(num_of_nodes : int, restart_idx : int, *histories : List) -> int:
+    '''
+        drops all but the latest num_of_nodes entries of the histories (e.g. Ts, Hs and Xs) in place, such that memory
+        doesn't grow with the number of steps if the trajectory isn't kept
+
+        :param num_of_nodes: number of latest nodes the stepper needs
+        :param restart_idx: index of the first node of the history (e.g. the latest custom point)
+        :param histories: lists of equal length
+        :return: restart_idx w.r.t. the trimmed histories
+    '''
+    num_of_dropped = len(histories[0]) - num_of_nodes
+    if num_of_dropped <= 0: return restart_idx
+
+    for history in histories: del history[:num_of_dropped]
+    return max(0, restart_idx - num_of_dropped)
+
+
+class breakpoint_schedule(object):
+
+    def __init__(self, time_points : Sequence[float], t0 : float, T : float, beyond : float):
+        '''
+            min-heap of the breakpoints within (t0, T) steps have to land on exactly, e.g. jumps and kinks of profiles
+            (see simulator.resources.profiles.table_lookup.breakpoints) or custom time points. The step size is only
+            restricted by the next breakpoint, i.e. it may grow freely in between.
+
+            :param time_points: breakpoints (in any order, duplicates allowed)
+            :param t0: initial time point
+            :param T: final time point
+            :param beyond: returned once all breakpoints are passed (e.g. a time point past T)
+        '''
+        self.t0, self.T, self.beyond = t0, T, beyond
+        self._heap : List[float] = sorted({float(ti) for ti in time_points if t0 < ti < T}) # a sorted list is a heap
+
+    def __len__(self): return len(self._heap)
+
+    def __iter__(self): return self
+
+    def __next__(self) -> float: return heapq.heappop(self._heap) if self._heap else self.beyond
+
+    def push(self, t : float):
+        ''' announces a further breakpoint (e.g. an event detected during the integration) '''
+        if self.t0 < t < self.T: heapq.heappush(self._heap, float(t))
+
+    def next_after(self, t : float) -> float:
+        '''
+            :param t: e.g. the latest time point plus h_min
+            :return: next breakpoint beyond t; all breakpoints up to t are dropped (e.g. coincident ones)
+        '''
+        while self._heap and (self._heap[0] <= t): heapq.heappop(self._heap)
+        return next(self)
+
+
+class jacobian_reuse_cache(object):
+
+    def __init__(self, max_rate : float = 0.3, max_c_change : float = 0.2,
+                 signature : Optional[Callable[[float], tuple]] = None):
+        '''
+            keeps the iteration matrix c*dF/d(dx) + dF/dx factorized by the linear solver of the latest step (simplified
+            Newton across steps). It is refreshed, i.e. re-evaluated by the next step, if
+
+             - Newton's method contracted the residual by a factor worse than max_rate,
+             - the coefficient c of the next step (e.g. 1/h) deviates by more than max_c_change relatively or
+             - signature(t) changes (e.g. profiles or modes of active elements switch).
+
+            If the blocks dF/d(dx) and dF/dx of the latest evaluation are known (see assemble), a change of c only
+            leads to the reassembly c*dF/d(dx) + dF/dx (and its factorization) instead of a re-evaluation.
+            All steps have to share one linear solver (that keeps its latest factorization).
+
+            :param max_rate: max contraction rate of Newton's method for the matrix to be kept
+            :param max_c_change: max relative change of c for the matrix to be reused
+            :param signature: (optional) callable: t -> hashable
+        '''
+        self.max_rate : float = max_rate
+        self.max_c_change : float = max_c_change
+        self.signature : Optional[Callable[[float], tuple]] = signature
+
+        self.J : Optional[Tuple[CsMatrix_t, Vec_t, Vec_t]] = None # scaled matrix, row and column scaling
+        self._c : Optional[float] = None
+        self._signature_val = None
+        self.blocks : Optional[Tuple[CsMatrix_t, CsMatrix_t]] = None # dF/d(dx) and dF/dx of the latest evaluation
+        self._blocks_signature_val = None
+
+        self.num_of_reuses : int = 0
+        self.num_of_reassemblies : int = 0
+        self.num_of_refreshes : int = 0
+
+    def reset(self): self.J, self.blocks = None, None
+
+    @staticmethod
+    def _combine(blocks : Tuple[CsMatrix_t, CsMatrix_t], c : float) -> CsMatrix_t:
+        dF_ddx, dF_dx = blocks
+        if isinstance(dF_ddx, csr_matrix) and isinstance(dF_dx, csr_matrix) and \
+           all((u is v) or np.array_equal(u, v) for u, v in [(dF_ddx.indptr, dF_dx.indptr),
+                                                             (dF_ddx.indices, dF_dx.indices)]): # keep the shared pattern
+            return csr_matrix((c*dF_ddx.data + dF_dx.data, dF_dx.indices, dF_dx.indptr), shape = dF_dx.shape)
+        return c*dF_ddx + dF_dx
+
+    def assemble(self, blocks : Tuple[CsMatrix_t, CsMatrix_t], c : float, t : float) -> CsMatrix_t:
+        '''
+            keeps the blocks for reassemblies with other c
+
+            :param blocks: dF/d(dx) and dF/dx, e.g. of sys_func.jacobian_blocks
+            :param c: coefficient of dF/d(dx)
+            :param t: time point
+            :return: c*dF/d(dx) + dF/dx
+        '''
+        self.blocks = blocks
+        self._blocks_signature_val = None if self.signature is None else self.signature(t)
+        return self._combine(blocks, c)
+
+    def __call__(self, c : float, t : float) -> Optional[Union[CsMatrix_t, Tuple[CsMatrix_t, Vec_t, Vec_t]]]:
+        '''
+            :param c: coefficient of dF/d(dx) of the next step
+            :param t: time point of the next step
+            :return: factorized matrix (tuple, see sparse_nl_solve) or reassembled matrix to start Newton's method
+                     with, None: evaluate the jacobian
+        '''
+        signature_val = None if self.signature is None else self.signature(t)
+        if (not (self.J is None)) and (abs(c - self._c) <= self.max_c_change*abs(self._c)) and \
+           (signature_val == self._signature_val):
+            self.num_of_reuses += 1
+            return self.J
+
+        if (not (self.blocks is None)) and (signature_val == self._blocks_signature_val):
+            self.num_of_reassemblies += 1
+            return self._combine(self.blocks, c)
+
+        self.num_of_refreshes += 1
+        return None
+
+    def update(self, report, c : float, t : float):
+        '''
+            :param report: sparse_newton_results of the step
+            :param c: coefficient of dF/d(dx) of the step
+            :param t: time point of the step
+        '''
+        if (not report.success) or (report.rate > self.max_rate) or (report.J_factorized is None): self.reset()
+        else:
+            if not (report.J_factorized is self.J): # i.e. matrix has been re-evaluated
+                self._c = c
+                self._signature_val = None if self.signature is None else self.signature(t)
+            self.J = report.J_factorized
+
+
+class preconditioner_reuse_cache(object):
+
+    def __init__(self, max_c_change : float = 0.2, signature : Optional[Callable[[float], tuple]] = None):
+        '''
+            keeps the preconditioner of Jacobian-free Newton-Krylov (see newton_krylov_solve) of the latest step for
+            the next steps unless the coefficient c of dF/d(dx) (e.g. 1/h) deviates by more than max_c_change
+            relatively or signature(t) changes (cf. jacobian_reuse_cache).
+
+            :param max_c_change: max relative change of c for the preconditioner to be reused
+            :param signature: (optional) callable: t -> hashable
+        '''
+        self.max_c_change : float = max_c_change
+        self.signature : Optional[Callable[[float], tuple]] = signature
+
+        self.M : Optional[Callable[[Vec_t], Vec_t]] = None
+        self._c : Optional[float] = None
+        self._signature_val = None
+
+        self.num_of_reuses : int = 0
+        self.num_of_refreshes : int = 0
+
+    def reset(self): self.M = None
+
+    def __call__(self, c : float, t : float) -> Optional[Callable[[Vec_t], Vec_t]]:
+        signature_val = None if self.signature is None else self.signature(t)
+        if (not (self.M is None)) and (abs(c - self._c) <= self.max_c_change*abs(self._c)) and \
+           (signature_val == self._signature_val):
+            self.num_of_reuses += 1
+            return self.M
+
+        self.num_of_refreshes += 1
+        return None
+
+    def update(self, report, c : float, t : float):
+        if not report.success: self.reset()
+        else:
+            if not (report.M is self.M): # i.e. preconditioner has been rebuilt
+                self._c = c
+                self._signature_val = None if self.signature is None else self.signature(t)
+            self.M = report.M
+
+
 def ImpEulerStep(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t], x_n : Vec_t,
                  t_n : float, h : float,
                  atol : float = 1.e-8, rtol : float = 1.0e-5,
                  maxit : int = 20,
                  use_scipy : Optional[Union[bool, str]] = None,
                  use_cycADa : Optional[bool] = False,
+                 tape_cache : Optional["cycADa_tape_cache"] = None,
+                 use_jacobian : Optional[bool] = False,
+                 linsolver : Optional[LinSolve_t] = None,
+                 batched_jacobian : Optional[bool] = False,
+                 x_pred : Optional[Vec_t] = None,
+                 jac_cache : Optional[jacobian_reuse_cache] = None,
+                 globalization : Optional[str] = None,
+                 broyden : Optional[bool] = None,
+                 jacobian_free : Optional[bool] = False,
+                 preconditioner : Optional[Preconditioner_t] = None,
+                 precond_cache : Optional[preconditioner_reuse_cache] = None,
                  *args, **kwargs):
     dim_x : int = len(x_n)
+    if x_pred is None: x_pred = x_n # initial guess of Newton's method
     t_n1 = t_n + h
 
     def inner_step_func(x_n1): return sys_func((x_n1 - x_n)/h, x_n1, t_n1)
 
-    if use_cycADa: _inner_step_func, _inner_step_Dfunc = cycADa_wrapper(inner_step_func, dim_x)
+    keep_blocks : bool = use_jacobian and (not (jac_cache is None)) and hasattr(sys_func, 'jacobian_blocks') # for other h
+
+    def inner_step_Dfunc(x_n1):
+        if keep_blocks: return jac_cache.assemble(sys_func.jacobian_blocks((x_n1 - x_n)/h, x_n1, t_n1), 1.0/h, t_n1)
+        return sys_func.jacobian((x_n1 - x_n)/h, x_n1, t_n1, 1.0/h) # 1/h*dF/d(dx) + dF/dx
+
+    _inner_step_jvp = None # Jacobian-free Newton-Krylov: finite differences unless forward sweeps of cycADa
+    if use_jacobian: _inner_step_func, _inner_step_Dfunc = inner_step_func, inner_step_Dfunc
+    elif use_cycADa and jacobian_free:
+        if tape_cache is None: _inner_step_func, _inner_step_Dfunc, _inner_step_jvp = \
+            cycADa_wrapper(inner_step_func, dim_x, return_fwd = True)
+        else: _inner_step_func, _inner_step_Dfunc, _inner_step_jvp = tape_cache(1.0/h, -x_n/h, t_n1, return_fwd = True)
+    elif use_cycADa:
+        if tape_cache is None: _inner_step_func, _inner_step_Dfunc = cycADa_wrapper(inner_step_func, dim_x)
+        else: _inner_step_func, _inner_step_Dfunc = tape_cache(1.0/h, -x_n/h, t_n1) # (x_n1 - x_n)/h == x_n1/h - x_n/h
     else: _inner_step_func, _inner_step_Dfunc = inner_step_func, None
 
     ''' solve nonlinear root problem '''
-    if (isinstance(use_scipy, bool) and (not use_scipy)) or (use_scipy is None):
+    if jacobian_free:
+        options_nk_inst = newton_krylov_options(atol_range = atol, atol_dom = atol,
+                                                rtol_range = rtol, rtol_dom = rtol,
+                                                atol_root = atol, max_it = maxit)
+        try:
+            report = newton_krylov_solve(_inner_step_func,
+                                         x0 = x_pred,
+                                         jvp = _inner_step_jvp,
+                                         preconditioner = preconditioner,
+                                         options = options_nk_inst,
+                                         M0 = None if precond_cache is None else precond_cache(1.0/h, t_n1))
+        except NLinSolveError:
+            if not (precond_cache is None): precond_cache.reset()
+            raise
+        if not (precond_cache is None): precond_cache.update(report, 1.0/h, t_n1)
+    elif (isinstance(use_scipy, bool) and (not use_scipy)) or (use_scipy is None):
         options_sn_inst = sparse_newton_options(atol_range = atol, atol_dom = atol,
                                                 rtol_range = rtol, rtol_dom = rtol,
                                                 atol_root = atol, max_it = maxit)
-        report = sparse_nl_solve(_inner_step_func,
-                                 jac = _inner_step_Dfunc,
-                                 x0 = x_n,
-                                 options = options_sn_inst,
-                                 linsolver = spsolve_simple_wrapper()) #,
-                                 # callback = callback_matrix_spy()) #,
-                                 # callback = callback_print_progress())
+        options_sn_inst.batched_jacobian = batched_jacobian
+        if not (globalization is None): options_sn_inst.globalization = globalization
+        if not (broyden is None): options_sn_inst.broyden = broyden
+        try:
+            report = sparse_nl_solve(_inner_step_func,
+                                     jac = _inner_step_Dfunc,
+                                     x0 = x_pred,
+                                     options = options_sn_inst,
+                                     linsolver = spsolve_simple_wrapper() if linsolver is None else linsolver,
+                                     J0 = None if jac_cache is None else jac_cache(1.0/h, t_n1)) #,
+                                     # callback = callback_matrix_spy()) #,
+                                     # callback = callback_print_progress())
+        except NLinSolveError:
+            if not (jac_cache is None): jac_cache.reset() # linsolver may hold any matrix now
+            raise
+        if not (jac_cache is None): jac_cache.update(report, 1.0/h, t_n1)
     elif (isinstance(use_scipy, bool) and use_scipy) or (isinstance(use_scipy, str) and (use_scipy == 'least_squares')):
-        report = least_squares(inner_step_func, x0 = x_n,
+        report = least_squares(inner_step_func, x0 = x_pred,
                                ftol = 1.0e-12, xtol = 1.0e-12, gtol = 1.0e-12)
     elif isinstance(use_scipy, str) and (use_scipy == 'root'):
-        report = root(inner_step_func, x0 = x_n)
+        report = root(inner_step_func, x0 = x_pred)
     else: raise Exception('?')
 
     success = report.success
     x_n1 = report.x
+    nit : Optional[int] = getattr(report, 'nit', None) # number of Newton iterations (if provided by the solver)
 
-    return t_n1, x_n1, success, inner_step_func
+    return t_n1, x_n1, success, inner_step_func, nit
+
+
+def differential_part(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t], x : Vec_t, t : float) -> Optional[CsMatrix_t]:
+    '''
+        :param sys_func: F(dx, x, t) optionally providing sys_func.jacobian(dx, x, t, c) == c*dF/d(dx) + dF/dx (and
+                         sys_func.jacobian_blocks(dx, x, t) == (dF/d(dx), dF/dx))
+        :param x: state
+        :param t: time point
+        :return: dF/d(dx) at (0, x, t) in csr format, None if sys_func provides no jacobian
+    '''
+    if not hasattr(sys_func, 'jacobian'): return None
+    dx = np.zeros(shape = x.shape)
+    try:
+        if hasattr(sys_func, 'jacobian_blocks'): dF_ddx = csr_matrix(sys_func.jacobian_blocks(dx, x, t)[0], copy = True)
+        else: dF_ddx = csr_matrix(sys_func.jacobian(dx, x, t, 1.0) - sys_func.jacobian(dx, x, t, 0.0))
+    except Exception: return None # e.g. sys_func can't provide a jacobian after all
+    dF_ddx.eliminate_zeros()
+    return dF_ddx
+
+
+def local_error_norm(x_n1 : Vec_t, x_n : Vec_t, x_n_1 : Vec_t, h : float, h_n : float,
+                     atol : float, rtol : float, dF_ddx : Optional[CsMatrix_t] = None) -> float:
+    '''
+        estimates the local error of the implicit Euler step x_n -> x_n1 (step size h) by comparing it to the linear
+        extrapolation of x_n_1 and x_n (step size h_n): with x_pred = x_n + h/h_n*(x_n - x_n_1) both deviate from the
+        exact solution by x''/2*h**2 and -x''/2*(h**2 + h*h_n) respectively, hence
+        le = h/(2*h + h_n)*(x_n1 - x_pred).
+
+        For DAEs only the differential part dF/d(dx)*le is measured (algebraic components may jump together with
+        boundary conditions); each of its rows is weighted by |dF/d(dx)|*(atol + rtol*|x|).
+
+        :param atol: absolute tolerance
+        :param rtol: relative tolerance
+        :param dF_ddx: (optional) derivative of the DAE w.r.t. dx; None: measure le itself
+        :return: weighted root mean square norm, i.e. <= 1 means within tolerances
+    '''
+    x_pred = x_n + (h/h_n)*(x_n - x_n_1)
+    le = (h/(2.0*h + h_n))*(x_n1 - x_pred)
+    return error_norm(le, x_n, x_n1, atol = atol, rtol = rtol, dF_ddx = dF_ddx)
+
+
+def error_norm(le : Vec_t, x_n : Vec_t, x_n1 : Vec_t,
+               atol : float, rtol : float, dF_ddx : Optional[CsMatrix_t] = None) -> float:
+    '''
+        :param le: local error estimate of the step x_n -> x_n1
+        :param atol: absolute tolerance
+        :param rtol: relative tolerance
+        :param dF_ddx: (optional) derivative of the DAE w.r.t. dx; None: measure le itself
+        :return: weighted root mean square norm of le (or dF/d(dx)*le), see local_error_norm
+    '''
+    weights = atol + rtol*np.maximum(abs(x_n), abs(x_n1))
+
+    if dF_ddx is None: scaled = le/weights
+    else:
+        rows = np.diff(dF_ddx.indptr) > 0
+        scaled = (dF_ddx @ le)[rows]/(abs(dF_ddx) @ weights)[rows]
+
+    if scaled.size == 0: return 0.0
+    return float(np.sqrt(np.mean(scaled*scaled)))
 
 
 def integrate(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t],
@@ -106,35 +422,71 @@ def integrate(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t],
     # dim_x = len(x0)
     # dim_f = len(f0) # == dim_x
 
-    customPts = [ti for ti in integrator_opts.custom_time_points if (ti > t0) and (ti < T)]
-    customPts.extend([T + 2.0*h_max])
-    customPts = iter(customPts)
+    customPts = breakpoint_schedule(integrator_opts.custom_time_points, t0 = t0, T = T, beyond = T + 2.0*h_max)
+
+    ''' record step function on a cycADa tape only once (if chosen) '''
+    use_jacobian : bool = integrator_opts.analytic_jacobian and hasattr(sys_func, 'jacobian')
+    if integrator_opts.cycADa and (not use_jacobian) and (not cycADa_available):
+        raise ModuleNotFoundError("cycADa was requested but isn't available (choose analytic_jacobian if possible)!")
+
+    tape_cache : Optional["cycADa_tape_cache"] = None
+    if integrator_opts.cycADa and integrator_opts.reuse_tape and (not use_jacobian):
+        tape_cache = cycADa_tape_cache(sys_func, ndim = len(x0),
+                                       signature = getattr(sys_func, 'tape_signature', None))
+
+    ''' keep the factorized iteration matrix across steps (if chosen) '''
+    linsolver : Optional[LinSolve_t] = integrator_opts.linsolver
+    jac_cache : Optional[jacobian_reuse_cache] = None
+    precond_cache : Optional[preconditioner_reuse_cache] = None
+    if integrator_opts.jacobian_free:
+        if integrator_opts.jacobian_reuse:
+            precond_cache = preconditioner_reuse_cache(max_c_change = integrator_opts.jacobian_reuse_max_h_change,
+                                                       signature = getattr(sys_func, 'tape_signature', None))
+    elif integrator_opts.jacobian_reuse:
+        if linsolver is None: linsolver = splu_reuse_wrapper() # has to keep its factorization
+        jac_cache = jacobian_reuse_cache(max_rate = integrator_opts.jacobian_reuse_max_rate,
+                                         max_c_change = integrator_opts.jacobian_reuse_max_h_change,
+                                         signature = getattr(sys_func, 'tape_signature', None))
+
+    ''' step size control based on local error estimates (if chosen) '''
+    step_size_control : bool = integrator_opts.step_size_control and (not integrator_opts.one_step)
+    dF_ddx : Optional[CsMatrix_t] = differential_part(sys_func, x0, t0) if step_size_control else None
+    h_factor_min, h_factor_max = integrator_opts.step_size_factor_range
+    num_of_rejected_steps : int = 0
+    restart_error_estimate : bool = True # no (usable) history, i.e. at t0 and after custom points (e.g. breakpoints of profiles)
 
     ''' step loop '''
     Ts : List[float] = [t0]
     Hs : List[Union[None, float]] = [None]
     Xs : List[Vec_t] = [x0]
+    Errs : List[Union[None, float]] = [None]
+    Nits : List[Union[None, int]] = [None]
+    num_of_history_nodes : int = max(2, integrator_opts.predictor_order + 1) # predictor and error estimate
+    if not (integrator_opts.result_sink is None): integrator_opts.result_sink(t0, x0)
 
     simul_loop : bool = True
     simul_loop_idx : int = -1
 
-    tt = t_grid_start + (c_tt := 1)*h_grid
-    if tt > (customPt := next(customPts)) - h_min:
-        tt = customPt
+    tt_grid = t_grid_start + (c_tt := 1)*h_grid
+    customPt = next(customPts)
+    tt = min(tt_grid, customPt) # next grid or custom point; only passed on by accepted steps
     h = h_start
     h_mem = h_start
     nl_solvings_since_last_fail : int = 0
     h_shrink_factor : float = 2.02
     h_growth_factor : float = 3.1
     h_factor_ratio : float = 1.0
+    restart_idx : int = 0 # nodes prior to restart_idx (i.e. across custom points) are no history of the predictor
+    num_of_newton_iterations : int = 0
+    num_of_nl_failures : int = 0 # steps repeated with a smaller h since Newton's method failed
 
     while simul_loop:
         simul_loop_idx += 1
 
         if integrator_opts.one_step: simul_loop = False
         else:
-            ''' bring h closer to h_mem (if nl solver has no current issues) '''
-            if nl_solvings_since_last_fail > min(20, h_factor_ratio):
+            ''' bring h closer to h_mem (if nl solver has no current issues and h isn't chosen by error estimates) '''
+            if (not step_size_control) and (nl_solvings_since_last_fail > min(20, h_factor_ratio)):
                 if abs(h - h_mem) > _h_thresh:
                     print(f"\t>>> try to move h: {h} to h_mem: {h_mem}", end=" ")
                     if (h > h_mem) and (h > h_min):
@@ -147,30 +499,46 @@ def integrate(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t],
                 else: h_factor_ratio = 1.0
 
             ''' check h_mem or h would lead beyond integration interval '''
-            if (Ts[-1] + h) >= (T - h_min):
-                h = max(T - Ts[-1], h_min)
-                h_mem = min(h_mem, h)
-            elif (Ts[-1] + h_mem) >= (T - h_min): # i.e. h < h_mem anyway because of if before
+            if (Ts[-1] + h_mem) >= (T - h_min):
                 h_mem = max(T - Ts[-1], h_min)
+            if step_size_control and (tt == customPt) and (Ts[-1] + h_min < customPt - h_start < Ts[-1] + h):
+                h = customPt - h_start - Ts[-1] # jumps of (right continuous) profiles at custom points enter the step onto the point; keep it at h_start
             elif (Ts[-1] + h) >= (tt - h_min): # check for grid or custom points
                 h = max(tt - Ts[-1], h_min)
-                tt = t_grid_start + (c_tt := (c_tt + 1))*h_grid
-                if tt > customPt - h_min:
-                    tt = customPt
-                    customPt = next(customPts)
+            if (Ts[-1] + h) >= (T - h_min): # after the custom points, which may lie within the last step
+                h = max(T - Ts[-1], h_min)
+
+        ''' predictor: extrapolation of the latest accepted states as initial guess of Newton's method '''
+        num_of_nodes : int = min(integrator_opts.predictor_order + 1, len(Ts) - restart_idx)
+        if num_of_nodes > 1:
+            x_pred = sum(w*x_j for w, x_j in zip(extrapolation_weights(Ts[-num_of_nodes:], Ts[-1] + h), Xs[-num_of_nodes:]))
+        else: x_pred = None # i.e. x_n
 
         '''
             step execution
         '''
         advance_step = False
+        err : Optional[float] = None
         try:
             out = ImpEulerStep(sys_func = sys_func,
                                x_n = Xs[-1], t_n = Ts[-1], h = h,
                                atol = integrator_opts.atol_range,
                                rtol = integrator_opts.rtol_range,
                                use_scipy = False,
-                               use_cycADa = integrator_opts.cycADa)
-            t_new, x_new, success, inner_step_func = out
+                               use_cycADa = integrator_opts.cycADa,
+                               tape_cache = tape_cache,
+                               use_jacobian = use_jacobian,
+                               linsolver = linsolver,
+                               batched_jacobian = integrator_opts.batched_jacobian,
+                               x_pred = x_pred,
+                               jac_cache = jac_cache,
+                               globalization = integrator_opts.globalization,
+                               broyden = integrator_opts.broyden,
+                               jacobian_free = integrator_opts.jacobian_free,
+                               preconditioner = integrator_opts.jacobian_free_preconditioner,
+                               precond_cache = precond_cache)
+            t_new, x_new, success, inner_step_func, nit = out
+            num_of_newton_iterations += nit or 0
 
             print(success, np.linalg.norm(inner_step_func(x_new)))
             if not success: raise RuntimeError
@@ -180,6 +548,7 @@ def integrate(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t],
             if h <= h_min: raise e
 
             t_new, x_new = None, None
+            num_of_nl_failures += 1
             nl_solvings_since_last_fail = 0
             print(f"\t>>> nl solver failed with {e} ==> Try again - reduce h from: {h}", end = " ")
             h = max(h_min, h/h_shrink_factor)
@@ -189,7 +558,19 @@ def integrate(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t],
         '''
             step size control   
         '''
-        # TODO: implement step size control by manipulating h_mem!
+        if advance_step and step_size_control and (not restart_error_estimate) and (t_new < customPt - h_min): # no estimates across custom points
+            err = local_error_norm(x_new, Xs[-1], Xs[-2], h, Hs[-1],
+                                   atol = integrator_opts.atol_dom, rtol = integrator_opts.rtol_dom, dF_ddx = dF_ddx)
+            h_factor = h_factor_max if err == 0.0 else min(h_factor_max, max(h_factor_min,
+                                                                            integrator_opts.step_size_safety/np.sqrt(err)))
+            if (err > 1.0) and (h > h_min):
+                advance_step = False
+                num_of_rejected_steps += 1
+                print(f"\t>>> local error estimate {err} too large ==> reject step and reduce h from: {h}", end = " ")
+                h = max(h_min, h*h_factor)
+                h_mem = h
+                print(f"to: {h}!")
+            else: h_mem = max(h_min, min(h_max, h*h_factor))
 
         '''
             step conclusion
@@ -198,8 +579,26 @@ def integrate(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t],
             Ts.append(t_new)
             Hs.append(h)
             Xs.append(x_new)
+            Errs.append(err)
+            Nits.append(nit)
 
             if Ts[-1] >= (T - h_min): simul_loop = False
+            restart_error_estimate = False
+            if Ts[-1] >= (tt - h_min): # grid or custom point reached
+                if tt_grid <= tt + h_min: tt_grid = t_grid_start + (c_tt := (c_tt + 1))*h_grid
+                if customPt <= tt + h_min:
+                    customPt = customPts.next_after(tt + h_min)
+                    restart_error_estimate = True
+                    restart_idx = len(Ts) - 1
+                tt = min(tt_grid, customPt)
+
+            if step_size_control:
+                if restart_error_estimate: h_mem = min(h_mem, h_start) # next step is taken without error estimate
+                h = h_mem
+
+            if not (integrator_opts.result_sink is None): integrator_opts.result_sink(t_new, x_new)
+            if not integrator_opts.keep_trajectory:
+                restart_idx = trim_histories(num_of_history_nodes, restart_idx, Ts, Hs, Xs, Errs, Nits)
 
             callback(Ts, Hs, Xs)
 
@@ -211,7 +610,23 @@ def integrate(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t],
     simul_report.Ts = Ts
     simul_report.Hs = Hs
     simul_report.Xs = Xs
+    if step_size_control:
+        simul_report.Errs_predicted = Errs
+        simul_report.num_of_rejected_steps = num_of_rejected_steps
+    simul_report.Nits = Nits
+    simul_report.num_of_newton_iterations = num_of_newton_iterations
+    simul_report.num_of_nl_failures = num_of_nl_failures
+    if not (jac_cache is None):
+        simul_report.num_of_jacobian_reuses = jac_cache.num_of_reuses
+        simul_report.num_of_jacobian_reassemblies = jac_cache.num_of_reassemblies
+        simul_report.num_of_jacobian_refreshes = jac_cache.num_of_refreshes
+    if not (precond_cache is None):
+        simul_report.num_of_preconditioner_reuses = precond_cache.num_of_reuses
+        simul_report.num_of_preconditioner_refreshes = precond_cache.num_of_refreshes
     simul_report.msg = "ImpEuler integration complete"
+    if not (tape_cache is None):
+        simul_report.num_of_tape_recordings = tape_cache.num_of_recordings
+        simul_report.num_of_tape_reuses = tape_cache.num_of_reuses
 
     return simul_report
 
@@ -222,8 +637,33 @@ def integrate(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t],
 class ImpEuler_integration_options(integration_options):
 
     def __init__(self):
-        self.additional_keys = ['cycADa']
+        self.additional_keys = ['cycADa', 'reuse_tape', 'analytic_jacobian', 'linsolver', 'batched_jacobian',
+                                'step_size_control', 'step_size_safety', 'step_size_factor_range',
+                                'predictor_order',
+                                'jacobian_reuse', 'jacobian_reuse_max_rate', 'jacobian_reuse_max_h_change',
+                                'globalization', 'broyden',
+                                'jacobian_free', 'jacobian_free_preconditioner']
 
         super().__init__(name = "ImpEuler integrator options")
 
         self.cycADa : bool = False
+        self.reuse_tape : bool = False # record sys_func once on a cycADa tape and re-evaluate it for all steps (requires cycADa)
+        self.analytic_jacobian : bool = False # use sys_func.jacobian(dx, x, t, c) == c*dF/d(dx) + dF/dx if provided (preferred over cycADa)
+        self.linsolver : Optional[LinSolve_t] = None # linear solver shared by all steps, e.g. splu_reuse_wrapper(); None: spsolve per step
+        self.batched_jacobian : bool = False # finite differences: evaluate all directions by one call of sys_func on a batch of states
+
+        self.step_size_control : bool = False # choose h by local error estimates w.r.t. atol_dom and rtol_dom
+        self.step_size_safety : float = 0.9
+        self.step_size_factor_range : Tuple[float, float] = (0.2, 5.0) # bounds of h_new/h per step
+
+        self.predictor_order : int = 1 # initial guess of Newton's method: 0: x_n, 1: linear, 2: quadratic extrapolation
+
+        self.jacobian_reuse : bool = False # keep the factorized iteration matrix across steps (see jacobian_reuse_cache)
+        self.jacobian_reuse_max_rate : float = 0.3 # refresh if Newton's method contracts the residual worse than this
+        self.jacobian_reuse_max_h_change : float = 0.2 # refresh if 1/h changes relatively by more than this
+
+        self.globalization : str = 'damping' # of Newton's method: 'damping', 'armijo' or 'trust_region' (see sparse_newton_options)
+        self.broyden : bool = False # Newton's method updates the iteration matrix by good Broyden steps between refreshes
+
+        self.jacobian_free : bool = False # Newton-Krylov on products J*v (cycADa forward sweeps or finite differences)
+        self.jacobian_free_preconditioner : Optional[Preconditioner_t] = None # e.g. simulator.preconditioner.jacobian_free_tree_preconditioner
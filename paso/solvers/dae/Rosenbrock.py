@@ -0,0 +1,517 @@
+'''
+    linearly implicit Rosenbrock-W methods (e.g. ROS34PW2, ROS3PW) with embedded error estimates and step size control
+'''
+
+__author__ = ('Tom Streubel',)  # alphabetical order of surnames
+__credits__ = tuple()  # alphabetical order of surnames
+
+'''
+    imports
+    =======
+'''
+import numpy as np
+
+### solvers
+from paso.solvers.nlin.sparse_nl_solver.newton.core import NLinSolveError, matrix_row_scaling
+from paso.solvers.nlin.sparse_nl_solver.newton.predefined.linsolvers import splu_reuse_wrapper
+from paso.solvers.dae.ImpEuler import ImpEulerStep, differential_part, error_norm, jacobian_reuse_cache, \
+                                      local_error_norm, breakpoint_schedule, trim_histories, \
+                                      cycADa_available, cycADa_wrapper, cycADa_tape_cache
+from paso.differentiation.util.jacobian_csr_handler import jac_csr
+
+from paso.util.report_and_option_class import integration_report, integration_options
+from paso.util.basics import force_array
+from paso.util.types_and_errors import Vec_t, CsMatrix_t, LinSolve_t, LinSolveError
+
+from typing import Callable, Optional, Union, List, Tuple, Sequence
+
+'''
+    body
+'''
+class rosenbrock_tableau(object):
+
+    def __init__(self, name : str, gamma : float, alpha : Sequence[Sequence[float]], Gamma : Sequence[Sequence[float]],
+                 b : Sequence[float], b_hat : Sequence[float], order : int, order_embedded : int):
+        '''
+            coefficients of an s-stage Rosenbrock(-W) method in the notation of Hairer and Wanner, i.e.
+            M*k_i = h*f(x_n + sum(alpha_ij*k_j)) + h*J*sum(gamma_ij*k_j) (gamma_ii == gamma) and x_n1 = x_n + sum(b_i*k_i).
+            The transformed coefficients (u_i == sum(gamma_ij*k_j)) are derived here, such that a step only requires
+            the matrix M/(h*gamma) - J (see RosenbrockStep).
+
+            :param alpha: strictly lower triangular (s, s) matrix
+            :param Gamma: strictly lower triangular (s, s) matrix (the diagonal is gamma)
+            :param b: weights of the solution
+            :param b_hat: weights of the embedded solution
+            :param order: order of the solution
+            :param order_embedded: order of the embedded solution
+        '''
+        self.name : str = name
+        self.gamma : float = gamma
+        self.order : int = order
+        self.order_embedded : int = order_embedded
+
+        alpha = np.tril(np.array(alpha, dtype = np.float64), -1)
+        Gamma = np.tril(np.array(Gamma, dtype = np.float64), -1) + gamma*np.eye(len(b))
+        Gamma_inv = np.linalg.inv(Gamma)
+
+        self.stages : int = len(b)
+        self.alphas : np.ndarray = alpha.sum(axis = 1) # time points t_n + alphas[i]*h of the stages
+        self.gammas : np.ndarray = Gamma.sum(axis = 1) # coefficients of dF/dt (non-autonomous systems)
+        self.a : np.ndarray = alpha @ Gamma_inv                   # U_i = x_n + sum(a_ij*u_j)
+        self.c : np.ndarray = np.tril(-Gamma_inv, -1)             # D_i = -sum(c_ij*u_j)/h
+        self.m : np.ndarray = np.array(b, dtype = np.float64) @ Gamma_inv     # x_n1 = x_n + sum(m_i*u_i)
+        self.m_hat : np.ndarray = np.array(b_hat, dtype = np.float64) @ Gamma_inv
+
+    def __str__(self): return f'Rosenbrock-W method: {self.name}'
+
+    def __repr__(self): return self.__str__()
+
+
+''' Rang, Angermann (2005): stiffly accurate, L-stable, order 3 (embedded 2) for index 1 DAEs, W-method of order 2 '''
+ROS34PW2 = rosenbrock_tableau(name = 'ROS34PW2', gamma = 4.3586652150845900e-01,
+                              alpha = [[0.0, 0.0, 0.0, 0.0],
+                                       [8.7173304301691801e-01, 0.0, 0.0, 0.0],
+                                       [8.4457060015369423e-01, -1.1299064236484185e-01, 0.0, 0.0],
+                                       [0.0, 0.0, 1.0, 0.0]],
+                              Gamma = [[0.0, 0.0, 0.0, 0.0],
+                                       [-8.7173304301691801e-01, 0.0, 0.0, 0.0],
+                                       [-9.0338057013044082e-01, 5.4180672388095326e-02, 0.0, 0.0],
+                                       [2.4212380706095346e-01, -1.2232505839045147e+00, 5.4526025533510214e-01, 0.0]],
+                              b = [2.4212380706095346e-01, -1.2232505839045147e+00, 1.5452602553351020e+00,
+                                   4.3586652150845900e-01],
+                              b_hat = [3.7810903145819369e-01, -9.6042292212423178e-02, 5.0000000000000000e-01,
+                                       2.1793326075422950e-01],
+                              order = 3, order_embedded = 2)
+
+''' Rang, Angermann (2005): A-stable, order 3 (embedded 2), W-method of order 3 for ODEs (not stiffly accurate) '''
+ROS3PW = rosenbrock_tableau(name = 'ROS3PW', gamma = 7.8867513459481287e-01,
+                            alpha = [[0.0, 0.0, 0.0],
+                                     [1.5773502691896257e+00, 0.0, 0.0],
+                                     [0.5, 0.0, 0.0]],
+                            Gamma = [[0.0, 0.0, 0.0],
+                                     [-1.5773502691896257e+00, 0.0, 0.0],
+                                     [-6.7075317547305480e-01, -1.7075317547305482e-01, 0.0]],
+                            b = [1.0566243270259355e-01, 4.9038105676657971e-02, 8.4529946162074843e-01],
+                            b_hat = [-1.7863279495408180e-01, 1.0/3.0, 8.4529946162074843e-01],
+                            order = 3, order_embedded = 2)
+
+rosenbrock_tableaus = {tableau.name : tableau for tableau in (ROS34PW2, ROS3PW)}
+
+
+def jacobian_blocks_func(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t], dim_x : int,
+                         use_jacobian : bool = False, use_cycADa : bool = False,
+                         tape_cache : Optional["cycADa_tape_cache"] = None,
+                         batched_jacobian : bool = False) -> Callable[[Vec_t, float], Tuple[CsMatrix_t, CsMatrix_t]]:
+    '''
+        :return: (x, t) -> dF/d(dx), dF/dx at (0, x, t) by sys_func.jacobian_blocks (or sys_func.jacobian), cycADa or
+                 finite differences (in this order of preference)
+    '''
+    zeros = np.zeros(shape = (dim_x,))
+
+    if use_jacobian and hasattr(sys_func, 'jacobian_blocks'):
+        return lambda x, t: sys_func.jacobian_blocks(zeros, x, t)
+
+    if use_jacobian:
+        def blocks(x, t):
+            dF_dx = sys_func.jacobian(zeros, x, t, 0.0)
+            return sys_func.jacobian(zeros, x, t, 1.0) - dF_dx, dF_dx
+        return blocks
+
+    if use_cycADa:
+        def blocks(x, t): # F is linear in dx: dF/d(dx) == jacobian of x -> F(x - x_n, x, t) minus dF/dx
+            if tape_cache is None:
+                dF_dx = cycADa_wrapper(lambda y: sys_func(zeros, y, t), dim_x)[1](x)
+                jac = cycADa_wrapper(lambda y: sys_func(y - x, y, t), dim_x)[1](x)
+            else:
+                dF_dx = tape_cache(0.0, zeros, t)[1](x)
+                jac = tape_cache(1.0, -x, t)[1](x)
+            return jac - dF_dx, dF_dx
+        return blocks
+
+    fd_ddx = jac_csr(fun = None, shape = (dim_x, dim_x), batched = batched_jacobian)
+    fd_ddx.assign_sparsity_pattern()
+    fd_dx = jac_csr(fun = None, shape = (dim_x, dim_x), batched = batched_jacobian)
+    fd_dx.assign_sparsity_pattern()
+    def blocks(x, t):
+        fd_ddx.fun = lambda dx: sys_func(dx, x, t)
+        fd_dx.fun = lambda y: sys_func(zeros, y, t)
+        return fd_ddx(zeros), fd_dx(x)
+    return blocks
+
+
+class stage_matrix_cache(object):
+
+    def __init__(self, eval_blocks : Callable[[Vec_t, float], Tuple[CsMatrix_t, CsMatrix_t]], linsolver : LinSolve_t,
+                 max_c_change : float = 0.2, max_age : int = 10,
+                 signature : Optional[Callable[[float], tuple]] = None):
+        '''
+            keeps the matrix W = c*dF/d(dx) + dF/dx (c == 1/(h*gamma)) of the stages of Rosenbrock-W steps factorized
+            by linsolver across steps. W-methods retain their order with any approximation of the jacobian, hence
+
+             - the factorization is reused while c deviates by at most max_c_change relatively,
+             - otherwise W is reassembled from the latest blocks dF/d(dx), dF/dx and refactorized,
+             - the blocks are re-evaluated after max_age steps, if signature(t) changes (e.g. profiles or modes of
+               active elements switch) or after reset (e.g. rejected steps).
+
+            :param eval_blocks: (x, t) -> dF/d(dx), dF/dx (see jacobian_blocks_func)
+            :param linsolver: linear solver keeping its latest factorization (e.g. splu_reuse_wrapper); inexact ones
+                              (e.g. krylov_ilu_wrapper) are passed W on each solve instead
+            :param max_c_change: max relative change of c for the factorization to be reused
+            :param max_age: max number of steps the blocks are used for
+            :param signature: (optional) callable: t -> hashable
+        '''
+        self.eval_blocks : Callable[[Vec_t, float], Tuple[CsMatrix_t, CsMatrix_t]] = eval_blocks
+        self.linsolver : LinSolve_t = linsolver
+        self.max_c_change : float = max_c_change
+        self.max_age : int = max_age
+        self.signature : Optional[Callable[[float], tuple]] = signature
+
+        self.blocks : Optional[Tuple[CsMatrix_t, CsMatrix_t]] = None
+        self._age : int = 0
+        self._signature_val = None
+        self._c : Optional[float] = None # of the factorization held by linsolver, None: no valid factorization
+        self._W : Optional[Tuple[CsMatrix_t, Vec_t, Vec_t]] = None # scaled matrix, row and column scaling
+        self._scale = matrix_row_scaling(lambda A: A)
+
+        self.num_of_evaluations : int = 0
+        self.num_of_factorizations : int = 0
+
+    def reset(self): self.blocks, self._c = None, None
+
+    def invalidate_factorization(self): self._c = None # e.g. linsolver is shared with Newton's method
+
+    def __call__(self, x : Vec_t, t : float, c : float) -> Callable[[Vec_t], Vec_t]:
+        '''
+            :param x: state the blocks are evaluated at (if necessary)
+            :param t: time point the blocks are evaluated at (if necessary)
+            :param c: coefficient of dF/d(dx)
+            :return: b -> W^-1*b
+        '''
+        signature_val = None if self.signature is None else self.signature(t)
+        if (self.blocks is None) or (self._age >= self.max_age) or (signature_val != self._signature_val):
+            self.blocks = self.eval_blocks(x, t)
+            self._age, self._signature_val, self._c = 0, signature_val, None
+            self.num_of_evaluations += 1
+        self._age += 1
+
+        if (self._c is None) or (abs(c - self._c) > self.max_c_change*abs(self._c)):
+            W, v, w = self._scale(jacobian_reuse_cache._combine(self.blocks, c))
+            if not getattr(self.linsolver, 'inexact', False): # Krylov solvers keep their preconditioner on their own
+                self.linsolver(W, np.zeros(shape = v.shape), A_did_change = True) # factorize
+            self._c, self._W = c, (W, v, w)
+            self.num_of_factorizations += 1
+
+        W, v, w = self._W
+        def solve(rhs : Vec_t) -> Vec_t:
+            u = w*self.linsolver(W, v*rhs, A_did_change = False)
+            if not np.isfinite(u).all(): raise LinSolveError('non finite solution of a stage')
+            return u
+        return solve
+
+
+def RosenbrockStep(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t], x_n : Vec_t, t_n : float, h : float,
+                   tableau : rosenbrock_tableau, W_solve : Callable[[Vec_t], Vec_t],
+                   time_derivative : bool = True) -> Tuple[Vec_t, Vec_t]:
+    '''
+        one step of a Rosenbrock(-W) method for 0 = F(dx, x, t) linear in dx (e.g. M(x)*dx - f(x, t)), i.e. the stages
+
+            W*u_i = -F(D_i, U_i, t_n + alphas[i]*h) - gammas[i]*h*dF/dt(0, x_n, t_n)
+
+        with U_i = x_n + sum(a_ij*u_j), D_i = -sum(c_ij*u_j)/h (j < i) and W ~ dF/d(dx)/(h*gamma) + dF/dx. For constant
+        dF/d(dx) this is the method applied to M*dx = f(x, t); otherwise dF/d(dx) is evaluated at the stages.
+
+        :param W_solve: b -> W^-1*b
+        :param time_derivative: estimate dF/dt by a forward difference (one evaluation); False: autonomous sys_func
+        :return: x_n1 and its local error estimate (difference to the embedded solution)
+    '''
+    us : List[Vec_t] = []
+    F_t : Optional[Vec_t] = None
+    for i in range(tableau.stages):
+        U_i = x_n + sum(a_ij*u_j for a_ij, u_j in zip(tableau.a[i, :i], us))
+        D_i = -sum(c_ij*u_j for c_ij, u_j in zip(tableau.c[i, :i], us))/h if i > 0 else np.zeros(shape = x_n.shape)
+        F_i = sys_func(D_i, U_i, t_n + tableau.alphas[i]*h)
+
+        if time_derivative and (i == 0): # alphas[0] == 0, i.e. F_0 == F(0, x_n, t_n)
+            dt = np.sqrt(np.finfo(np.float64).eps)*max(1.0, abs(t_n), h)
+            F_t = (sys_func(D_i, x_n, t_n + dt) - F_i)/dt
+
+        rhs = -F_i if F_t is None else -F_i - (tableau.gammas[i]*h)*F_t
+        us.append(W_solve(rhs))
+
+    x_n1 = x_n + sum(m_i*u_i for m_i, u_i in zip(tableau.m, us))
+    le = sum((m_i - m_hat_i)*u_i for m_i, m_hat_i, u_i in zip(tableau.m, tableau.m_hat, us))
+    if not np.isfinite(x_n1).all(): raise RuntimeError('non finite Rosenbrock step')
+
+    return x_n1, le
+
+
+def integrate(sys_func : Callable[[Vec_t, Vec_t, float], Vec_t],
+              x0 : Vec_t,
+              t0 : float = 0.0, T : float = 1.0,
+              h : Optional[float] = None,
+              callback : Optional[Callable] = lambda *args, **kwargs: None,
+              integrator_opts = None):
+    '''
+    Rosenbrock-W
+
+    The first step and steps onto custom points (e.g. breakpoints of profiles) are implicit Euler steps (Newton's
+    method) of size h, such that the Rosenbrock-W steps start from consistent values and never linearize across
+    jumps. All other steps are error controlled w.r.t. atol_dom and rtol_dom by the embedded solution. If a step
+    violates the algebraic constraints (beyond atol_range) or the error estimates of a repeated step don't decay with h
+    (e.g. modes of active elements switch within the step), the step is repeated by implicit Euler of at most the
+    rejected size. These fallbacks are error controlled by local_error_norm (and keep on shrinking h while it fails)
+    as long as the latest two nodes lie behind the latest custom point.
+
+    :param sys_func: system function of a DAE in standard form, i.e. 0 = sys_func(dx, x, t), linear in dx
+    :param x0: initial value
+    :param t0: initial time point
+    :param T: final time point
+    :param h: initial step size (also the step size of implicit Euler steps onto custom points)
+    :param callback: called with Ts, Hs, Xs after each accepted step
+    :param integrator_opts: Rosenbrock_integration_options
+    :return: integration_report
+    '''
+
+    ''' parsing '''
+    if integrator_opts is None: integrator_opts = Rosenbrock_integration_options()
+
+    _h_thresh = min(1.0e-14, T - t0)
+    h_grid = max(min(T - t0, integrator_opts.h_grid or T - t0), _h_thresh)
+    t_grid_start = t0 + integrator_opts.grid_offset
+    h_max = max(min(T - t0, integrator_opts.h_max or T - t0, h_grid), _h_thresh)
+    h_min = max(min(h_max, integrator_opts.h_min), _h_thresh)
+    if h is None: h_start : float = (T-t0)/100.0
+    else: h_start : float = h
+    if not integrator_opts.one_step: h_start : float = max(min(h_max, h_start), h_min)
+
+    tableau : rosenbrock_tableau = integrator_opts.method
+    if isinstance(tableau, str): tableau = rosenbrock_tableaus[tableau]
+
+    x0 = force_array(x0, force_1D = True)
+    if len(x0.shape) != 1: raise AssertionError("error")
+    f0 = sys_func(np.zeros(shape = x0.shape), x0, t0)
+    if len(f0.shape) != 1: raise AssertionError("error")
+
+    customPts = breakpoint_schedule(integrator_opts.custom_time_points, t0 = t0, T = T, beyond = T + 2.0*h_max)
+
+    ''' record step function on a cycADa tape only once (if chosen) '''
+    use_jacobian : bool = integrator_opts.analytic_jacobian and hasattr(sys_func, 'jacobian')
+    if integrator_opts.cycADa and (not use_jacobian) and (not cycADa_available):
+        raise ModuleNotFoundError("cycADa was requested but isn't available (choose analytic_jacobian if possible)!")
+
+    tape_cache : Optional["cycADa_tape_cache"] = None
+    if integrator_opts.cycADa and integrator_opts.reuse_tape and (not use_jacobian):
+        tape_cache = cycADa_tape_cache(sys_func, ndim = len(x0),
+                                       signature = getattr(sys_func, 'tape_signature', None))
+
+    ''' stage matrix (shared linear solver with the implicit Euler steps) '''
+    linsolver : LinSolve_t = integrator_opts.linsolver or splu_reuse_wrapper() # has to keep its factorization
+    W_cache = stage_matrix_cache(jacobian_blocks_func(sys_func, len(x0), use_jacobian = use_jacobian,
+                                                      use_cycADa = integrator_opts.cycADa, tape_cache = tape_cache,
+                                                      batched_jacobian = integrator_opts.batched_jacobian),
+                                 linsolver = linsolver,
+                                 max_c_change = integrator_opts.jacobian_reuse_max_h_change,
+                                 max_age = integrator_opts.jacobian_reuse_max_steps,
+                                 signature = getattr(sys_func, 'tape_signature', None))
+
+    ''' step size control based on the embedded solution '''
+    dF_ddx : Optional[CsMatrix_t] = differential_part(sys_func, x0, t0)
+    h_factor_min, h_factor_max = integrator_opts.step_size_factor_range
+    num_of_rejected_steps : int = 0
+
+    ''' algebraic constraints are met by the linearized stages unless e.g. modes of active elements switch '''
+    algebraic_rows : Optional[np.ndarray] = None if dF_ddx is None else np.flatnonzero(np.diff(dF_ddx.indptr) == 0)
+
+    def algebraic_residual(x : Vec_t, t : float) -> float:
+        if (algebraic_rows is None) or (len(algebraic_rows) == 0): return 0.0
+        return np.max(np.abs(sys_func(np.zeros(shape = x.shape), x, t)[algebraic_rows]))
+
+    def h_factor(err : float, q : int = tableau.order_embedded) -> float:
+        if err == 0.0: return h_factor_max
+        return min(h_factor_max, max(h_factor_min, integrator_opts.step_size_safety*err**(-1.0/(q + 1))))
+
+    ''' step loop '''
+    Ts : List[float] = [t0]
+    Hs : List[Union[None, float]] = [None]
+    Xs : List[Vec_t] = [x0]
+    Errs : List[Union[None, float]] = [None]
+    Nits : List[Union[None, int]] = [None]
+    if not (integrator_opts.result_sink is None): integrator_opts.result_sink(t0, x0)
+
+    simul_loop : bool = True
+    simul_loop_idx : int = -1
+
+    tt_grid = t_grid_start + (c_tt := 1)*h_grid
+    customPt = next(customPts)
+    tt = min(tt_grid, customPt) # next grid or custom point; only passed on by accepted steps
+    h = h_start
+    h_restart : float = h_start # step size of implicit Euler steps onto custom points (reduced if Newton's method fails)
+    consistent : bool = integrator_opts.one_step # x0 is taken as consistent only for single steps
+    err_rejected : Optional[Tuple[float, float]] = None # h and err of the latest rejected attempt of the current step
+    restart_idx : int = 0 # node of the latest custom point; implicit Euler fallbacks are estimated by nodes from there on
+    fallback : bool = False # the current step is repeated by implicit Euler (controlled by its own error estimate)
+    h_shrink_factor : float = 4.0
+    num_of_newton_iterations : int = 0
+    num_of_nl_failures : int = 0 # steps repeated with a smaller h since Newton's method or a linear solve failed
+
+    while simul_loop:
+        simul_loop_idx += 1
+
+        if integrator_opts.one_step: simul_loop = False
+        else:
+            ''' check h would lead across custom or grid points or beyond integration interval '''
+            if (tt == customPt) and (Ts[-1] + h_min < customPt - h_restart < Ts[-1] + h):
+                h = customPt - h_restart - Ts[-1] # jumps of (right continuous) profiles at custom points enter the step onto the point; keep it at h_restart
+            elif (Ts[-1] + h) >= (min(tt, T) - h_min): h = max(min(tt, T) - Ts[-1], h_min)
+
+        t_new = Ts[-1] + h
+        onto_customPt : bool = (t_new >= customPt - h_min) and (not integrator_opts.one_step)
+        restart : bool = (not consistent) or onto_customPt
+
+        '''
+            step execution
+        '''
+        advance_step = False
+        err : Optional[float] = None
+        nit : Optional[int] = None
+        try:
+            if restart:
+                W_cache.invalidate_factorization() # Newton's method factorizes its own matrices
+                t_new, x_new, success, _, nit = ImpEulerStep(sys_func = sys_func, x_n = Xs[-1], t_n = Ts[-1], h = h,
+                                                             atol = integrator_opts.atol_range,
+                                                             rtol = integrator_opts.rtol_range,
+                                                             use_cycADa = integrator_opts.cycADa,
+                                                             tape_cache = tape_cache,
+                                                             use_jacobian = use_jacobian,
+                                                             linsolver = linsolver,
+                                                             batched_jacobian = integrator_opts.batched_jacobian)
+                num_of_newton_iterations += nit or 0
+                if not success: raise RuntimeError('Newton\'s method failed')
+                if fallback and (not onto_customPt) and (len(Ts) - 2 >= restart_idx):
+                    err = local_error_norm(x_new, Xs[-1], Xs[-2], h, Hs[-1],
+                                           atol = integrator_opts.atol_dom, rtol = integrator_opts.rtol_dom,
+                                           dF_ddx = dF_ddx)
+            else:
+                W_solve = W_cache(Xs[-1], Ts[-1], 1.0/(h*tableau.gamma))
+                x_new, le = RosenbrockStep(sys_func, x_n = Xs[-1], t_n = Ts[-1], h = h, tableau = tableau,
+                                           W_solve = W_solve, time_derivative = integrator_opts.time_derivative)
+                if not integrator_opts.one_step:
+                    err = error_norm(le, Xs[-1], x_new,
+                                     atol = integrator_opts.atol_dom, rtol = integrator_opts.rtol_dom, dF_ddx = dF_ddx)
+                    consistent = algebraic_residual(x_new, t_new) <= integrator_opts.atol_range
+            advance_step = True
+        except (RuntimeError, NLinSolveError, LinSolveError) as e: # the following code deals with solver issues only and should not be confused with step size control
+            if h <= h_min: raise e
+
+            num_of_nl_failures += 1
+            W_cache.reset()
+            print(f"\t>>> {'nl' if restart else 'linear'} solver failed with {e} ==> Try again - reduce h from: {h}", end = " ")
+            h = max(h_min, h/h_shrink_factor)
+            if onto_customPt: h_restart = min(h_restart, h)
+            print(f"to: {h}!")
+
+        '''
+            step size control
+        '''
+        h_next = h
+        if advance_step and (not restart) and (not consistent):
+            advance_step = False
+            num_of_rejected_steps += 1
+            W_cache.reset()
+            h, err_rejected, fallback = min(h, h_restart), None, True
+            print(f"\t>>> algebraic constraints violated ==> reject step and repeat it by implicit Euler with h: {h}!")
+        elif advance_step and not (err is None):
+            h_next = h*h_factor(err, 1 if restart else tableau.order_embedded)
+            if (err > 1.0) and (h > h_min):
+                advance_step = False
+                num_of_rejected_steps += 1
+                W_cache.reset() # re-evaluate the (possibly stale) jacobian, too
+                print(f"\t>>> local error estimate {err} too large ==> reject step", end = " ")
+                if (not restart) and (not (err_rejected is None)) and (err/err_rejected[1] > h/err_rejected[0]):
+                    consistent = False # err doesn't even decay like h, e.g. modes of active elements switch: step over by implicit Euler
+                    h, err_rejected, fallback = min(err_rejected[0], h_restart), None, True # at most the size of the first rejected attempt
+                    print(f"and repeat it by implicit Euler with h: {h}!")
+                else: # implicit Euler fallbacks keep on shrinking h, too
+                    if not restart: err_rejected = (h, err)
+                    print(f"and reduce h from: {h}", end = " ")
+                    h = max(h_min, min(h_next, h*integrator_opts.step_size_safety))
+                    print(f"to: {h}!")
+
+        '''
+            step conclusion
+        '''
+        if advance_step:
+            Ts.append(t_new)
+            Hs.append(h)
+            Xs.append(x_new)
+            Errs.append(err)
+            Nits.append(nit)
+            consistent, err_rejected, fallback = True, None, False
+
+            if Ts[-1] >= (T - h_min): simul_loop = False
+            h = max(h_min, min(h_max, h_next))
+            if Ts[-1] >= (tt - h_min): # grid or custom point reached
+                if tt_grid <= tt + h_min: tt_grid = t_grid_start + (c_tt := (c_tt + 1))*h_grid
+                if customPt <= tt + h_min:
+                    customPt = customPts.next_after(tt + h_min)
+                    h, h_restart = min(h, h_start), h_start
+                    restart_idx = len(Ts) - 1
+                tt = min(tt_grid, customPt)
+
+            if not (integrator_opts.result_sink is None): integrator_opts.result_sink(t_new, x_new)
+            if not integrator_opts.keep_trajectory: # one step method (two nodes for the estimates of fallbacks)
+                restart_idx = trim_histories(2, restart_idx, Ts, Hs, Xs, Errs, Nits)
+
+            callback(Ts, Hs, Xs)
+
+            print(f"{100.0*((Ts[-1] - t0)/(T - t0)):>7.2f}%", end = " | ")
+            print(f"i : {simul_loop_idx + 1:>2d}", end = " | ")
+            print(f"{'ImpEuler' if restart else tableau.name}", end = " | ")
+            print(f"t_n1 = {t_new}")
+
+    simul_report = integration_report()
+    simul_report.Ts = Ts
+    simul_report.Hs = Hs
+    simul_report.Xs = Xs
+    simul_report.Errs_predicted = Errs
+    simul_report.num_of_rejected_steps = num_of_rejected_steps
+    simul_report.Nits = Nits
+    simul_report.num_of_newton_iterations = num_of_newton_iterations
+    simul_report.num_of_nl_failures = num_of_nl_failures
+    simul_report.num_of_jacobian_evaluations = W_cache.num_of_evaluations
+    simul_report.num_of_factorizations = W_cache.num_of_factorizations
+    simul_report.msg = "Rosenbrock-W integration complete"
+    if not (tape_cache is None):
+        simul_report.num_of_tape_recordings = tape_cache.num_of_recordings
+        simul_report.num_of_tape_reuses = tape_cache.num_of_reuses
+
+    return simul_report
+
+
+'''
+    options dict definition and setting default values.
+'''
+class Rosenbrock_integration_options(integration_options):
+
+    def __init__(self):
+        self.additional_keys = ['cycADa', 'reuse_tape', 'analytic_jacobian', 'linsolver', 'batched_jacobian',
+                                'method', 'time_derivative',
+                                'step_size_safety', 'step_size_factor_range',
+                                'jacobian_reuse_max_h_change', 'jacobian_reuse_max_steps']
+
+        super().__init__(name = "Rosenbrock-W integrator options")
+
+        self.cycADa : bool = False
+        self.reuse_tape : bool = False # record sys_func once on a cycADa tape and re-evaluate it for all steps (requires cycADa)
+        self.analytic_jacobian : bool = False # use sys_func.jacobian_blocks or sys_func.jacobian if provided (preferred over cycADa)
+        self.linsolver : Optional[LinSolve_t] = None # linear solver keeping its factorization; None: splu_reuse_wrapper()
+        self.batched_jacobian : bool = False # finite differences: evaluate all directions by one call of sys_func on a batch of states
+
+        self.method : Union[str, rosenbrock_tableau] = 'ROS34PW2' # 'ROS34PW2', 'ROS3PW' or a rosenbrock_tableau
+        self.time_derivative : bool = True # estimate dF/dt per step; False for autonomous systems (saves one evaluation)
+
+        self.step_size_safety : float = 0.9
+        self.step_size_factor_range : Tuple[float, float] = (0.2, 5.0) # bounds of h_new/h per step
+
+        self.jacobian_reuse_max_h_change : float = 0.2 # refactorize if 1/h changes relatively by more than this
+        self.jacobian_reuse_max_steps : int = 10 # re-evaluate the jacobian after this many steps (W-methods tolerate stale ones)
@@ -12,6 +12,8 @@ __credits__ = ('Lennart Jansen',) # alphabetical order of surnames
     =======
 '''
 import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import LinearOperator
 
 from paso.util.types_and_errors import Vec_t, CsMatrix_t, Callback_t, LinSolve_t, LinSolveError, NLinSolveError
 from paso.util.report_and_option_class import options_base, results_base
@@ -28,33 +30,206 @@ from typing import Tuple, Union, Optional, Callable, Any, List
     ====
 '''
 class lin_solver_cookie(object):
-    def __init__(self, linsolver : LinSolve_t): self.solve : LinSolve_t = linsolver
+    def __init__(self, linsolver : LinSolve_t):
+        self.solve : LinSolve_t = linsolver
+        self.inexact : bool = getattr(linsolver, 'inexact', False) # accepts rtol, see linsolver_template
 
 
 class matrix_row_scaling(object):
 
-    def __init__(self, matrix_func : Callable[[Any], CsMatrix_t], apply_scaling : bool = True):
+    def __init__(self, matrix_func : Callable[[Any], CsMatrix_t], apply_scaling : bool = True,
+                 apply_column_scaling : bool = False):
+        '''
+            scales rows (and/or columns) of the matrices provided by matrix_func by the inverse of their 1-norms.
+            Both together (rows first) realize an equilibration.
+
+            :param matrix_func: function providing CSR (or other scipy sparse) matrices
+            :param apply_scaling: scale rows
+            :param apply_column_scaling: scale columns (of the row scaled matrix if apply_scaling)
+        '''
         self.matrix_func : Callable[[Any], CsMatrix_t] = matrix_func
         self.apply_scaling : bool = apply_scaling
+        self.apply_column_scaling : bool = apply_column_scaling
 
-    def __call__(self, *args, **kwargs) -> Tuple[CsMatrix_t, Vec_t]:
+    @staticmethod
+    def _inverse(norms : Vec_t) -> Vec_t:
+        norms[norms == 0.0] = 1.0 # leave empty rows or columns untouched
+        return 1.0/norms
+
+    def __call__(self, *args, **kwargs) -> Tuple[CsMatrix_t, Vec_t, Vec_t]:
         '''
-            docu
+            scales the data of J_n in place: J_n <- diag(v)*J_n*diag(w)
 
-            :param J_n:
-            :return:
+            :return: scaled J_n, row scaling v and column scaling w
         '''
         J_n = self.matrix_func(*args, **kwargs)
 
-        if not self.apply_scaling: return J_n, np.ones(shape = (J_n.shape[0],))
+        num_rows, num_cols = J_n.shape
+        v, w = np.ones(shape = (num_rows,)), np.ones(shape = (num_cols,))
+        if not (self.apply_scaling or self.apply_column_scaling): return J_n, v, w
+
+        if not isinstance(J_n, csr_matrix): J_n = csr_matrix(J_n)
+        data, indices, indptr = J_n.data, J_n.indices, J_n.indptr
+
+        if self.apply_scaling:
+            row_ids = np.repeat(np.arange(num_rows), np.diff(indptr))
+            v = self._inverse(np.bincount(row_ids, weights = abs(data), minlength = num_rows))
+            data *= v[row_ids]
+
+        if self.apply_column_scaling:
+            w = self._inverse(np.bincount(indices, weights = abs(data), minlength = num_cols))
+            data *= w[indices]
+
+        return J_n, v, w
+
+
+class broyden_updates(object):
+
+    def __init__(self):
+        '''
+            good Broyden updates B_k+1 = B_k + u_k*v_k^T (v_k == s_k the step, u_k == (dg_k - B_k*s_k)/(s_k^T*s_k))
+            of a factorized matrix B_0. Solves with B_k apply the Sherman-Morrison-Woodbury formula recursively, i.e.
+            one solve with B_0 and k vector updates; each update costs one solve with B_0.
+        '''
+        self.u, self.v, self.w, self.d = [], [], [], [] # w_k == B_k^-1*u_k, d_k == 1 + v_k^T*w_k
+
+    def __len__(self): return len(self.u)
+
+    def reset(self): self.__init__()
+
+    def correct(self, y : Vec_t) -> Vec_t:
+        '''
+            :param y: B_0^-1*b
+            :return: B_k^-1*b
+        '''
+        for v, w, d in zip(self.v, self.w, self.d): y = y - ((v @ y)/d)*w
+        return y
+
+    def matvec(self, B_0 : CsMatrix_t, y : Vec_t) -> Vec_t:
+        return B_0 @ y + sum(u*(v @ y) for u, v in zip(self.u, self.v))
+
+    def rmatvec(self, B_0 : CsMatrix_t, g : Vec_t) -> Vec_t:
+        return B_0.T @ g + sum(v*(u @ g) for u, v in zip(self.u, self.v))
 
-        num_rows, data, indptr = J_n.shape[0], J_n.data, J_n.indptr
-        v = np.ones(shape = (num_rows,))
-        for idx_row in range(num_rows):
-            v[idx_row] /= sum(abs(J_n[idx_row, :].data))
-            J_n[idx_row, :] *= v[idx_row]
+    def operator(self, B_0 : CsMatrix_t) -> Union[CsMatrix_t, LinearOperator]:
+        if len(self) == 0: return B_0
+        return LinearOperator(B_0.shape, matvec = lambda y: self.matvec(B_0, y),
+                              rmatvec = lambda g: self.rmatvec(B_0, g), dtype = B_0.dtype)
+
+    def update(self, solve : Callable[[Vec_t], Vec_t], B_0 : CsMatrix_t, s : Vec_t, dg : Vec_t,
+               min_denominator : float = 1.0e-8) -> bool:
+        '''
+            :param solve: b -> B_0^-1*b
+            :param s: step (in the variables of B_0)
+            :param dg: change of the residual along s
+            :return: False if the update is (nearly) singular and hasn't been applied
+        '''
+        s_norm_sq : float = s @ s
+        if s_norm_sq == 0.0: return False
 
-        return J_n, v
+        u = (dg - self.matvec(B_0, s))/s_norm_sq
+        try: w = self.correct(solve(u))
+        except LinSolveError: return False
+        d = 1.0 + s @ w
+        if (not np.isfinite(d)) or (abs(d) < min_denominator): return False
+
+        self.u.append(u)
+        self.v.append(s)
+        self.w.append(w)
+        self.d.append(d)
+        return True
+
+
+def _armijo_step(fun : Callable[[Vec_t], Vec_t], x_n : Vec_t, dir_x_n : Vec_t, merit_scaling : Vec_t,
+                 merit_n : float, eta : float, gamma_min : float,
+                 sufficient_decrease : float) -> Optional[Tuple[Vec_t, Vec_t, float]]:
+    '''
+        backtracking line search on phi(gamma) == 0.5*|merit_scaling*fun(x_n + gamma*dir_x_n)|**2 with quadratic (first
+        backtrack) and cubic interpolation (afterwards), safeguarded to [0.1, 0.5]*gamma, see Dennis & Schnabel (A6.3.1)
+
+        :param merit_n: |merit_scaling*fun(x_n)|
+        :param eta: relative residual of the linear solve, i.e. d(phi)/d(gamma)(0) == -(1 - eta)*merit_n**2
+        :return: x_n1, fun(x_n1) and gamma of the first trial with sufficient decrease; None if gamma < gamma_min
+    '''
+    phi_0 : float = 0.5*merit_n**2
+    dphi_0 : float = -(1.0 - eta)*merit_n**2
+
+    gamma : float = 1.0
+    gamma_prev, phi_prev = None, None
+    while gamma >= gamma_min:
+        x_n1 : Vec_t = x_n + gamma*dir_x_n
+        f_n1 : Vec_t = fun(x_n1)
+        if not np.isfinite(f_n1).all():
+            gamma_prev, phi_prev = None, None # don't interpolate across the border of dom(fun)
+            gamma /= 2.0
+            continue
+
+        phi : float = 0.5*np.linalg.norm(merit_scaling*f_n1)**2
+        if phi <= phi_0 + sufficient_decrease*gamma*dphi_0: return x_n1, f_n1, gamma
+
+        if gamma_prev is None: gamma_new = -dphi_0*gamma**2/(2.0*(phi - phi_0 - dphi_0*gamma))
+        else:
+            r1, r2 = phi - phi_0 - dphi_0*gamma, phi_prev - phi_0 - dphi_0*gamma_prev
+            a = (r1/gamma**2 - r2/gamma_prev**2)/(gamma - gamma_prev)
+            b = (-gamma_prev*r1/gamma**2 + gamma*r2/gamma_prev**2)/(gamma - gamma_prev)
+            if a == 0.0: gamma_new = -dphi_0/(2.0*b)
+            else: gamma_new = (-b + np.sqrt(max(b*b - 3.0*a*dphi_0, 0.0)))/(3.0*a)
+        if not np.isfinite(gamma_new): gamma_new = 0.5*gamma
+
+        gamma_prev, phi_prev = gamma, phi
+        gamma = min(max(gamma_new, 0.1*gamma), 0.5*gamma)
+
+    return None
+
+
+def _dogleg_step(fun : Callable[[Vec_t], Vec_t], x_n : Vec_t, g_n : Vec_t, J_n : CsMatrix_t, merit_scaling : Vec_t,
+                 col_scaling : Vec_t, dir_y : Vec_t, radius : float, min_radius : float,
+                 sufficient_decrease : float) -> Tuple[Optional[Tuple[Vec_t, Vec_t, float]], float]:
+    '''
+        dogleg trust region step for min 0.5*|merit_scaling*fun(x)|**2 in the column scaled variables y (i.e.
+        x == x_n + col_scaling*y) of the (scaled) jacobian J_n
+
+        :param g_n: merit_scaling*fun(x_n)
+        :param dir_y: (inexact) Newton direction in y, i.e. J_n*dir_y ~ -g_n
+        :param radius: trust radius (w.r.t. |y|)
+        :param min_radius: trust regions below this radius count as failure
+        :return: (x_n1, fun(x_n1), |y|/|dir_y|) or None, updated trust radius
+    '''
+    newton_norm : float = np.linalg.norm(dir_y)
+    merit_n_sq : float = g_n @ g_n
+    if newton_norm == 0.0: return (x_n, fun(x_n), 1.0), radius # x_n is a root (of the linearization) already
+
+    grad : Vec_t = J_n.T @ g_n # gradient of 0.5*|g|**2 w.r.t. y
+    J_grad : Vec_t = J_n @ grad
+    cauchy : Vec_t = -((grad @ grad)/max(J_grad @ J_grad, np.finfo(float).tiny))*grad
+    cauchy_norm : float = np.linalg.norm(cauchy)
+
+    while (radius >= min_radius) and (radius > 0.0):
+        if newton_norm <= radius: y = dir_y
+        elif cauchy_norm >= radius: y = (radius/cauchy_norm)*cauchy
+        else: # |cauchy + tau*(dir_y - cauchy)| == radius
+            d = dir_y - cauchy
+            dd, cd = d @ d, cauchy @ d
+            tau = (-cd + np.sqrt(cd*cd + dd*(radius**2 - cauchy_norm**2)))/dd
+            y = cauchy + tau*d
+        y_norm : float = np.linalg.norm(y)
+
+        x_n1 : Vec_t = x_n + col_scaling*y
+        f_n1 : Vec_t = fun(x_n1)
+        if not np.isfinite(f_n1).all():
+            radius = 0.25*y_norm
+            continue
+
+        g_lin : Vec_t = g_n + J_n @ y
+        predicted : float = merit_n_sq - g_lin @ g_lin
+        actual : float = merit_n_sq - np.linalg.norm(merit_scaling*f_n1)**2
+        rho : float = actual/predicted if predicted > 0.0 else -1.0
+
+        if rho < 0.25: radius = 0.25*y_norm
+        elif (rho > 0.75) and (y_norm >= 0.99*radius): radius = 2.0*radius
+        if rho >= sufficient_decrease: return (x_n1, f_n1, y_norm/newton_norm), radius
+
+    return None, radius
 
 
 def sparse_nl_solve(fun : Callable[[Vec_t], Vec_t],
@@ -64,7 +239,8 @@ def sparse_nl_solve(fun : Callable[[Vec_t], Vec_t],
                     tolfunc_range : Optional[Callable[[Vec_t], Vec_t]] = None,
                     callback : Optional[Callback_t] = None,
                     linsolver : Optional[LinSolve_t] = None,
-                    options : Optional['sparse_newton_options'] = None) -> 'sparse_newton_results':
+                    options : Optional['sparse_newton_options'] = None,
+                    J0 : Optional[Union[CsMatrix_t, Tuple[CsMatrix_t, Vec_t, Vec_t]]] = None) -> 'sparse_newton_results':
     '''
         docu
 
@@ -76,6 +252,10 @@ def sparse_nl_solve(fun : Callable[[Vec_t], Vec_t],
         :param callback:
         :param linsolver:
         :param options:
+        :param J0: (optional) scaled jacobian, row and column scaling, e.g. report.J_factorized of a previous solve.
+                   It has to be the matrix factorized by linsolver in its latest call and is used (without
+                   re-factorization) instead of jac(x0) until it is recomputed as usual.
+                   Alternatively a plain (unscaled) matrix which is scaled and factorized instead of jac(x0).
         :return:
     '''
 
@@ -94,6 +274,19 @@ def sparse_nl_solve(fun : Callable[[Vec_t], Vec_t],
     gamma_min : float = options.gamma_min
     no_convergence_is_Error : bool = options.no_convergence_is_Error
     apply_row_scaling : bool = options.apply_row_scaling
+    apply_column_scaling : bool = options.apply_column_scaling
+    batched_jacobian : bool = options.batched_jacobian
+    eta_max : float = options.eta_max
+    eta_min : float = options.eta_min
+    globalization : str = options.globalization
+    sufficient_decrease : float = options.sufficient_decrease
+    stall_gamma : float = options.stall_gamma
+    broyden : bool = options.broyden
+    broyden_max_rate : float = options.broyden_max_rate
+    if broyden: max_times_J_n_constant = options.broyden_max_updates # updates replace refreshes
+
+    if not (globalization in ('damping', 'armijo', 'trust_region')):
+        raise NLinSolveError(f"unknown globalization: {globalization} (choose damping, armijo or trust_region)!")
 
     if (atol_dom is None) and (rtol_dom is None) and (atol_range is None) and (rtol_range is None) and (atol_root is None):
         raise NLinSolveError("choose some convergence criterion! Not all of them can be 'None'!")
@@ -105,12 +298,14 @@ def sparse_nl_solve(fun : Callable[[Vec_t], Vec_t],
 
     if linsolver is None: linsolver = lin_solver_cookie(linsolver = spsolve_simple_wrapper())
     else: linsolver = lin_solver_cookie(linsolver = linsolver)
+    forcing_terms : bool = options.forcing_terms and linsolver.inexact
 
     ''' if jac not provided as function by user --> use finite difference approximation '''
     eval_fun = call_counter(fun) # this class will count every time it has been called -> to find 'nfev' later
     if not callable(jac):
         jac_func = jac_csr(fun = eval_fun,
-                           shape = (len(eval_fun(x0).reshape(-1,)), len(x0.reshape(-1,))))
+                           shape = (len(eval_fun(x0).reshape(-1,)), len(x0.reshape(-1,))),
+                           batched = batched_jacobian)
         if isinstance(jac, (list, tuple, dict)):
             if isinstance(jac, dict): jac = (np.array(jac['indices'], copy = False),
                                              np.array(jac['indptr'], copy = False))
@@ -123,7 +318,8 @@ def sparse_nl_solve(fun : Callable[[Vec_t], Vec_t],
         jac = jac_func
 
     eval_orig_jac = call_counter(jac) # this class will count every time it has been called -> to find 'njev' later
-    eval_jac = matrix_row_scaling(eval_orig_jac, apply_scaling = apply_row_scaling)
+    eval_jac = matrix_row_scaling(eval_orig_jac, apply_scaling = apply_row_scaling,
+                                  apply_column_scaling = apply_column_scaling)
 
 
     '''
@@ -137,63 +333,145 @@ def sparse_nl_solve(fun : Callable[[Vec_t], Vec_t],
     tol_f_n : Vec_t = tolfunc_range(f_n)
     tol_f_n_norm : float = np.linalg.norm(tol_f_n)
 
-    J_n, scaling_n = eval_jac(x_n) # J_n : CsMatrix_t, scaling_n : Vec_t
-    latest_J_n_change_at_idx : int = 0
+    J_factorized : Optional[Tuple[CsMatrix_t, Vec_t, Vec_t]] = None
+    if J0 is None:
+        J_n, scaling_n, col_scaling_n = eval_jac(x_n) # J_n : CsMatrix_t, scaling_n : Vec_t, col_scaling_n : Vec_t
+        latest_J_n_change_at_idx : int = 0
+    elif isinstance(J0, tuple):
+        J_n, scaling_n, col_scaling_n = J_factorized = J0
+        latest_J_n_change_at_idx : int = -1 # i.e. already factorized by linsolver
+    else:
+        J_n, scaling_n, col_scaling_n = matrix_row_scaling(lambda: csr_matrix(J0, copy = True),
+                                                           apply_scaling = apply_row_scaling,
+                                                           apply_column_scaling = apply_column_scaling)()
+        latest_J_n_change_at_idx : int = 0
     recompute_J_n : bool = False
+    rate : float = 0.0 # max contraction of the residual norm by a Newton step
+    eta : float = eta_max # forcing term, i.e. relative tolerance of inexact linsolvers (Eisenstat-Walker, choice 2)
+    radius : Optional[float] = None # trust radius, None: full Newton step first
+    nfev_rejected : int = 0 # evaluations of fun at trial points rejected by the globalization
+    num_of_damping_fallbacks : int = 0 # armijo/trust_region stalled (fresh jacobian) or crawled: the damped iteration restarts from x0
+    restart_damped : bool = False
+    quasi_newton : broyden_updates = broyden_updates() # of J_n (if broyden)
+    num_of_broyden_updates : int = 0
 
     success : bool = False
     idx_newton_step : int = 0
     while idx_newton_step < max_it:
+        if restart_damped: # last resort (e.g. at kinks of piecewise smooth fun or local minima of the merit function)
+            restart_damped = False
+            num_of_damping_fallbacks += 1
+            max_it = idx_newton_step + options.max_it # the damped iteration from x0 with an iteration budget of its own
+            radius, eta = None, eta_max
+            x_n = x0
+            tol_x_n = tolfunc_dom(x_n)
+            f_n = eval_fun(x_n)
+            tol_f_n = tolfunc_range(f_n)
+            tol_f_n_norm = np.linalg.norm(tol_f_n)
+            J_n, scaling_n, col_scaling_n = eval_jac(x_n)
+            latest_J_n_change_at_idx = idx_newton_step
+            quasi_newton.reset()
+
         ''' gather some meta info about J_n, i.e. the jacobian '''
         J_n_constant_for : int = idx_newton_step - latest_J_n_change_at_idx
         J_n_is_changed : bool = (J_n_constant_for == 0)
 
         ''' execute actual Newton step '''
         try:
-            dir_x_n = linsolver.solve(A = J_n, b = -scaling_n*f_n,
-                                      A_did_change = J_n_is_changed)
+            if forcing_terms: dir_x_n = linsolver.solve(A = J_n, b = -scaling_n*f_n,
+                                                        A_did_change = J_n_is_changed, rtol = eta)
+            else: dir_x_n = linsolver.solve(A = J_n, b = -scaling_n*f_n,
+                                            A_did_change = J_n_is_changed)
+            J_factorized = (J_n, scaling_n, col_scaling_n)
             if not isinstance(dir_x_n, np.ndarray): raise NLinSolveError('lin solver returned no array')
+            dir_x_n = quasi_newton.correct(dir_x_n)
+            dir_y_n : Vec_t = dir_x_n
+            dir_x_n = col_scaling_n*dir_x_n
         except LinSolveError as e:
             if not J_n_is_changed:
-                J_n, scaling_n = eval_jac(x_n) # force jacobian recomputation
+                J_n, scaling_n, col_scaling_n = eval_jac(x_n) # force jacobian recomputation
                 latest_J_n_change_at_idx = idx_newton_step
+                quasi_newton.reset()
                 continue # repeat this Newton step over again with recomputed jacobian
             else: raise NLinSolveError(f'LinSolveError({e}) has been raised!')
 
         ''' determining next state of next Newton-step '''
-        local_gamma : float = 1.0
-        while local_gamma >= gamma_min: # simple or primitive dampening
-            x_n1 : Vec_t = x_n + local_gamma*dir_x_n
-
-            ''' compute f(x_n1) and check validity '''
-            f_n1 : Vec_t = eval_fun(x_n1)
-            if np.isnan(f_n1).any() or np.isinf(f_n1).any():
-                local_gamma /= 2.0
-                continue # shrink Newton step until x_n1 within dom(fun) and repeat while loop!
+        nfev_before : int = eval_fun.calls
+        damped : bool = (globalization == 'damping') or (num_of_damping_fallbacks > 0)
+        if not damped:
+            if globalization == 'armijo':
+                trial = _armijo_step(eval_fun, x_n, dir_x_n, merit_scaling = scaling_n,
+                                     merit_n = np.linalg.norm(scaling_n*f_n),
+                                     eta = eta if forcing_terms else 0.0,
+                                     gamma_min = gamma_min, sufficient_decrease = sufficient_decrease)
+            else:
+                if radius is None: radius = np.linalg.norm(dir_y_n)
+                trial, radius = _dogleg_step(eval_fun, x_n, scaling_n*f_n, quasi_newton.operator(J_n),
+                                             merit_scaling = scaling_n,
+                                             col_scaling = col_scaling_n, dir_y = dir_y_n,
+                                             radius = radius, min_radius = gamma_min*np.linalg.norm(dir_y_n),
+                                             sufficient_decrease = sufficient_decrease)
+            nfev_rejected += eval_fun.calls - nfev_before - (0 if trial is None else 1)
+
+            if (trial is None) and (not J_n_is_changed): # no sufficient decrease along (or around) the direction of J_n
+                radius = None
+                J_n, scaling_n, col_scaling_n = eval_jac(x_n) # force jacobian recomputation
+                latest_J_n_change_at_idx = idx_newton_step
+                quasi_newton.reset()
+                continue # repeat this Newton step over again with recomputed jacobian
+            if (trial is None) or (J_n_is_changed and (trial[2] < stall_gamma)): # stalled despite a fresh jacobian
+                restart_damped = True
+                continue
+        if not damped:
+            x_n1, f_n1, local_gamma = trial
 
-            ''' apply tolorance functions onto both quantities: x and f '''
             tol_x_n1 : Vec_t = tolfunc_dom(x_n1)
             tol_f_n1 : Vec_t = tolfunc_range(f_n1)
             tol_f_n1_norm : float = np.linalg.norm(tol_f_n1)
+            mono : float = tol_f_n1_norm - tol_f_n_norm
 
-            ''' check whether J_n needs re-computation '''
+            ''' check whether J_n needs re-computation: too old or a shortened step of an old jacobian '''
             if (not (max_times_J_n_constant is None)) and (J_n_constant_for >= max_times_J_n_constant):
                 recompute_J_n = True
-
-            mono : float = tol_f_n1_norm - tol_f_n_norm # monotonicity of function value convergence
-            if mono >= 0.0:
-                if not recompute_J_n:
-                    if local_gamma/100.0 > gamma_min:
-                        local_gamma /= 100.0 # 100.0 is rather large, but: don't try to often
-                        continue # shrink Newton step to improve mono
-                    else: recompute_J_n = True # ... otherwise recompute jacobian
-
-            ''' recompute Jacobian '''
-            if recompute_J_n: J_n1, scaling_n1 = eval_jac(x_n1)
-            else: J_n1, scaling_n1 = J_n, scaling_n
-
-            break # Reaching here means: x in dom(f), (mono < 0 -or- jac recomputed)
-        else: raise NLinSolveError('out of domain of fun!')
+            if (local_gamma < 1.0) and (not J_n_is_changed): recompute_J_n = True
+
+            if recompute_J_n: J_n1, scaling_n1, col_scaling_n1 = eval_jac(x_n1)
+            else: J_n1, scaling_n1, col_scaling_n1 = J_n, scaling_n, col_scaling_n
+        else:
+            local_gamma : float = 1.0
+            while local_gamma >= gamma_min: # simple or primitive dampening
+                x_n1 : Vec_t = x_n + local_gamma*dir_x_n
+
+                ''' compute f(x_n1) and check validity '''
+                f_n1 : Vec_t = eval_fun(x_n1)
+                if np.isnan(f_n1).any() or np.isinf(f_n1).any():
+                    local_gamma /= 2.0
+                    continue # shrink Newton step until x_n1 within dom(fun) and repeat while loop!
+
+                ''' apply tolorance functions onto both quantities: x and f '''
+                tol_x_n1 : Vec_t = tolfunc_dom(x_n1)
+                tol_f_n1 : Vec_t = tolfunc_range(f_n1)
+                tol_f_n1_norm : float = np.linalg.norm(tol_f_n1)
+
+                ''' check whether J_n needs re-computation '''
+                if (not (max_times_J_n_constant is None)) and (J_n_constant_for >= max_times_J_n_constant):
+                    recompute_J_n = True
+
+                mono : float = tol_f_n1_norm - tol_f_n_norm # monotonicity of function value convergence
+                if mono >= 0.0:
+                    if not recompute_J_n:
+                        if local_gamma/100.0 > gamma_min:
+                            local_gamma /= 100.0 # 100.0 is rather large, but: don't try to often
+                            continue # shrink Newton step to improve mono
+                        else: recompute_J_n = True # ... otherwise recompute jacobian
+
+                ''' recompute Jacobian '''
+                if recompute_J_n: J_n1, scaling_n1, col_scaling_n1 = eval_jac(x_n1)
+                else: J_n1, scaling_n1, col_scaling_n1 = J_n, scaling_n, col_scaling_n
+
+                break # Reaching here means: x in dom(f), (mono < 0 -or- jac recomputed)
+            else: raise NLinSolveError('out of domain of fun!')
+            nfev_rejected += eval_fun.calls - nfev_before - 1
 
         ''' tolerance checks '''
         # domain checks
@@ -228,6 +506,24 @@ def sparse_nl_solve(fun : Callable[[Vec_t], Vec_t],
 
         ''' loop conclusion '''
         idx_newton_step += 1 # increment step idx of Newton iteration
+        if tol_f_n_norm > 0.0: rate = max(rate, tol_f_n1_norm/tol_f_n_norm)
+        if forcing_terms and (tol_f_n_norm > 0.0):
+            eta_safeguard : float = 0.9*eta**2 # i.e. don't let eta drop too fast
+            eta = 0.9*(tol_f_n1_norm/tol_f_n_norm)**2
+            if eta_safeguard > 0.1: eta = max(eta, eta_safeguard)
+            eta = min(eta_max, max(eta_min, eta))
+
+        if broyden and (not recompute_J_n) and (local_gamma == 1.0): # rank one update of J_n instead of a refresh,
+            def solve_J_n(b : Vec_t) -> Vec_t:
+                if forcing_terms: return linsolver.solve(A = J_n, b = b, A_did_change = False, rtol = eta)
+                return linsolver.solve(A = J_n, b = b, A_did_change = False)
+
+            if (tol_f_n1_norm <= broyden_max_rate*tol_f_n_norm) and \
+               quasi_newton.update(solve_J_n, J_n, s = (x_n1 - x_n)/col_scaling_n, dg = scaling_n*(f_n1 - f_n)):
+                num_of_broyden_updates += 1
+            else: # ... unless progress is poor (damped steps are left to the globalization)
+                recompute_J_n = True
+                J_n1, scaling_n1, col_scaling_n1 = eval_jac(x_n1)
 
         x_n = x_n1
         tol_x_n = tol_x_n1
@@ -240,12 +536,18 @@ def sparse_nl_solve(fun : Callable[[Vec_t], Vec_t],
             recompute_J_n = False # reset
             J_n = J_n1
             scaling_n = scaling_n1
+            col_scaling_n = col_scaling_n1
             latest_J_n_change_at_idx = idx_newton_step
+            quasi_newton.reset()
 
         if cond_atol_dom or cond_rtol_dom or cond_atol_range or cond_rtol_range or cond_atol_root: # if any tolrance check is positive ==> Newton succeeded!
             if (not atol_root) or cond_atol_root: # hard
                 success = True # Newton succeeded
                 break # leave most outer while-loop 'over the newton steps'
+
+        if (idx_newton_step >= max_it) and (not damped) and (num_of_damping_fallbacks == 0): # armijo/trust_region crawled
+            restart_damped = True
+            max_it += 1 # i.e. enter the loop once more
     else:
         if no_convergence_is_Error: raise NLinSolveError('Did not converge!') # success remains false!
 
@@ -264,6 +566,12 @@ def sparse_nl_solve(fun : Callable[[Vec_t], Vec_t],
     report['status'] = 1 if report.success else 0
     report['message'] = f"Newton iteration is considered successful: {report.success}"
     report['fun'] = f_n
+    report['rate'] = rate
+    report['J_factorized'] = J_factorized
+    report['globalization'] = globalization
+    report['nfev_rejected'] = nfev_rejected # evaluations at trial points rejected by the globalization
+    report['num_of_damping_fallbacks'] = num_of_damping_fallbacks
+    report['num_of_broyden_updates'] = num_of_broyden_updates
     # non used scipy-standard-fields here: 'nhev', 'jac', 'hess'
 
     return report
@@ -292,7 +600,12 @@ class sparse_newton_options(options_base):
                                          'max_times_J_n_constant',
                                          'gamma_min',
                                          'no_convergence_is_Error',
-                                         'apply_row_scaling']
+                                         'apply_row_scaling',
+                                         'apply_column_scaling',
+                                         'batched_jacobian',
+                                         'forcing_terms', 'eta_max', 'eta_min',
+                                         'globalization', 'sufficient_decrease', 'stall_gamma',
+                                         'broyden', 'broyden_max_updates', 'broyden_max_rate']
         super().__init__(name = name, additional_keys = additional_keys)
 
         self.atol_dom : Union[None, float, Vec_t] = 1.0e-8
@@ -312,3 +625,18 @@ class sparse_newton_options(options_base):
         self.no_convergence_is_Error : bool = True
 
         self.apply_row_scaling : bool = True
+        self.apply_column_scaling : bool = False # together with apply_row_scaling: equilibration of the jacobian
+
+        self.batched_jacobian : bool = False # finite differences: fun accepts (num_dirs, dim_x) batches of states
+
+        self.forcing_terms : bool = True # Eisenstat-Walker relative tolerances for inexact linsolvers (e.g. Krylov)
+        self.eta_max : float = 0.1 # forcing term of the first iteration and upper bound
+        self.eta_min : float = 1.0e-10
+
+        self.globalization : str = 'damping' # 'damping' (halving/dividing by 100), 'armijo' (backtracking) or 'trust_region' (dogleg)
+        self.sufficient_decrease : float = 1.0e-4 # Armijo constant resp. min ratio of actual and predicted reduction
+        self.stall_gamma : float = 1.0e-2 # armijo/trust_region steps (fresh jacobian) shorter than this fraction of the Newton step count as stalled
+
+        self.broyden : bool = False # good Broyden updates of J_n between refreshes (replaces max_times_J_n_constant)
+        self.broyden_max_updates : int = 10 # refresh J_n after this many updates
+        self.broyden_max_rate : float = 0.5 # refresh J_n instead of an update if the residual contracts worse than this
@@ -13,11 +13,13 @@ __credits__ = ('Lennart Jansen',) # alphabetical order of surnames
     imports
     =======
 '''
-from scipy.sparse.linalg import spsolve, splu, spilu
+import numpy as np
+from scipy.sparse import csr_matrix, csc_matrix
+from scipy.sparse.linalg import spsolve, splu, spilu, gmres, bicgstab, LinearOperator
 
 from paso.util.types_and_errors import Vec_t, CsMatrix_t, LinSolveError
 
-from typing import Union
+from typing import Union, Optional, Callable
 
 
 '''
@@ -26,6 +28,8 @@ from typing import Union
 '''
 class linsolver_template(object):
 
+    inexact : bool = False # True: __call__ accepts rtol (relative residual tolerance), e.g. for forcing terms of Newton
+
     def __init__(self, name : str): self.name = name
 
     def __call__(self, A : CsMatrix_t, b : Vec_t, A_did_change : bool = True) -> Vec_t: raise NotImplementedError
@@ -72,7 +76,7 @@ class splu_simple_wrapper(linsolver_template):
             if self.Mat is None: A_did_change = True
             if A_did_change: self.Mat = splu(A.tocsc(copy = False)) # if A is CSR then numpy ignores copy = False, since copying is inevitable
             return self.Mat.solve(b)
-        except: LinSolveError('splu failed!')
+        except Exception: raise LinSolveError('splu failed!')
 
 
 class spilu_simple_wrapper(linsolver_template):
@@ -94,4 +98,207 @@ class spilu_simple_wrapper(linsolver_template):
             if self.Mat is None: A_did_change = True
             if A_did_change: self.Mat = spilu(A.tocsc(copy = False)) # if A is CSR then numpy ignores copy = False, since copying is inevitable
             return self.Mat.solve(b)
-        except: LinSolveError('spilu failed!')
+        except Exception: raise LinSolveError('spilu failed!')
+
+
+class splu_reuse_wrapper(linsolver_template):
+
+    def __init__(self, permc_spec : str = 'COLAMD', pivot_tol : float = 1.0e-14, diag_pivot_thresh : float = 1.0):
+        '''
+            splu for sequences of matrices sharing one sparsity pattern (e.g. jacobians during Newton iterations and
+            time steps). The fill-reducing column ordering and the map from the data of A onto the data of the
+            column permuted CSC matrix are computed once; afterwards only the numerical factorization is executed. If
+            it fails, has tiny pivots or yields a non finite solution, a full factorization (with a new ordering) is
+            done instead.
+
+            :param permc_spec: column ordering computed by full factorizations, see scipy.sparse.linalg.splu
+            :param pivot_tol: min|diag(U)| < pivot_tol*max|diag(U)| triggers a full factorization
+            :param diag_pivot_thresh: threshold for partial (row) pivoting, see scipy.sparse.linalg.splu
+        '''
+        super().__init__(name = 'scipy.sparse.linalg.splu (reusing the column ordering)')
+        self.permc_spec : str = permc_spec
+        self.pivot_tol : float = pivot_tol
+        self.diag_pivot_thresh : float = diag_pivot_thresh
+
+        self.Mat = None # (lu, col_order) where col_order is None if lu belongs to A itself
+
+        self._pattern : Optional[tuple] = None        # (indices, indptr, shape) of the pattern the ordering belongs to
+        self._col_order : Optional[np.ndarray] = None  # A[:, col_order] is the column permuted matrix
+        self._data_order : Optional[np.ndarray] = None # data of the column permuted CSC matrix == A.data[data_order]
+        self._perm_indices : Optional[np.ndarray] = None
+        self._perm_indptr : Optional[np.ndarray] = None
+
+        self.num_of_full_factorizations : int = 0
+        self.num_of_refactorizations : int = 0
+
+    def _same_pattern(self, A : csr_matrix) -> bool:
+        if self._pattern is None: return False
+        indices, indptr, shape = self._pattern
+        if (A.indices is indices) and (A.indptr is indptr): return True
+        return (A.shape == shape) and np.array_equal(A.indptr, indptr) and np.array_equal(A.indices, indices)
+
+    def _full_factorization(self, A : csr_matrix):
+        self.num_of_full_factorizations += 1
+        lu = splu(A.tocsc(), permc_spec = self.permc_spec, diag_pivot_thresh = self.diag_pivot_thresh)
+
+        ''' symbolic part: column ordering and data map of the column permuted matrix '''
+        self._pattern = (A.indices, A.indptr, A.shape)
+        self._col_order = np.argsort(lu.perm_c)
+        positions = csr_matrix((np.arange(1, A.nnz + 1, dtype = np.float64), A.indices, A.indptr), shape = A.shape)
+        positions = positions[:, self._col_order].tocsc()
+        positions.sort_indices()
+        self._data_order = positions.data.astype(np.intp) - 1
+        self._perm_indices, self._perm_indptr = positions.indices, positions.indptr
+
+        return lu, None
+
+    def _refactorization(self, A : csr_matrix):
+        self.num_of_refactorizations += 1
+        A_perm = csc_matrix((A.data[self._data_order], self._perm_indices, self._perm_indptr), shape = A.shape)
+        lu = splu(A_perm, permc_spec = 'NATURAL', diag_pivot_thresh = self.diag_pivot_thresh)
+
+        diag_U = abs(lu.U.diagonal())
+        if diag_U.min() < self.pivot_tol*diag_U.max(): raise RuntimeError('tiny pivots')
+
+        return lu, self._col_order
+
+    def _factorize(self, A : csr_matrix, reuse_ordering : bool = True):
+        if reuse_ordering and self._same_pattern(A):
+            try:
+                self.Mat = self._refactorization(A)
+                return
+            except RuntimeError: pass # e.g. singular or tiny pivots w.r.t. the cached ordering
+
+        try: self.Mat = self._full_factorization(A)
+        except RuntimeError as e: raise LinSolveError(f'splu failed: {e}!')
+
+    def _solve(self, b : Vec_t) -> Vec_t:
+        lu, col_order = self.Mat
+        y = lu.solve(b)
+        if col_order is None: return y
+
+        x = np.empty_like(y)
+        x[col_order] = y
+        return x
+
+    def __call__(self, A : CsMatrix_t,
+                 b : Vec_t,
+                 A_did_change : bool = True) -> Vec_t:
+        '''
+            :param A: CSR -or- sparse system matrix of a linear system of equations: A*x = b
+            :param b: right-hand-side (RHS) vector of a linear system of equations: A*x = b
+            :param A_did_change: boolean flag whether the system matrix has changed since last call
+            :return: solution x as vector of A*x = b
+        '''
+        if self.Mat is None: A_did_change = True
+        if A_did_change:
+            A = csr_matrix(A)
+            A.sum_duplicates()
+            self._factorize(A)
+
+            x = self._solve(b)
+            if (not np.isfinite(x).all()) and (not (self.Mat[1] is None)): # retry with a full factorization
+                self._factorize(A, reuse_ordering = False)
+                x = self._solve(b)
+        else: x = self._solve(b)
+
+        if not np.isfinite(x).all(): raise LinSolveError('splu returned a non finite solution!')
+        return x
+
+
+class krylov_ilu_wrapper(linsolver_template):
+
+    inexact : bool = True
+
+    def __init__(self, method : str = 'gmres', rtol : float = 1.0e-10, maxiter : int = 200, restart : int = 50,
+                 drop_tol : float = 1.0e-5, fill_factor : float = 10.0, rebuild_factor : float = 2.0,
+                 min_iterations_rebuild : int = 10,
+                 preconditioner : Optional[Callable[[CsMatrix_t], Callable[[Vec_t], Vec_t]]] = None):
+        '''
+            preconditioned Krylov solver (GMRES or BiCGSTAB). The preconditioner (by default an incomplete LU
+            factorization) is kept across calls (i.e. Newton iterations and time steps, even if A changes) and rebuilt
+            only if the number of Krylov iterations exceeds rebuild_factor times the number right after the latest
+            rebuild (and min_iterations_rebuild) or if the solver fails to converge.
+
+            :param method: 'gmres' or 'bicgstab'
+            :param rtol: relative residual tolerance, unless passed to __call__ (e.g. as forcing term of Newton)
+            :param maxiter: max number of (outer) Krylov iterations
+            :param restart: restart of GMRES
+            :param drop_tol: see scipy.sparse.linalg.spilu
+            :param fill_factor: see scipy.sparse.linalg.spilu
+            :param rebuild_factor: growth of the iteration count that triggers a rebuild of the preconditioner
+            :param min_iterations_rebuild: iteration counts up to this number never trigger a rebuild
+            :param preconditioner: (optional) A -> function applying the inverse of a preconditioner of A, e.g.
+                                   simulator.preconditioner.spanning_tree_preconditioner; None: spilu
+        '''
+        if not (method in ('gmres', 'bicgstab')): raise ValueError(f"unknown Krylov method: {method}!")
+        super().__init__(name = f'scipy.sparse.linalg.{method} ({"ILU" if preconditioner is None else "custom"} preconditioned)')
+        self.method : str = method
+        self.rtol : float = rtol
+        self.maxiter : int = maxiter
+        self.restart : int = restart
+        self.drop_tol : float = drop_tol
+        self.fill_factor : float = fill_factor
+        self.rebuild_factor : float = rebuild_factor
+        self.min_iterations_rebuild : int = min_iterations_rebuild
+        self.preconditioner : Optional[Callable[[CsMatrix_t], Callable[[Vec_t], Vec_t]]] = preconditioner
+
+        self.Mat = None # function applying the inverse of the preconditioner
+        self._preconditioner : Optional[LinearOperator] = None
+        self._base_iterations : Optional[int] = None # iterations of the first solve with the latest preconditioner
+
+        self.num_of_preconditioner_builds : int = 0
+        self.num_of_iterations : int = 0
+        self.last_iterations : int = 0
+
+    def _build_preconditioner(self, A : csr_matrix):
+        try:
+            if self.preconditioner is None: self.Mat = spilu(A.tocsc(), drop_tol = self.drop_tol,
+                                                             fill_factor = self.fill_factor).solve
+            else: self.Mat = self.preconditioner(A)
+        except RuntimeError as e: raise LinSolveError(f'preconditioner failed: {e}!')
+        self._preconditioner = LinearOperator(A.shape, matvec = self.Mat, dtype = A.dtype)
+        self._base_iterations = None
+        self.num_of_preconditioner_builds += 1
+
+    def _krylov(self, A : csr_matrix, b : Vec_t, rtol : float):
+        iterations = [0]
+        def count(*args): iterations[0] += 1
+
+        solver = gmres if self.method == 'gmres' else bicgstab
+        kwargs = dict(M = self._preconditioner, maxiter = self.maxiter, callback = count, atol = 0.0)
+        if self.method == 'gmres': kwargs.update(restart = self.restart, callback_type = 'pr_norm')
+        try: x, info = solver(A, b, rtol = rtol, **kwargs)
+        except TypeError: x, info = solver(A, b, tol = rtol, **kwargs) # scipy < 1.12
+
+        return x, info, iterations[0]
+
+    def __call__(self, A : CsMatrix_t,
+                 b : Vec_t,
+                 A_did_change : bool = True,
+                 rtol : Optional[float] = None) -> Vec_t:
+        '''
+            :param A: CSR -or- sparse system matrix of a linear system of equations: A*x = b
+            :param b: right-hand-side (RHS) vector of a linear system of equations: A*x = b
+            :param A_did_change: boolean flag whether the system matrix has changed since last call
+            :param rtol: (optional) relative residual tolerance of this call
+            :return: (approximate) solution x as vector of A*x = b
+        '''
+        A = csr_matrix(A)
+        if rtol is None: rtol = self.rtol
+        if self.Mat is None: self._build_preconditioner(A)
+
+        x, info, iterations = self._krylov(A, b, rtol)
+        if (info != 0) or (not np.isfinite(x).all()): # retry with a preconditioner of the current matrix
+            if self._base_iterations is None: raise LinSolveError(f'{self.method} failed (info: {info})!')
+            self._build_preconditioner(A)
+            x, info, iterations = self._krylov(A, b, rtol)
+            if (info != 0) or (not np.isfinite(x).all()): raise LinSolveError(f'{self.method} failed (info: {info})!')
+
+        self.last_iterations = iterations
+        self.num_of_iterations += iterations
+        if self._base_iterations is None: self._base_iterations = iterations
+        elif iterations > max(self.min_iterations_rebuild, self.rebuild_factor*self._base_iterations):
+            self.Mat = None # rebuild by the next call
+
+        return x
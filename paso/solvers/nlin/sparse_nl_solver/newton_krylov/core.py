@@ -0,0 +1,260 @@
+'''
+    Jacobian-free Newton-Krylov
+    ===========================
+
+    Newton's method whose linear systems J(x_n)*dir = -f(x_n) are solved by a Krylov method (GMRES or BiCGSTAB) that
+    only needs products J(x_n)*v: forward sweeps of an AD tape (see paso.differentiation.util.wrapper_cycADa) or, as
+    fallback, finite differences of fun. The jacobian is never assembled. Preconditioners are built from such products
+    as well (see paso.solvers.nlin.sparse_nl_solver.newton_krylov.preconditioners).
+'''
+
+__author__ = ('Tom Streubel',) # alphabetical order of surnames
+__credits__ = tuple() # alphabetical order of surnames
+
+
+'''
+    imports
+    =======
+'''
+import numpy as np
+from scipy.sparse.linalg import gmres, bicgstab, LinearOperator
+
+from paso.util.types_and_errors import Vec_t, Callback_t, NLinSolveError
+from paso.util.report_and_option_class import options_base, results_base
+
+from paso.solvers.nlin.sparse_nl_solver.util.general import call_counter, tolfunc_default, callback_default
+
+from typing import Union, Optional, Callable, List
+
+
+Jvp_t = Callable[[Vec_t, Vec_t], Vec_t] # (x, v) -> J(x)*v
+Preconditioner_t = Callable[[Callable[[Vec_t], Vec_t]], Callable[[Vec_t], Vec_t]] # (v -> J*v) -> (b -> M^-1*b)
+
+
+'''
+    body
+    ====
+'''
+def finite_difference_jvp(fun : Callable[[Vec_t], Vec_t], x : Vec_t, f_x : Vec_t, v : Vec_t) -> Vec_t:
+    '''
+        :return: (fun(x + eps*v) - f_x)/eps with eps == sqrt((1 + |x|)*machine precision)/|v| (cf. NITSOL)
+    '''
+    v_norm : float = np.linalg.norm(v)
+    if v_norm == 0.0: return np.zeros(shape = f_x.shape)
+    eps : float = np.sqrt((1.0 + np.linalg.norm(x))*np.finfo(np.float64).eps)/v_norm
+    return (fun(x + eps*v) - f_x)/eps
+
+
+def newton_krylov_solve(fun : Callable[[Vec_t], Vec_t],
+                        x0 : Vec_t,
+                        jvp : Optional[Jvp_t] = None,
+                        preconditioner : Optional[Preconditioner_t] = None,
+                        tolfunc_dom : Optional[Callable[[Vec_t], Vec_t]] = None,
+                        tolfunc_range : Optional[Callable[[Vec_t], Vec_t]] = None,
+                        callback : Optional[Callback_t] = None,
+                        options : Optional['newton_krylov_options'] = None,
+                        M0 : Optional[Callable[[Vec_t], Vec_t]] = None) -> 'newton_krylov_results':
+    '''
+        :param fun: x -> f(x), the root of f is sought
+        :param x0: initial guess
+        :param jvp: (optional) (x, v) -> J(x)*v, e.g. by forward sweeps of an AD tape; None: finite differences of fun
+        :param preconditioner: (optional) builds (b -> M^-1*b) from products v -> J(x_n)*v; None: no preconditioning
+        :param tolfunc_dom: see sparse_nl_solve
+        :param tolfunc_range: see sparse_nl_solve
+        :param callback: (optional) called after each Newton step by (options, idx, x_n1, f_n1, x_n, f_n, gamma, nlit)
+        :param options: newton_krylov_options
+        :param M0: (optional) preconditioner of a previous solve (report.M), used until it is rebuilt as usual
+        :return: newton_krylov_results
+    '''
+    if options is None: options = newton_krylov_options()
+    atol_dom : Union[None, float, Vec_t] = options.atol_dom
+    rtol_dom : Union[None, float, Vec_t] = options.rtol_dom
+    atol_range : Union[None, float, Vec_t] = options.atol_range
+    rtol_range : Union[None, float, Vec_t] = options.rtol_range
+    atol_root : Union[None, float, Vec_t] = options.atol_root
+    max_it : int = options.max_it
+    max_times_M_constant : Union[None, int] = options.max_times_M_constant
+    gamma_min : float = options.gamma_min
+    sufficient_decrease : float = options.sufficient_decrease
+    eta_max : float = options.eta_max
+    eta_min : float = options.eta_min
+
+    if (atol_dom is None) and (rtol_dom is None) and (atol_range is None) and (rtol_range is None) and (atol_root is None):
+        raise NLinSolveError("choose some convergence criterion! Not all of them can be 'None'!")
+    if not (options.method in ('gmres', 'bicgstab')):
+        raise NLinSolveError(f"unknown Krylov method: {options.method} (choose gmres or bicgstab)!")
+
+    if tolfunc_dom is None: tolfunc_dom = tolfunc_default
+    if tolfunc_range is None: tolfunc_range = tolfunc_default
+    if callback is None: callback = callback_default
+
+    eval_fun = call_counter(fun)
+    eval_jvp = None if jvp is None else call_counter(jvp)
+
+    x_n : Vec_t = np.array(x0, dtype = np.float64)
+    tol_x_n : Vec_t = tolfunc_dom(x_n)
+    f_n : Vec_t = eval_fun(x_n)
+    tol_f_n : Vec_t = tolfunc_range(f_n)
+    tol_f_n_norm : float = np.linalg.norm(tol_f_n)
+
+    def J_times(x : Vec_t, f_x : Vec_t) -> Callable[[Vec_t], Vec_t]:
+        if eval_jvp is None: return lambda v: finite_difference_jvp(eval_fun, x, f_x, v)
+        return lambda v: eval_jvp(x, v)
+
+    def krylov(J_v : Callable[[Vec_t], Vec_t], b : Vec_t, M : Optional[Callable[[Vec_t], Vec_t]], rtol : float):
+        iterations : List[int] = [0]
+        def count(*args): iterations[0] += 1
+        A = LinearOperator((len(b), len(x_n)), matvec = J_v, dtype = np.float64)
+        kwargs = dict(M = None if M is None else LinearOperator(A.shape, matvec = M, dtype = np.float64),
+                      maxiter = options.krylov_maxiter, callback = count, atol = 0.0)
+        if options.method == 'gmres': # maxiter of gmres counts restart cycles
+            restart = min(options.krylov_restart, options.krylov_maxiter)
+            solver, kwargs = gmres, dict(kwargs, restart = restart, maxiter = -(-options.krylov_maxiter//restart),
+                                         callback_type = 'pr_norm')
+        else: solver = bicgstab
+        try: x, info = solver(A, b, rtol = rtol, **kwargs)
+        except TypeError: x, info = solver(A, b, tol = rtol, **kwargs) # scipy < 1.12
+        return x, (info == 0) and np.isfinite(x).all(), iterations[0]
+
+    M : Optional[Callable[[Vec_t], Vec_t]] = M0
+    M_built_at_idx : Optional[int] = None # None: M0 (or no M) of unknown age
+    eta : float = eta_max # forcing term (Eisenstat-Walker, choice 2)
+    rate : float = 0.0
+    nlit : int = 0 # total number of Krylov iterations
+    num_of_preconditioner_builds : int = 0
+    num_of_krylov_failures : int = 0
+    success : bool = False
+
+    idx_newton_step : int = 0
+    while idx_newton_step < max_it:
+        J_v = J_times(x_n, f_n)
+
+        ''' (re-)build preconditioner if missing or too old '''
+        M_is_fresh : bool = False
+        if not (preconditioner is None):
+            too_old : bool = (not (max_times_M_constant is None)) and (M_built_at_idx is not None) and \
+                             (idx_newton_step - M_built_at_idx >= max_times_M_constant)
+            if (M is None) or too_old:
+                M, M_built_at_idx, M_is_fresh = preconditioner(J_v), idx_newton_step, True
+                num_of_preconditioner_builds += 1
+
+        ''' inexact Newton direction: |J*dir + f| <= eta*|f| '''
+        dir_x_n, converged, iterations = krylov(J_v, -f_n, M, eta)
+        nlit += iterations
+        if (not converged) and (not (preconditioner is None)) and (not M_is_fresh): # retry with a fresh preconditioner
+            num_of_krylov_failures += 1
+            M, M_built_at_idx, M_is_fresh = preconditioner(J_v), idx_newton_step, True
+            num_of_preconditioner_builds += 1
+            dir_x_n, converged, iterations = krylov(J_v, -f_n, M, eta)
+            nlit += iterations
+        if not np.isfinite(dir_x_n).all(): raise NLinSolveError('Krylov solver returned a non finite direction!')
+        if not converged: num_of_krylov_failures += 1 # the direction is used anyway (line search below)
+
+        ''' backtracking line search: |f(x_n + gamma*dir)| <= (1 - alpha*gamma*(1 - eta))*|f(x_n)| '''
+        gamma : float = 1.0
+        while True:
+            x_n1 : Vec_t = x_n + gamma*dir_x_n
+            f_n1 : Vec_t = eval_fun(x_n1)
+            if np.isfinite(f_n1).all():
+                tol_f_n1 : Vec_t = tolfunc_range(f_n1)
+                tol_f_n1_norm : float = np.linalg.norm(tol_f_n1)
+                if tol_f_n1_norm <= (1.0 - sufficient_decrease*gamma*(1.0 - eta))*tol_f_n_norm: break
+            if gamma/2.0 < gamma_min:
+                if not np.isfinite(f_n1).all(): raise NLinSolveError('out of domain of fun!')
+                if (not (preconditioner is None)) and (not M_is_fresh): M = None # rebuild for the next step
+                break # accept the shortest step (cf. damping of sparse_nl_solve)
+            gamma /= 2.0
+        tol_x_n1 : Vec_t = tolfunc_dom(x_n1)
+
+        ''' tolerance checks (see sparse_nl_solve) '''
+        diff_tol_x : Vec_t = abs(tol_x_n1 - tol_x_n)
+        cond_atol_dom : bool = (not (atol_dom is None)) and (diff_tol_x < atol_dom).all()
+        cond_rtol_dom : bool = (not (rtol_dom is None)) and (diff_tol_x < rtol_dom*tol_x_n).all()
+
+        diff_tol_f : Vec_t = abs(tol_f_n1 - tol_f_n)
+        cond_atol_range : bool = (not (atol_range is None)) and (diff_tol_f < atol_range).all()
+        cond_rtol_range : bool = (not (rtol_range is None)) and (diff_tol_f < rtol_range*tol_f_n).all()
+
+        cond_atol_root : bool = (not (atol_root is None)) and (abs(tol_f_n1) < atol_root).all()
+
+        callback(options, idx_newton_step, x_n1, f_n1, x_n, f_n, gamma, nlit)
+
+        ''' loop conclusion '''
+        idx_newton_step += 1
+        if tol_f_n_norm > 0.0:
+            rate = max(rate, tol_f_n1_norm/tol_f_n_norm)
+            eta_safeguard : float = 0.9*eta**2
+            eta = 0.9*(tol_f_n1_norm/tol_f_n_norm)**2
+            if eta_safeguard > 0.1: eta = max(eta, eta_safeguard)
+            eta = min(eta_max, max(eta_min, eta))
+
+        x_n, tol_x_n = x_n1, tol_x_n1
+        f_n, tol_f_n, tol_f_n_norm = f_n1, tol_f_n1, tol_f_n1_norm
+
+        if cond_atol_dom or cond_rtol_dom or cond_atol_range or cond_rtol_range or cond_atol_root:
+            if (not atol_root) or cond_atol_root:
+                success = True
+                break
+
+    if (not success) and options.no_convergence_is_Error: raise NLinSolveError('Did not converge!')
+
+    report = newton_krylov_results()
+
+    report['x'] = x_n
+    report['success'] = success
+    report['nfev'] = eval_fun.calls # including finite differences
+    report['njvp'] = 0 if eval_jvp is None else eval_jvp.calls
+    report['nit'] = idx_newton_step
+    report['nlit'] = nlit
+    report['status'] = 1 if success else 0
+    report['message'] = f"Newton-Krylov iteration is considered successful: {success}"
+    report['fun'] = f_n
+    report['rate'] = rate
+    report['M'] = M
+    report['num_of_preconditioner_builds'] = num_of_preconditioner_builds
+    report['num_of_krylov_failures'] = num_of_krylov_failures
+
+    return report
+
+
+class newton_krylov_results(results_base): pass
+
+
+class newton_krylov_options(options_base):
+
+    def __init__(self, name : str = "Newton-Krylov options", **kwargs):
+        additional_keys : List['str'] = ['name',
+                                         'atol_dom', 'rtol_dom',
+                                         'atol_range', 'rtol_range',
+                                         'atol_root',
+                                         'max_it',
+                                         'max_times_M_constant',
+                                         'gamma_min', 'sufficient_decrease',
+                                         'no_convergence_is_Error',
+                                         'eta_max', 'eta_min',
+                                         'method', 'krylov_maxiter', 'krylov_restart']
+        super().__init__(name = name, additional_keys = additional_keys)
+
+        self.atol_dom : Union[None, float, Vec_t] = 1.0e-8
+        self.rtol_dom : Union[None, float, Vec_t] = 1.0e-6
+
+        self.atol_range : Union[None, float, Vec_t] = 1.0e-8
+        self.rtol_range : Union[None, float, Vec_t] = 1.0e-6
+
+        self.atol_root : Union[None, float, Vec_t] = None
+
+        self.max_it : int = 100
+
+        self.max_times_M_constant : Union[None, int] = 4 # rebuild the preconditioner after this many steps (None: never)
+
+        self.gamma_min : float = 1.0e-4
+        self.sufficient_decrease : float = 1.0e-4
+
+        self.no_convergence_is_Error : bool = True
+
+        self.eta_max : float = 0.1 # forcing term of the first iteration and upper bound
+        self.eta_min : float = 1.0e-3 # lower bound; finite difference products limit the attainable accuracy of the linear solves
+
+        self.method : str = 'gmres' # 'gmres' or 'bicgstab'
+        self.krylov_maxiter : int = 100 # per linear system (in total, i.e. across restarts of gmres)
+        self.krylov_restart : int = 50 # gmres only
@@ -0,0 +1,62 @@
+'''
+    preconditioners for Jacobian-free Newton-Krylov built from jacobian vector products only
+'''
+
+__author__ = ('Tom Streubel',) # alphabetical order of surnames
+__credits__ = tuple() # alphabetical order of surnames
+
+
+'''
+    imports
+    =======
+'''
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import spilu
+
+from paso.util.types_and_errors import Vec_t
+from paso.differentiation.util.jacobian_csr_handler import jac_csr
+
+from typing import Callable, Optional, Tuple
+
+
+'''
+    body
+    ====
+'''
+def spilu_factorization(A : csr_matrix) -> Callable[[Vec_t], Vec_t]: return spilu(A.tocsc()).solve
+
+
+class colored_jacobian_preconditioner(object):
+
+    def __init__(self, indices : Vec_t, indptr : Vec_t, shape : Tuple[int, int],
+                 factorize : Optional[Callable[[csr_matrix], Callable[[Vec_t], Vec_t]]] = None):
+        '''
+            recovers the entries of a (structural) sparsity pattern of the jacobian from products J*v, one per color of
+            a distance-2 coloring of the columns (see jac_csr), and factorizes the recovered matrix. The pattern has to
+            contain all structurally nonzero entries, e.g. derived from the topology of a network. Only the products
+            enter, i.e. the preconditioner is exact w.r.t. the jacobian at the point it is built at and may be kept
+            for a few Newton steps (or time steps).
+
+            :param indices: column indices of the pattern in CSR format
+            :param indptr: row pointers of the pattern in CSR format
+            :param shape: shape of the jacobian
+            :param factorize: A -> function applying (an approximation of) A^-1 to a vector; None: spilu
+        '''
+        self.pattern : jac_csr = jac_csr(fun = lambda x: None, shape = shape, indices = indices, indptr = indptr)
+        self.factorize : Callable[[csr_matrix], Callable[[Vec_t], Vec_t]] = factorize or spilu_factorization
+        self.num_of_builds : int = 0
+
+    @property
+    def num_of_products(self) -> int: return self.pattern.num_colors # per build
+
+    def __call__(self, J_v : Callable[[Vec_t], Vec_t]) -> Callable[[Vec_t], Vec_t]:
+        '''
+            :param J_v: v -> J*v
+            :return: b -> M^-1*b
+        '''
+        self.pattern.dfun = J_v
+        A = self.pattern(np.zeros(shape = (self.pattern.dim_x,)))
+        self.pattern.dfun = None
+        self.num_of_builds += 1
+        return self.factorize(A)
@@ -9,7 +9,7 @@ __credits__ = tuple()  # alphabetical order of surnames
     imports
     =======
 '''
-from typing import Optional, List
+from typing import Optional, List, Callable
 
 from paso.util.basics import export
 
@@ -113,7 +113,8 @@ class integration_options(options_base):
                                          'custom_time_points',
                                          'atol_dom', 'rtol_dom',
                                          'atol_range', 'rtol_range',
-                                         'one_step']
+                                         'one_step',
+                                         'result_sink', 'keep_trajectory']
 
         if 'additional_keys' in self.__dict__: # this handles deriving classes wanting to add more additional keys
             additional_keys.extend(self.additional_keys)
@@ -137,6 +138,9 @@ class integration_options(options_base):
 
         self.one_step : bool = False
 
+        self.result_sink : Optional[Callable[[float, Any], None]] = None # called with (t, x) at t0 and on every accepted step
+        self.keep_trajectory : bool = True # if False only the history needed by the stepper is kept (e.g. results are streamed into result_sink)
+
 
 '''
     report/result base class
@@ -0,0 +1,287 @@
+'''
+    compiled assembly plan of a network_dae: all elements of the same type are evaluated at once by a numpy kernel
+
+    each element class may offer a static method
+
+        vectorized_call(block : element_block, dx : np.ndarray, x : np.ndarray, t : float) -> Sequence[np.ndarray]
+
+    returning the residuals of all elements of the block, one array per local variable index (i.e. dim many).
+    x and dx might carry leading axes (batches of states); kernels therefore only index the last axis.
+    Element classes without such a kernel are evaluated element by element as before.
+
+    for the analytic jacobian each element class may offer a static method
+
+        vectorized_partials(block : element_block, dx : np.ndarray, x : np.ndarray, t : float) -> List[tuple]
+
+    returning entries (rows, cols, dF_ddx, dF_dx) of closed form partial derivatives. The structure of the entries
+    (i.e. rows and cols) must only depend on the topology; values may be zero.
+'''
+
+__author__ = ('Tom Streubel',) # alphabetical order of surnames
+__credits__ = tuple() # alphabetical order of surnames
+
+
+'''
+    imports
+    =======
+'''
+import numpy as np
+from scipy.sparse import csr_matrix
+from typing import Optional, List, Callable, TYPE_CHECKING
+
+from simulator.resources.auxiliary import VectorizationError
+from simulator.resources.profiles import profile_bank
+if TYPE_CHECKING: from simulator.netgraph import network_dae # netgraph imports this module
+
+
+''' piecewise linear selections together with the gradient of the selected candidate (value, gradient) '''
+def _select_with_gradient(candidates, arg_func):
+    values = np.stack(np.broadcast_arrays(*[value for value, _ in candidates]))
+    shape = values.shape[1:] + np.shape(candidates[0][1])[-1:]
+    gradients = np.stack([np.broadcast_to(gradient, shape) for _, gradient in candidates])
+
+    idx = arg_func(values, axis = 0)
+    return np.take_along_axis(values, idx[None], axis = 0)[0], \
+           np.take_along_axis(gradients, idx[None, ..., None], axis = 0)[0]
+
+def minimum_with_gradient(*candidates): return _select_with_gradient(candidates, np.argmin)
+
+def maximum_with_gradient(*candidates): return _select_with_gradient(candidates, np.argmax)
+
+def where_with_gradient(condition, candidate_true, candidate_false):
+    (value_true, gradient_true), (value_false, gradient_false) = candidate_true, candidate_false
+    return np.where(condition, value_true, value_false), \
+           np.where(np.asarray(condition)[..., None], gradient_true, gradient_false)
+
+
+class element_block(object):
+
+    def __init__(self, elements : list, profiles : Optional[profile_bank] = None):
+        '''
+            all elements of one type (and class) together with their variable ids as arrays. Parameters, profile
+            values and the real gas factor model are gathered lazily (on request of the kernel) into arrays as well.
+
+            :param elements: elements of the same type and class in order of the network
+            :param profiles: (optional) bank of all profiles of the net keyed by (element name, attribute name);
+                             profile values are indexed from it instead of calling each element's profile
+        '''
+
+        self.elements = elements
+        self.cls = type(elements[0])
+
+        self.kernel : Optional[Callable] = self.cls.vectorized_call
+        self.elementwise = self.kernel is None # fallback: evaluation element by element
+
+        self.var_ids = np.array([element.var_ids for element in elements], dtype = np.intp) # shape: (len(self), dim)
+
+        if hasattr(elements[0], 'left'): # edges
+            self.pL_ids = np.array([edge.pL_leftPress_id for edge in elements], dtype = np.intp)
+            self.pR_ids = np.array([edge.pR_rightPress_id for edge in elements], dtype = np.intp)
+            self.qL_ids = np.array([edge.qL_leftFlow_id for edge in elements], dtype = np.intp)
+            self.qR_ids = np.array([edge.qR_rightFlow_id for edge in elements], dtype = np.intp)
+
+        self._parameters = {}
+
+        self.profile_bank = profiles
+        self._profile_ids = {} # positions within the profile bank by attribute name
+        self._profiles = {}
+        self._profiles_t = None
+
+        self._z_coefficients = None
+
+        setup = getattr(self.cls, 'vectorized_setup', None)
+        if not (setup is None) and not self.elementwise: setup(self)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def parameter(self, name : str) -> np.ndarray:
+        '''
+            :param name: attribute or property name of the elements, e.g. 'scaled_area_over_length'
+            :return: array of the respective values of all elements of the block
+        '''
+        try:
+            return self._parameters[name]
+        except KeyError:
+            values = np.array([getattr(element, name) for element in self.elements], dtype = np.float64)
+            self._parameters[name] = values
+            return values
+
+    def profile(self, name : str, t : float, selection : Optional[np.ndarray] = None) -> np.ndarray:
+        '''
+            evaluates time dependent profiles of all (or selected) elements. Values are cached as long as t doesn't
+            change (e.g. during Newton's method or finite differences). A name has to be used always with the same
+            selection.
+
+            :param name: attribute name of the profile, e.g. 'io_func'
+            :param t: time point
+            :param selection: (optional) indices of elements within the block; defaults to all elements
+            :return: array of the profile values
+        '''
+        if t != self._profiles_t:
+            self._profiles.clear()
+            self._profiles_t = t
+
+        try:
+            return self._profiles[name]
+        except KeyError:
+            elements = self.elements if selection is None else [self.elements[idx] for idx in selection]
+            if self.profile_bank is None:
+                values = np.array([getattr(element, name)(t) for element in elements], dtype = np.float64)
+            else:
+                ids = self._profile_ids.get(name)
+                if ids is None:
+                    ids = np.array([self.profile_bank.index[(element.name, name)] for element in elements], dtype = np.intp)
+                    self._profile_ids[name] = ids
+                values = self.profile_bank(t, ids)
+            self._profiles[name] = values
+            return values
+
+    def zModel(self, p : np.ndarray, bracket_eval : bool = True):
+        '''
+            vectorized counterpart of [scaled_kappa*entry for entry in edge.zModel(p)] for all edges of the block.
+            Requires zModels offering coefficients (a, b) such that z(p) == a + b*p and bracket == z(p)**2/a.
+
+            :param p: pressures
+            :param bracket_eval: (default: True) if True the bracket term will be returned, too
+            :return: scaled z (and scaled bracket term)
+        '''
+        if self._z_coefficients is None:
+            coefficients = [getattr(edge.zModel, 'coefficients', None) for edge in self.elements]
+            if any(coeffs is None for coeffs in coefficients):
+                raise VectorizationError("{} zModel without coefficients".format(self.cls.__name__))
+            a, b = np.array(coefficients, dtype = np.float64).T
+            self._z_coefficients = a, b, self.parameter('scaled_kappa')
+
+        a, b, scaled_kappa = self._z_coefficients
+
+        z = a + b*p
+
+        if bracket_eval:
+            return scaled_kappa*z, scaled_kappa*(z*z)/a
+        return scaled_kappa*z
+
+    def zModel_partials(self, p : np.ndarray, bracket_eval : bool = True):
+        '''
+            :param p: pressures
+            :param bracket_eval: (default: True) if True the bracket term and its derivative will be returned, too
+            :return: scaled z, (scaled bracket term,) derivative of z w.r.t. p (, derivative of the bracket term)
+        '''
+        z = self.zModel(p, bracket_eval = False)
+        a, b, scaled_kappa = self._z_coefficients
+
+        dz = scaled_kappa*b
+
+        if bracket_eval:
+            return z, (z*z)/(scaled_kappa*a), dz, (2.0*z*b)/a
+        return z, dz
+
+
+class assembly_plan(object):
+
+    def __init__(self, net : "network_dae"):
+        '''
+            groups all elements of the net by type (and class) in the order in which network_dae evaluates them.
+
+            :param net: network to compile
+        '''
+
+        self.key = net.assembly_key
+        self.dim = net.dim
+
+        self.profile_bank = profile_bank({(element.name, attr): profile for element, attr, profile in net.profiles()})
+
+        self.blocks : List[element_block] = []
+        for types in [net.all_edge_types, net.all_hidden_edge_types, net.all_node_types, net.all_hidden_node_types]:
+            for element_type in types:
+                groups = {}
+                for element in net.typeReg[element_type]:
+                    groups.setdefault(type(element), []).append(element)
+                self.blocks.extend(element_block(elements, self.profile_bank) for elements in groups.values())
+
+        self._jacobian_pattern = None # (positions, indices, indptr) computed by the first call of jacobian
+
+    def __call__(self, net : "network_dae", dx : np.ndarray, x : np.ndarray, t : float, **kwargs):
+        output = np.empty_like(x, dtype = x.dtype)
+
+        for block in self.blocks:
+            if not block.elementwise:
+                try:
+                    residuals = block.kernel(block, dx, x, t)
+                except VectorizationError:
+                    block.elementwise = True
+                else:
+                    for idx, residual in enumerate(residuals):
+                        output[..., block.var_ids[:, idx]] = residual
+                    continue
+
+            for batch_idx in np.ndindex(x.shape[:-1]):
+                net.input  = x[batch_idx]
+                net.dinput = dx[batch_idx]
+                for element, var_ids in zip(block.elements, block.var_ids):
+                    output[batch_idx][var_ids] = element(t, **kwargs)
+
+        net.input  = x
+        net.dinput = dx
+
+        return output
+
+    def _compile_jacobian_pattern(self, rows : np.ndarray, cols : np.ndarray):
+        keys = rows.astype(np.int64)*self.dim + cols
+        unique_keys, positions = np.unique(keys, return_inverse = True)
+
+        idx_dtype = np.int32 if max(self.dim, len(unique_keys)) < np.iinfo(np.int32).max else np.int64
+        indices = (unique_keys % self.dim).astype(idx_dtype)
+        indptr = np.zeros(shape = (self.dim + 1,), dtype = idx_dtype)
+        indptr[1:] = np.cumsum(np.bincount(unique_keys//self.dim, minlength = self.dim))
+
+        self._jacobian_pattern = positions, indices, indptr
+
+    def _partials_data(self, dx : np.ndarray, x : np.ndarray, t : float):
+        rows, cols, values_ddx, values_dx = [], [], [], []
+        for block in self.blocks:
+            partials = getattr(block.cls, 'vectorized_partials', None)
+            if block.elementwise or (partials is None):
+                raise VectorizationError("{} provides no closed form partial derivatives".format(block.cls.__name__))
+
+            for block_rows, block_cols, dF_ddx, dF_dx in partials(block, dx, x, t):
+                rows.append(block_rows)
+                cols.append(block_cols)
+                values_ddx.append(np.broadcast_to(dF_ddx, block_rows.shape))
+                values_dx.append(np.broadcast_to(dF_dx, block_rows.shape))
+
+        if self._jacobian_pattern is None: self._compile_jacobian_pattern(np.concatenate(rows), np.concatenate(cols))
+        positions, indices, indptr = self._jacobian_pattern
+
+        data_ddx = np.bincount(positions, weights = np.concatenate(values_ddx), minlength = len(indices))
+        data_dx = np.bincount(positions, weights = np.concatenate(values_dx), minlength = len(indices))
+
+        return data_ddx, data_dx, indices, indptr
+
+    def jacobian(self, dx : np.ndarray, x : np.ndarray, t : float, c : float = 1.0) -> csr_matrix:
+        '''
+            assembles c*dF/d(dx) + dF/dx from the closed form partial derivatives of all blocks. The sparsity pattern is
+            computed by the first call (and kept while the plan is valid), afterwards only the data array is summed up.
+
+            :param dx: derivative of the state
+            :param x: state
+            :param t: time point
+            :param c: factor for the derivative w.r.t. dx (e.g. 1/h for implicit Euler)
+            :return: jacobian in csr format
+        '''
+        data_ddx, data_dx, indices, indptr = self._partials_data(dx, x, t)
+
+        return csr_matrix((c*data_ddx + data_dx, indices, indptr), shape = (self.dim, self.dim))
+
+    def jacobian_blocks(self, dx : np.ndarray, x : np.ndarray, t : float):
+        '''
+            :param dx: derivative of the state
+            :param x: state
+            :param t: time point
+            :return: dF/d(dx) and dF/dx in csr format sharing the sparsity pattern of jacobian, i.e. c*dF/d(dx) + dF/dx
+                     only combines their data arrays
+        '''
+        data_ddx, data_dx, indices, indptr = self._partials_data(dx, x, t)
+
+        return csr_matrix((data_ddx, indices, indptr), shape = (self.dim, self.dim)), \
+               csr_matrix((data_dx, indices, indptr), shape = (self.dim, self.dim))
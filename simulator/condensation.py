@@ -0,0 +1,230 @@
+'''
+    static condensation of interior unknowns of a network_dae (linear solver for Newton's method)
+
+    interior nodes are flow nodes (behaviour 1) of degree two, e.g. hidden nodes of internal pipes and resistors or
+    the nodes along pipelines; interior edges are all edges incident to an interior node. Their variables (together
+    with their equations) decompose into chains, i.e. connected components, that couple to the remaining (junction)
+    variables only via their end points. The interior block A_II is block diagonal w.r.t. the chains, hence
+
+        A_II*x_I + A_IB*x_B = b_I,      A_BI*x_I + A_BB*x_B = b_B
+
+    is solved by the Schur complement S = A_BB - A_BI*A_II^-1*A_IB onto the junction variables and back substitution.
+    The columns of A_II^-1*A_IB are computed by a few solves only: columns of A_IB that touch different chains share
+    one right-hand-side (greedy coloring, like compressed finite differences of sparse jacobians). Ordered by reverse
+    Cuthill-McKee, A_II of chains is a band matrix of small bandwidth and factorized by LAPACK (gbtrf) instead of splu.
+'''
+
+__author__ = ('Tom Streubel',) # alphabetical order of surnames
+__credits__ = tuple() # alphabetical order of surnames
+
+
+'''
+    imports
+    =======
+'''
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, reverse_cuthill_mckee
+from scipy.linalg.lapack import dgbtrf, dgbtrs
+
+from paso.solvers.nlin.sparse_nl_solver.newton.predefined.linsolvers import linsolver_template, splu_reuse_wrapper
+from paso.util.types_and_errors import Vec_t, CsMatrix_t, LinSolveError
+
+from simulator.netgraph import network_dae, node, base_edge
+
+from typing import Optional, List
+
+
+'''
+    body
+    ====
+'''
+class static_condensation_solver(linsolver_template):
+
+    def __init__(self, net : network_dae, min_interior_fraction : float = 0.1, max_bandwidth : int = 16):
+        '''
+            :param net: network whose jacobians (or scaled jacobians, i.e. same pattern) shall be solved
+            :param min_interior_fraction: networks with fewer interior variables are solved by splu directly
+            :param max_bandwidth: A_II of larger bandwidth (after reordering) is factorized by splu
+        '''
+        super().__init__(name = 'static condensation of interior chains (splu)')
+        self.net : network_dae = net
+        self.min_interior_fraction : float = min_interior_fraction
+        self.max_bandwidth : int = max_bandwidth
+
+        self._key = None
+        self.interior : Optional[np.ndarray] = None # variable (== equation) ids of interior nodes and edges
+        self.boundary : Optional[np.ndarray] = None
+
+        self._pattern : Optional[tuple] = None # (indices, indptr, shape) of the pattern the coloring belongs to
+        self._colors : Optional[np.ndarray] = None # color of each boundary variable (-1: not coupled to chains)
+        self._W_rows : Optional[np.ndarray] = None # structure of W == A_II^-1*A_IB (rows within the interior)
+        self._W_cols : Optional[np.ndarray] = None
+        self._W_colors : Optional[np.ndarray] = None
+        self._blocks : Optional[dict] = None # name -> (data_order, indices, indptr, shape), e.g. A_II.data == A.data[data_order]
+        self._band : Optional[tuple] = None # (kl, ku, positions): band storage of A_II, i.e. ab.flat[positions] == A_II.data
+        self._band_lu : Optional[tuple] = None # (lu, piv) of dgbtrf
+
+        self._lu_I : splu_reuse_wrapper = splu_reuse_wrapper()
+        self._lu_S : splu_reuse_wrapper = splu_reuse_wrapper()
+        self._lu_A : splu_reuse_wrapper = splu_reuse_wrapper() # no (sufficiently many) interior variables or fallback
+        self.Mat = None # (A_II, A_BI, W, S) of the latest factorization or None if self._lu_A is used
+
+        self.num_of_condensations : int = 0
+        self.num_of_fallbacks : int = 0 # singular interior block or Schur complement => splu of the whole matrix
+
+    def _setup(self):
+        net = self.net
+        interior_nodes : List[node] = [c for c in net.components if isinstance(c, node) and (c.behaviour == 1) and
+                                       (len(c.left_edges) + len(c.right_edges) == 2)]
+        interior_ids = {id(n) for n in interior_nodes}
+        interior_edges : List[base_edge] = [c for c in net.components if isinstance(c, base_edge) and
+                                            ((id(c.left) in interior_ids) or (id(c.right) in interior_ids))]
+
+        var_ids = [var_id for element in interior_nodes + interior_edges for var_id in element.var_ids]
+        is_interior = np.zeros(shape = (net.dim,), dtype = bool)
+        is_interior[var_ids] = True
+        self.interior, self.boundary = np.flatnonzero(is_interior), np.flatnonzero(~is_interior)
+
+        self._pattern = None
+        self._key = net.assembly_key
+
+    @property
+    def interior_fraction(self) -> float:
+        if self._key != self.net.assembly_key: self._setup()
+        return len(self.interior)/max(self.net.dim, 1)
+
+    def _same_pattern(self, A : csr_matrix) -> bool:
+        if self._pattern is None: return False
+        indices, indptr, shape = self._pattern
+        return (A.shape == shape) and np.array_equal(A.indptr, indptr) and np.array_equal(A.indices, indices)
+
+    def _block(self, A : csr_matrix, name : str) -> csr_matrix:
+        data_order, indices, indptr, shape = self._blocks[name]
+        return csr_matrix((A.data[data_order], indices, indptr), shape = shape)
+
+    def _symbolic(self, A : csr_matrix):
+        '''
+            data maps of the blocks A_II, A_IB, A_BI and A_BB, chains (connected components of A_II) and a coloring of
+            the boundary columns s.t. no chain sees a color twice
+        '''
+        positions = csr_matrix((np.arange(1, A.nnz + 1, dtype = np.float64), A.indices, A.indptr), shape = A.shape)
+        I = self.interior
+        self.interior = I = I[reverse_cuthill_mckee(positions[I][:, I], symmetric_mode = False)]
+        B = self.boundary
+
+        self._blocks = {}
+        for name, rows, cols in [('II', I, I), ('IB', I, B), ('BI', B, I), ('BB', B, B)]:
+            block = positions[rows][:, cols]
+            block.sort_indices()
+            self._blocks[name] = (block.data.astype(np.intp) - 1, block.indices, block.indptr, block.shape)
+
+        A_II, A_IB = self._block(A, 'II'), self._block(A, 'IB').tocsc()
+        rows, cols = np.repeat(np.arange(len(I)), np.diff(A_II.indptr)), A_II.indices
+        kl, ku = max(0, (rows - cols).max(initial = 0)), max(0, (cols - rows).max(initial = 0))
+        if max(kl, ku) <= self.max_bandwidth: self._band = (kl, ku, (kl + ku + rows - cols)*len(I) + cols)
+        else: self._band = None
+
+        _, chain_of = connected_components(A_II, directed = True, connection = 'weak')
+
+        num_of_boundary = A_IB.shape[1]
+        colors = -np.ones(shape = (num_of_boundary,), dtype = np.intp)
+        chain_colors : List[set] = [set() for _ in range(chain_of.max() + 1 if len(chain_of) > 0 else 0)]
+        chain_rows : List[list] = [[] for _ in chain_colors]
+        for row, chain in enumerate(chain_of): chain_rows[chain].append(row)
+
+        W_rows, W_cols, W_colors = [], [], []
+        for col in range(num_of_boundary):
+            chains = set(chain_of[A_IB.indices[A_IB.indptr[col]:A_IB.indptr[col + 1]]])
+            if len(chains) == 0: continue
+            used = set().union(*[chain_colors[chain] for chain in chains])
+            color = next(c for c in range(len(used) + 1) if not (c in used))
+            colors[col] = color
+            for chain in chains:
+                chain_colors[chain].add(color)
+                W_rows.extend(chain_rows[chain])
+                W_cols.extend([col]*len(chain_rows[chain]))
+                W_colors.extend([color]*len(chain_rows[chain]))
+
+        self._colors = colors
+        self._W_rows = np.array(W_rows, dtype = np.intp)
+        self._W_cols = np.array(W_cols, dtype = np.intp)
+        self._W_colors = np.array(W_colors, dtype = np.intp)
+        self._pattern = (A.indices.copy(), A.indptr.copy(), A.shape)
+
+    def _factorize_interior(self, A : csr_matrix, A_II : csr_matrix):
+        if self._band is None:
+            self._lu_I(A_II, np.zeros(shape = (A_II.shape[0],)), A_did_change = True)
+            return
+
+        kl, ku, positions = self._band
+        ab = np.zeros(shape = (2*kl + ku + 1, A_II.shape[0]))
+        ab.flat[positions] = A_II.data
+        lu, piv, info = dgbtrf(ab, kl, ku, overwrite_ab = 1)
+        if info != 0: raise LinSolveError(f'gbtrf failed (info: {info})!')
+        self._band_lu = (lu, piv)
+
+    def _solve_interior(self, A_II : csr_matrix, b : np.ndarray) -> np.ndarray:
+        if self._band is None: return self._lu_I(A_II, b, A_did_change = False)
+
+        kl, ku, _ = self._band
+        lu, piv = self._band_lu
+        x, info = dgbtrs(lu, kl, ku, b.reshape(len(b), -1), piv)
+        return x.reshape(b.shape)
+
+    def _factorize(self, A : csr_matrix):
+        B = self.boundary
+        if not self._same_pattern(A): self._symbolic(A)
+        A_II, A_IB, A_BI, A_BB = [self._block(A, name) for name in ('II', 'IB', 'BI', 'BB')]
+
+        ''' W == A_II^-1*A_IB: one solve per color '''
+        colors = self._colors
+        num_of_colors = colors.max() + 1 if len(colors) > 0 else 0
+        coupled = np.flatnonzero(colors >= 0)
+        P = csr_matrix((np.ones(shape = coupled.shape), (coupled, colors[coupled])),
+                       shape = (len(B), num_of_colors))
+        R = (A_IB @ P).toarray()
+        self._factorize_interior(A, A_II)
+        X = self._solve_interior(A_II, R)
+        W = csr_matrix((X[self._W_rows, self._W_colors], (self._W_rows, self._W_cols)), shape = A_IB.shape)
+
+        S = csr_matrix(A_BB - A_BI @ W)
+        S.sort_indices()
+        self._lu_S(S, np.zeros(shape = (len(B),)), A_did_change = True)
+
+        self.Mat = (A_II, A_BI, W, S)
+        self.num_of_condensations += 1
+
+    def __call__(self, A : CsMatrix_t,
+                 b : Vec_t,
+                 A_did_change : bool = True) -> Vec_t:
+        '''
+            :param A: CSR -or- sparse system matrix of a linear system of equations: A*x = b
+            :param b: right-hand-side (RHS) vector of a linear system of equations: A*x = b
+            :param A_did_change: boolean flag whether the system matrix has changed since last call
+            :return: solution x as vector of A*x = b
+        '''
+        if self._key != self.net.assembly_key: self._setup() # topology or behaviours of nodes changed
+        condense = (len(self.interior) > 0) and (self.interior_fraction >= self.min_interior_fraction)
+
+        if (self.Mat is None) and (self._lu_A.Mat is None): A_did_change = True
+        if A_did_change:
+            A = csr_matrix(A)
+            A.sum_duplicates()
+            self.Mat = None
+            if condense:
+                try: self._factorize(A)
+                except LinSolveError: # e.g. singular interior blocks of active elements in the current mode
+                    self.num_of_fallbacks += 1
+            if self.Mat is None: return self._lu_A(A, b, A_did_change = True)
+        elif self.Mat is None: return self._lu_A(A, b, A_did_change = False)
+
+        A_II, A_BI, W, S = self.Mat
+        I, B = self.interior, self.boundary
+        y_I = self._solve_interior(A_II, b[I])
+        x_B = self._lu_S(S, b[B] - A_BI @ y_I, A_did_change = False)
+
+        x = np.empty(shape = b.shape, dtype = np.result_type(b, x_B))
+        x[B], x[I] = x_B, y_I - W @ x_B
+        if not np.isfinite(x).all(): raise LinSolveError('static condensation returned a non finite solution!')
+        return x
@@ -18,13 +18,20 @@ from simulator.readerWriter.read_net_yaml import retrieve_topo_yaml, create_net
 from simulator.readerWriter.read_inic_csv import retrieve_inic_csv, create_inic
 from simulator.readerWriter.read_scene_csv import set_scenario_csv, retrieve_simulator_credentials
 
-from simulator.readerWriter.write_results_csv import generate_csv
+from simulator.readerWriter.write_results_csv import generate_csv, result_csv_sink, multi_result_sink, \
+                                                     threaded_result_sink
+from simulator.readerWriter.write_results_npy import generate_npy, result_npy_sink
 from simulator.readerWriter.write_results_meta_yaml import generate_meta_yaml
 
 from simulator.resources.units import relative_time_to_sec #, pressure_to_bar, flow_to_kilogramm_per_second
-from simulator.resources.auxiliary import no_logger
+from simulator.resources.auxiliary import no_logger, ConfigDescriptionError
 
-from paso.solvers.dae.ImpEuler import integrate, ImpEuler_integration_options
+from paso.solvers.dae.ImpEuler import integrate, ImpEuler_integration_options, cycADa_available
+from paso.solvers.dae.BDF import integrate as integrate_BDF, BDF_integration_options
+from paso.solvers.dae.Rosenbrock import integrate as integrate_Rosenbrock, Rosenbrock_integration_options
+from paso.solvers.nlin.sparse_nl_solver.newton.predefined.linsolvers import splu_reuse_wrapper, krylov_ilu_wrapper
+from simulator.preconditioner import spanning_tree_preconditioner, jacobian_free_tree_preconditioner
+from simulator.condensation import static_condensation_solver
 
 from logging import Logger
 
@@ -35,9 +42,66 @@ import yaml
 from typing import Union, Optional, List, Tuple, Dict
 
 
+def _network_linsolver(net, linear_solver : str = 'splu'):
+    if linear_solver == 'splu': return splu_reuse_wrapper() # the sparsity pattern of the jacobian never changes
+    if linear_solver == 'splu_condensed': return static_condensation_solver(net) # interior chains eliminated first
+    if linear_solver == 'gmres_ilu': return krylov_ilu_wrapper(method = 'gmres')
+    if linear_solver == 'gmres_tree': return krylov_ilu_wrapper(method = 'gmres',
+                                                                 preconditioner = spanning_tree_preconditioner(net))
+    raise ConfigDescriptionError("unknown linear_solver: {} (choose splu, splu_condensed, gmres_ilu, gmres_tree or jacobian_free)!".format(linear_solver))
+
+
+def _network_integration_options(integrator_opts : Union[ImpEuler_integration_options, BDF_integration_options],
+                                 net, step_size_control : Optional[dict] = None, linear_solver : str = 'splu',
+                                 globalization : str = 'damping', broyden : bool = False):
+    integrator_opts.reuse_tape = True # record the network on a cycADa tape once; re-record on profile changes only
+    integrator_opts.analytic_jacobian = not cycADa_available # closed form jacobian of the network otherwise
+    if linear_solver == 'jacobian_free': # Newton-Krylov on products J*v, the jacobian is never assembled
+        integrator_opts.jacobian_free = True
+        integrator_opts.jacobian_free_preconditioner = jacobian_free_tree_preconditioner(net)
+    else: integrator_opts.linsolver = _network_linsolver(net, linear_solver = linear_solver)
+    integrator_opts.jacobian_reuse = True # keep the factorized iteration matrix across quiet steps
+    if not (globalization in ('damping', 'armijo', 'trust_region')):
+        raise ConfigDescriptionError("unknown globalization: {} (choose damping, armijo or trust_region)!".format(globalization))
+    integrator_opts.globalization = globalization
+    integrator_opts.broyden = broyden
+    return _network_step_size_control(integrator_opts, net = net, step_size_control = step_size_control)
+
+
+def _network_step_size_control(integrator_opts, net, step_size_control : Optional[dict] = None):
+    if not (step_size_control is None): # error based step sizes instead of (mostly) constant H
+        integrator_opts.atol_dom = step_size_control.get('atol', integrator_opts.atol_dom)
+        integrator_opts.rtol_dom = step_size_control.get('rtol', integrator_opts.rtol_dom)
+        integrator_opts.custom_time_points = net.breakpoints() # steps land on all jumps and kinks of profiles
+    return integrator_opts
+
+
+def _network_rosenbrock_options(net, step_size_control : dict, linear_solver : str = 'splu'):
+    if linear_solver in ('jacobian_free', 'gmres_ilu', 'gmres_tree'): # each step solves its stages to full accuracy
+        raise ConfigDescriptionError(f"linear_solver: {linear_solver} isn't available for Rosenbrock (its stages require a factorized matrix)!")
+    integrator_opts = Rosenbrock_integration_options()
+    integrator_opts.reuse_tape = True # record the network on a cycADa tape once; re-record on profile changes only
+    integrator_opts.analytic_jacobian = not cycADa_available # closed form jacobian of the network otherwise
+    integrator_opts.linsolver = _network_linsolver(net, linear_solver = linear_solver)
+    return _network_step_size_control(integrator_opts, net = net, step_size_control = step_size_control)
+
+
 def simulate_gas_network(config : Union[configuration, str],
                          logger : Optional[Logger] = None,
-                         imp_euler_options : Optional[ImpEuler_integration_options] = None):
+                         imp_euler_options : Optional[ImpEuler_integration_options] = None,
+                         bdf_options : Optional[BDF_integration_options] = None,
+                         rosenbrock_options : Optional[Rosenbrock_integration_options] = None):
+    '''
+        :param config: configuration or path to a *.config.simulation.yaml
+        :param logger: (optional) logger
+        :param imp_euler_options: (optional) options of the implicit Euler; defaults are derived from config
+        :param bdf_options: (optional) options of the BDF integrator; if given (or config.integrator == 'BDF') the
+                            network is integrated by BDF instead of implicit Euler
+        :param rosenbrock_options: (optional) options of the Rosenbrock-W integrator; if given (or config.integrator ==
+                                   'Rosenbrock') the network is integrated by a Rosenbrock-W method
+        :return: time points, states and the network (if config.stream_results or config.write_results_in_background
+                 the states are written while integrating and only the latest ones are returned)
+    '''
     ''' parse configs (if not parsed already) '''
     if isinstance(config, str): config : configuration = configuration(path_config_yaml = config)
 
@@ -62,24 +126,82 @@ def simulate_gas_network(config : Union[configuration, str],
         with open(config.file_path_dump + 'x0.yaml', mode = 'w') as x0_dict_out: yaml.dump(x0.tolist(), x0_dict_out)
         with open(config.file_path_dump + 'event_dict.yaml', mode = 'w') as event_dict_out: yaml.dump(event_dict, event_dict_out)
 
+    ''' choose integrator '''
+    if not (config.integrator in ('ImpEuler', 'BDF', 'Rosenbrock')):
+        raise ConfigDescriptionError("unknown integrator: {} (choose ImpEuler, BDF or Rosenbrock)!".format(config.integrator))
+    use_BDF : bool = (not (bdf_options is None)) or ((imp_euler_options is None) and (rosenbrock_options is None) and
+                                                     (config.integrator == 'BDF'))
+    use_Rosenbrock : bool = (not use_BDF) and ((not (rosenbrock_options is None)) or
+                                               ((imp_euler_options is None) and (config.integrator == 'Rosenbrock')))
+    if use_Rosenbrock:
+        integrator_name, integrator_func = 'Rosenbrock-W', integrate_Rosenbrock
+        if rosenbrock_options is None: # Rosenbrock-W always controls local errors (h is the step size onto breakpoints)
+            rosenbrock_options = _network_rosenbrock_options(net, step_size_control = config.step_size_control or
+                                                                                      {'atol' : 1.0e-2, 'rtol' : 1.0e-3},
+                                                             linear_solver = config.linear_solver)
+        integrator_opts = rosenbrock_options
+    elif use_BDF:
+        integrator_name, integrator_func = 'BDF', integrate_BDF
+        if bdf_options is None: # BDF always controls local errors (h is the step size after breakpoints)
+            bdf_options = _network_integration_options(BDF_integration_options(), net = net,
+                                                       step_size_control = config.step_size_control or
+                                                                           {'atol' : 1.0e-2, 'rtol' : 1.0e-3},
+                                                       linear_solver = config.linear_solver,
+                                                       globalization = config.globalization,
+                                                       broyden = config.broyden)
+        integrator_opts = bdf_options
+    else:
+        integrator_name, integrator_func = 'implicit Euler', integrate
+        if imp_euler_options is None:
+            imp_euler_options = _network_integration_options(ImpEuler_integration_options(), net = net,
+                                                             step_size_control = config.step_size_control,
+                                                             linear_solver = config.linear_solver,
+                                                             globalization = config.globalization,
+                                                             broyden = config.broyden)
+            imp_euler_options.step_size_control = not (config.step_size_control is None)
+        integrator_opts = imp_euler_options
+    integrator_opts.cycADa = True
+
+    ''' stream results into the csv(s) while integrating (if chosen), optionally written by a worker thread '''
+    sink : Optional[Union[result_csv_sink, multi_result_sink, threaded_result_sink]] = None
+    if config.stream_results or config.write_results_in_background:
+        logger.info('stream results: {}'.format(config.path_out_results_csv))
+        sink = result_csv_sink(config = config, net = net)
+        if config.write_npy: sink = multi_result_sink(sink, result_npy_sink(config = config, net = net))
+        if config.write_results_in_background: sink = threaded_result_sink(sink)
+        integrator_opts.result_sink = sink
+        integrator_opts.keep_trajectory = False
+
     ''' execute actual simulation '''
-    logger.info('start implicit Euler integration from t0 = {} to T = {}, with H = {}'.format(t0, T, H))
-    with Timer('<euler instance simulating gas network>', silent_mode = True) as euler_time:
-        if imp_euler_options is None: imp_euler_options = ImpEuler_integration_options()
-        imp_euler_options.cycADa = True
-        imp_euler_report = integrate(net,
-                                     x0 = x0, t0 = t0, T = T, h = H,
-                                     integrator_opts = imp_euler_options)
-        timeTable = imp_euler_report.Ts
-        solution = imp_euler_report.Xs
-    logger.info('implicit Euler integration from t0 = {} to T = {}, with H = {}, finished'.format(t0, T, H))
+    logger.info('start {} integration from t0 = {} to T = {}, with H = {}'.format(integrator_name, t0, T, H))
+    try:
+        with Timer('<{} instance simulating gas network>'.format(integrator_name), silent_mode = True) as euler_time:
+            integrator_report = integrator_func(net,
+                                                x0 = x0, t0 = t0, T = T, h = H,
+                                                integrator_opts = integrator_opts)
+    except BaseException:
+        if not (sink is None): # keep what has been streamed so far, but don't let writer errors hide the actual one
+            try: sink.close()
+            except Exception as e: logger.error('closing the streamed results failed: {!r}'.format(e))
+        raise
+    else:
+        if not (sink is None): sink.close()
+    timeTable = integrator_report.Ts if sink is None else sink.timeTable
+    solution = integrator_report.Xs
+    logger.info('{} integration from t0 = {} to T = {}, with H = {}, finished'.format(integrator_name, t0, T, H))
     logger.info('{}: {}'.format(euler_time.name, euler_time.time_msg))
     logger.info('{}: {}'.format(euler_time.name, euler_time.clock_msg))
 
     ''' post processing of results '''
-    logger.info('generate results: {}'.format(config.path_out_results_csv))
-    generate_csv(config = config, net = net, timeTable = timeTable, solution = solution)
-    logger.info('generation of results: {} complete'.format(config.path_out_results_csv))
+    if sink is None:
+        logger.info('generate results: {}'.format(config.path_out_results_csv))
+        generate_csv(config = config, net = net, timeTable = timeTable, solution = solution)
+        logger.info('generation of results: {} complete'.format(config.path_out_results_csv))
+    else: logger.info('streaming of results: {} complete'.format(config.path_out_results_csv))
+    if config.write_npy and (sink is None): # columnar binary store (see simulator.readerWriter.read_results_npy)
+        logger.info('generate binary results: {}'.format(config.path_out_results_states_npy))
+        generate_npy(config = config, net = net, timeTable = timeTable, solution = solution)
+        logger.info('generation of binary results: {} complete'.format(config.path_out_results_states_npy))
     if not (config.path_out_results_meta_yaml is None): # meta result contain information abaout states of active  elements
         logger.info('generate extended info on results: {}'.format(config.path_out_results_meta_yaml))
         generate_meta_yaml(config = config, net = net, timeTable = timeTable)
@@ -9,11 +9,12 @@ __credits__ = tuple()  # alphabetical order of surnames
     imports
     =======
 '''
+import numpy as np
+
 from simulator.netgraph import base_edge, network_dae, node_t
 from simulator.resources.profiles import table_lookup
-from simulator.resources.auxiliary import obligatory_function
-
-from ad.cycADa import cond_assign, minimum, maximum, logical_and, logical_or
+from simulator.resources.auxiliary import obligatory_function, cond_assign, minimum, maximum, logical_and, logical_or
+from simulator.assembly import minimum_with_gradient, maximum_with_gradient, where_with_gradient
 
 
 class _edge_with_target_values(base_edge):
@@ -44,6 +45,13 @@ class _edge_with_target_values(base_edge):
         self._target_q = obligatory_function('target q func', str(self))
         self.target_q_locked = False
 
+    @staticmethod
+    def _partials_from_gradient(block, gradient):
+        rows = block.var_ids[:, 0]
+        return [(rows, block.pL_ids, 0.0, gradient[..., 0]),
+                (rows, block.pR_ids, 0.0, gradient[..., 1]),
+                (rows, block.qL_ids, 0.0, gradient[..., 2])]
+
     @property
     def by_io_func(self):
         return self._by_io_func
@@ -144,6 +152,43 @@ class idealCompressor(_edge_with_target_values):
         '''
         return cond
 
+    @staticmethod
+    def _vectorized_cond(block, x, t):
+        pL = x[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+        q = x[..., block.qL_ids]
+
+        io = block.profile('io_func', t)
+        by_io = np.minimum(block.profile('by_io_func', t), io)
+
+        bar_pR  = block.profile('target_upper_pR', t)
+        ubar_pL = np.minimum(bar_pR, block.profile('target_lower_pL', t))
+
+        bar_ubar_q = block.profile('target_q', t)
+
+        ''' candidates as (value, gradient w.r.t. (pL, pR, q)) '''
+        cond = minimum_with_gradient((bar_ubar_q - q, (0.0, 0.0, -1.0)), # target flow
+                                     (pL - ubar_pL, (1.0, 0.0, 0.0)),    # target pressures
+                                     (bar_pR - pR, (0.0, -1.0, 0.0)))
+        cond = maximum_with_gradient(cond,
+                                     (1000.0*(pL - pR), (1000.0, -1000.0, 0.0)), # principal necessities of compressors
+                                     (-1000.0*q, (0.0, 0.0, -1000.0)))
+
+        cond = where_with_gradient(by_io > 0.01, (pR - pL, (-1.0, 1.0, 0.0)), cond)
+        cond = where_with_gradient(io < 0.01, (q, (0.0, 0.0, 1.0)), cond)
+
+        return cond
+
+    @classmethod
+    def vectorized_call(cls, block, dx, x, t):
+        cond, _ = cls._vectorized_cond(block, x, t)
+        return cond,
+
+    @classmethod
+    def vectorized_partials(cls, block, dx, x, t):
+        _, gradient = cls._vectorized_cond(block, x, t)
+        return _edge_with_target_values._partials_from_gradient(block, gradient)
+
 
 class idealControlValve(_edge_with_target_values):
 
@@ -191,3 +236,47 @@ class idealControlValve(_edge_with_target_values):
             return statement
         '''
         return cond
+
+    @staticmethod
+    def _vectorized_cond(block, x, t):
+        pL = x[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+        q = x[..., block.qL_ids]
+
+        io = block.profile('io_func', t)
+        by_io = np.minimum(block.profile('by_io_func', t), io)
+
+        bar_pR = block.profile('target_upper_pR', t)
+        ubar_pR = np.minimum(bar_pR, block.profile('target_lower_pR', t))
+
+        bar_pL = np.maximum(ubar_pR, block.profile('target_upper_pL', t))
+        ubar_pL = np.minimum(bar_pL, block.profile('target_lower_pL', t))
+
+        bar_ubar_q = np.maximum(0.0, block.profile('target_q', t))
+
+        ''' candidates as (value, gradient w.r.t. (pL, pR, q)) '''
+        px = (100.0 * (pL - pR) - 0.001, (100.0, -100.0, 0.0))
+        cond = maximum_with_gradient((bar_ubar_q, (0.0, 0.0, 0.0)),
+                                     (1000.0*(ubar_pR - pR), (0.0, -1000.0, 0.0)),
+                                     (1000.0*(pL - bar_pL), (1000.0, 0.0, 0.0)))
+        cond = minimum_with_gradient(cond,
+                                     (1000.0*(bar_pR - pR), (0.0, -1000.0, 0.0)),
+                                     (1000.0*(pL - ubar_pL), (1000.0, 0.0, 0.0)),
+                                     px)
+        cond, gradient = maximum_with_gradient((0.0, (0.0, 0.0, 0.0)), cond)
+        cond = cond - q, gradient - (0.0, 0.0, 1.0)
+
+        cond = where_with_gradient(by_io > 0.01, (pR - pL, (-1.0, 1.0, 0.0)), cond)
+        cond = where_with_gradient(io < 0.01, (q, (0.0, 0.0, 1.0)), cond)
+
+        return cond
+
+    @classmethod
+    def vectorized_call(cls, block, dx, x, t):
+        cond, _ = cls._vectorized_cond(block, x, t)
+        return cond,
+
+    @classmethod
+    def vectorized_partials(cls, block, dx, x, t):
+        _, gradient = cls._vectorized_cond(block, x, t)
+        return _edge_with_target_values._partials_from_gradient(block, gradient)
@@ -20,9 +20,11 @@ __credits__ = tuple()  # alphabetical order of surnames
     imports
     =======
 '''
+import numpy as np
+
 from simulator.netgraph import base_edge, network_dae, node_t
 
-from ad.cycADa import signSquare
+from simulator.resources.auxiliary import signSquare
 
 
 class pipeLR(base_edge):
@@ -61,3 +63,52 @@ class pipeLR(base_edge):
 
         return dpR + BzR_over_length*(qR - qL), \
                pR*dqL + A_over_length*(pR_square - pR*pL) + fric_coeff*zR*signSquare(qL) + pR_square*slope_coeff/zR
+
+    @staticmethod
+    def vectorized_call(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('frictionCoefficient')
+        slope_coeff   = block.parameter('slopeFactor')
+
+        pL  = x[..., block.pL_ids]
+        pR  = x[..., block.pR_ids]
+        dpR = dx[..., block.pR_ids]
+
+        qL  = x[..., block.qL_ids]
+        dqL = dx[..., block.qL_ids]
+        qR  = x[..., block.qR_ids]
+
+        zR, BzR = block.zModel(pR)
+
+        BzR_over_length = BzR/block.parameter('length')
+
+        pR_square = pR*pR
+
+        return dpR + BzR_over_length*(qR - qL), \
+               pR*dqL + A_over_length*(pR_square - pR*pL) + fric_coeff*zR*np.abs(qL)*qL + pR_square*slope_coeff/zR
+
+    @staticmethod
+    def vectorized_partials(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('frictionCoefficient')
+        slope_coeff   = block.parameter('slopeFactor')
+        length        = block.parameter('length')
+
+        pL  = x[..., block.pL_ids]
+        pR  = x[..., block.pR_ids]
+
+        qL  = x[..., block.qL_ids]
+        dqL = dx[..., block.qL_ids]
+        qR  = x[..., block.qR_ids]
+
+        zR, BzR, dzR, dBzR = block.zModel_partials(pR)
+
+        rows_p, rows_q = block.var_ids.T
+
+        return [(rows_p, block.pR_ids, 1.0, (dBzR/length)*(qR - qL)),
+                (rows_p, block.qR_ids, 0.0, BzR/length),
+                (rows_p, block.qL_ids, 0.0, -BzR/length),
+                (rows_q, block.qL_ids, pR, 2.0*fric_coeff*zR*np.abs(qL)),
+                (rows_q, block.pR_ids, 0.0, dqL + A_over_length*(2.0*pR - pL) + fric_coeff*dzR*np.abs(qL)*qL
+                                            + slope_coeff*(2.0*pR*zR - pR*pR*dzR)/(zR*zR)),
+                (rows_q, block.pL_ids, 0.0, -A_over_length*pR)]
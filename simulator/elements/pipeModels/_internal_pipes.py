@@ -58,3 +58,55 @@ class internal_pipe(base_edge):
 
         return dpMid + BzTrap_over_length*(qR - qL), \
                dqMid + A_over_length*(pR - pL)
+
+    @staticmethod
+    def vectorized_call(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+
+        pL  = x[..., block.pL_ids]
+        dpL = dx[..., block.pL_ids]
+        pR  = x[..., block.pR_ids]
+        dpR = dx[..., block.pR_ids]
+
+        qL  = x[..., block.qL_ids]
+        dqL = dx[..., block.qL_ids]
+        qR  = x[..., block.qR_ids]
+        dqR = dx[..., block.qR_ids]
+
+        zL, BzL = block.zModel(pL)
+        zR, BzR = block.zModel(pR)
+
+        dpMid = (dpR + dpL)/2.0
+        dqMid = (dqR + dqL)/2.0
+
+        BzTrap_over_length = ((BzR + BzL)/2.0)/block.parameter('length')
+
+        return dpMid + BzTrap_over_length*(qR - qL), \
+               dqMid + A_over_length*(pR - pL)
+
+    @staticmethod
+    def vectorized_partials(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        length        = block.parameter('length')
+
+        pL  = x[..., block.pL_ids]
+        pR  = x[..., block.pR_ids]
+
+        qL  = x[..., block.qL_ids]
+        qR  = x[..., block.qR_ids]
+
+        _, BzL, _, dBzL = block.zModel_partials(pL)
+        _, BzR, _, dBzR = block.zModel_partials(pR)
+
+        BzTrap_over_length = ((BzR + BzL)/2.0)/length
+
+        rows_p, rows_q = block.var_ids.T
+
+        return [(rows_p, block.pR_ids, 0.5, (dBzR/(2.0*length))*(qR - qL)),
+                (rows_p, block.pL_ids, 0.5, (dBzL/(2.0*length))*(qR - qL)),
+                (rows_p, block.qR_ids, 0.0, BzTrap_over_length),
+                (rows_p, block.qL_ids, 0.0, -BzTrap_over_length),
+                (rows_q, block.qR_ids, 0.5, 0.0),
+                (rows_q, block.qL_ids, 0.5, 0.0),
+                (rows_q, block.pR_ids, 0.0, A_over_length),
+                (rows_q, block.pL_ids, 0.0, -A_over_length)]
@@ -20,9 +20,11 @@ __credits__ = tuple()  # alphabetical order of surnames
     imports
     =======
 '''
+import numpy as np
+
 from simulator.netgraph import base_edge, network_dae, node_t
 
-from ad.cycADa import signSquare
+from simulator.resources.auxiliary import signSquare
 
 
 class pipeBox(base_edge):
@@ -71,3 +73,75 @@ class pipeBox(base_edge):
 
         return dpMid + BzTrap_over_length*(qR - qL), \
                dqMid + A_over_length*(pR - pL) + fric_coeff*nonLinTrap + slope_coeff*pzMid
+
+    @staticmethod
+    def vectorized_call(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('frictionCoefficient')
+        slope_coeff   = block.parameter('slopeFactor')
+
+        pL  = x[..., block.pL_ids]
+        dpL = dx[..., block.pL_ids]
+        pR  = x[..., block.pR_ids]
+        dpR = dx[..., block.pR_ids]
+
+        qL  = x[..., block.qL_ids]
+        dqL = dx[..., block.qL_ids]
+        qR  = x[..., block.qR_ids]
+        dqR = dx[..., block.qR_ids]
+
+        zL, BzL = block.zModel(pL)
+        zR, BzR = block.zModel(pR)
+
+        zpL = zL/pL
+        zpR = zR/pR
+
+        pzMid = (1.0/zpR + 1.0/zpL)/2.0
+
+        dpMid = (dpR + dpL)/2.0
+        dqMid = (dqR + dqL)/2.0
+
+        BzTrap_over_length = ((BzR + BzL)/2.0)/block.parameter('length')
+
+        nonLinTrap = (zpR*np.abs(qR)*qR + zpL*np.abs(qL)*qL)/2.0
+
+        return dpMid + BzTrap_over_length*(qR - qL), \
+               dqMid + A_over_length*(pR - pL) + fric_coeff*nonLinTrap + slope_coeff*pzMid
+
+    @staticmethod
+    def vectorized_partials(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('frictionCoefficient')
+        slope_coeff   = block.parameter('slopeFactor')
+        length        = block.parameter('length')
+
+        pL  = x[..., block.pL_ids]
+        pR  = x[..., block.pR_ids]
+
+        qL  = x[..., block.qL_ids]
+        qR  = x[..., block.qR_ids]
+
+        zL, BzL, dzL, dBzL = block.zModel_partials(pL)
+        zR, BzR, dzR, dBzR = block.zModel_partials(pR)
+
+        zpL = zL/pL
+        zpR = zR/pR
+
+        dzpL = (dzL*pL - zL)/(pL*pL) # derivatives of z/p
+        dzpR = (dzR*pR - zR)/(pR*pR)
+
+        dpzL = (zL - pL*dzL)/(zL*zL) # derivatives of p/z
+        dpzR = (zR - pR*dzR)/(zR*zR)
+
+        BzTrap_over_length = ((BzR + BzL)/2.0)/length
+
+        rows_p, rows_q = block.var_ids.T
+
+        return [(rows_p, block.pR_ids, 0.5, (dBzR/(2.0*length))*(qR - qL)),
+                (rows_p, block.pL_ids, 0.5, (dBzL/(2.0*length))*(qR - qL)),
+                (rows_p, block.qR_ids, 0.0, BzTrap_over_length),
+                (rows_p, block.qL_ids, 0.0, -BzTrap_over_length),
+                (rows_q, block.qR_ids, 0.5, fric_coeff*zpR*np.abs(qR)),
+                (rows_q, block.qL_ids, 0.5, fric_coeff*zpL*np.abs(qL)),
+                (rows_q, block.pR_ids, 0.0, A_over_length + (fric_coeff*dzpR*np.abs(qR)*qR + slope_coeff*dpzR)/2.0),
+                (rows_q, block.pL_ids, 0.0, -A_over_length + (fric_coeff*dzpL*np.abs(qL)*qL + slope_coeff*dpzL)/2.0)]
@@ -20,10 +20,10 @@ __credits__ = tuple()  # alphabetical order of surnames
     imports
     =======
 '''
-from simulator.netgraph import base_edge, network_dae, node_t
-from simulator.resources.auxiliary import ModellingError
+import numpy as np
 
-from ad.cycADa import signSquare
+from simulator.netgraph import base_edge, network_dae, node_t
+from simulator.resources.auxiliary import ModellingError, signSquare
 
 
 class pipeMid(base_edge):
@@ -67,3 +67,72 @@ class pipeMid(base_edge):
 
         return dpMid + BzMid_over_length*(qR - qL), \
                dqMid + A_over_length*(pR - pL) + fric_coeff*zpMid*signSquare(qMid) + slope_coeff/zpMid
+
+    @staticmethod
+    def vectorized_call(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('frictionCoefficient')
+        slope_coeff   = block.parameter('slopeFactor')
+
+        pL  = x[..., block.pL_ids]
+        dpL = dx[..., block.pL_ids]
+        pR  = x[..., block.pR_ids]
+        dpR = dx[..., block.pR_ids]
+
+        qL  = x[..., block.qL_ids]
+        dqL = dx[..., block.qL_ids]
+        qR  = x[..., block.qR_ids]
+        dqR = dx[..., block.qR_ids]
+
+        pMid = (pR + pL)/2.0
+        qMid = (qR + qL)/2.0
+
+        zMid, BzMid = block.zModel(pMid)
+
+        zpMid = zMid/pMid
+
+        dpMid = (dpR + dpL)/2.0
+        dqMid = (dqR + dqL)/2.0
+
+        BzMid_over_length = BzMid/block.parameter('length')
+
+        return dpMid + BzMid_over_length*(qR - qL), \
+               dqMid + A_over_length*(pR - pL) + fric_coeff*zpMid*np.abs(qMid)*qMid + slope_coeff/zpMid
+
+    @staticmethod
+    def vectorized_partials(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('frictionCoefficient')
+        slope_coeff   = block.parameter('slopeFactor')
+        length        = block.parameter('length')
+
+        pL  = x[..., block.pL_ids]
+        pR  = x[..., block.pR_ids]
+
+        qL  = x[..., block.qL_ids]
+        qR  = x[..., block.qR_ids]
+
+        pMid = (pR + pL)/2.0
+        qMid = (qR + qL)/2.0
+
+        zMid, BzMid, dzMid, dBzMid = block.zModel_partials(pMid)
+
+        zpMid = zMid/pMid
+
+        dzpMid = (dzMid*pMid - zMid)/(pMid*pMid) # derivative of z/p
+        dpzMid = (zMid - pMid*dzMid)/(zMid*zMid) # derivative of p/z
+
+        dp_bracket  = (dBzMid/(2.0*length))*(qR - qL)
+        dp_friction = (fric_coeff*dzpMid*np.abs(qMid)*qMid + slope_coeff*dpzMid)/2.0
+        dq_friction = fric_coeff*zpMid*np.abs(qMid)
+
+        rows_p, rows_q = block.var_ids.T
+
+        return [(rows_p, block.pR_ids, 0.5, dp_bracket),
+                (rows_p, block.pL_ids, 0.5, dp_bracket),
+                (rows_p, block.qR_ids, 0.0, BzMid/length),
+                (rows_p, block.qL_ids, 0.0, -BzMid/length),
+                (rows_q, block.qR_ids, 0.5, dq_friction),
+                (rows_q, block.qL_ids, 0.5, dq_friction),
+                (rows_q, block.pR_ids, 0.0, A_over_length + dp_friction),
+                (rows_q, block.pL_ids, 0.0, -A_over_length + dp_friction)]
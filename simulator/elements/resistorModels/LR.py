@@ -9,9 +9,11 @@ __credits__ = tuple()  # alphabetical order of surnames
     imports
     =======
 '''
+import numpy as np
+
 from simulator.netgraph import base_edge, network_dae, node_t
 
-from ad.cycADa import signSquare
+from simulator.resources.auxiliary import signSquare
 
 
 class resistorLR(base_edge):
@@ -41,3 +43,37 @@ class resistorLR(base_edge):
         pR_square = pR*pR
 
         return A_over_length*(pR_square - pR*pL) + fric_coeff*zR*signSquare(q)  # tilde here is part of z
+
+    @staticmethod
+    def vectorized_call(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('drag_factor')/2.0
+
+        pL = x[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+
+        q  = x[..., block.qL_ids]
+
+        zR = block.zModel(pR, bracket_eval = False)
+
+        pR_square = pR*pR
+
+        return A_over_length*(pR_square - pR*pL) + fric_coeff*zR*np.abs(q)*q,
+
+    @staticmethod
+    def vectorized_partials(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('drag_factor')/2.0
+
+        pL = x[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+
+        q  = x[..., block.qL_ids]
+
+        zR, dzR = block.zModel_partials(pR, bracket_eval = False)
+
+        rows = block.var_ids[:, 0]
+
+        return [(rows, block.pR_ids, 0.0, A_over_length*(2.0*pR - pL) + fric_coeff*dzR*np.abs(q)*q),
+                (rows, block.pL_ids, 0.0, -A_over_length*pR),
+                (rows, block.qL_ids, 0.0, 2.0*fric_coeff*zR*np.abs(q))]
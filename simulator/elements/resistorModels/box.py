@@ -9,9 +9,11 @@ __credits__ = tuple()  # alphabetical order of surnames
     imports
     =======
 '''
+import numpy as np
+
 from simulator.netgraph import base_edge, network_dae, node_t
 
-from ad.cycADa import signSquare
+from simulator.resources.auxiliary import signSquare
 
 
 class resistorBox(base_edge):
@@ -46,3 +48,44 @@ class resistorBox(base_edge):
         zpMid = self._trapezoidEval(zpR, zpL, None)
 
         return A_over_length*(pR - pL) + fric_coeff*zpMid*signSquare(q)
+
+    @staticmethod
+    def vectorized_call(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('drag_factor')/2.0
+
+        pL = x[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+
+        q  = x[..., block.qL_ids]
+
+        zL = block.zModel(pL, bracket_eval = False)
+        zR = block.zModel(pR, bracket_eval = False)
+
+        zpMid = (zR/pR + zL/pL)/2.0
+
+        return A_over_length*(pR - pL) + fric_coeff*zpMid*np.abs(q)*q,
+
+    @staticmethod
+    def vectorized_partials(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('drag_factor')/2.0
+
+        pL = x[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+
+        q  = x[..., block.qL_ids]
+
+        zL, dzL = block.zModel_partials(pL, bracket_eval = False)
+        zR, dzR = block.zModel_partials(pR, bracket_eval = False)
+
+        zpMid = (zR/pR + zL/pL)/2.0
+
+        dzpL = (dzL*pL - zL)/(pL*pL) # derivatives of z/p
+        dzpR = (dzR*pR - zR)/(pR*pR)
+
+        rows = block.var_ids[:, 0]
+
+        return [(rows, block.pR_ids, 0.0, A_over_length + fric_coeff*(dzpR/2.0)*np.abs(q)*q),
+                (rows, block.pL_ids, 0.0, -A_over_length + fric_coeff*(dzpL/2.0)*np.abs(q)*q),
+                (rows, block.qL_ids, 0.0, 2.0*fric_coeff*zpMid*np.abs(q))]
@@ -9,9 +9,11 @@ __credits__ = tuple()  # alphabetical order of surnames
     imports
     =======
 '''
+import numpy as np
+
 from simulator.netgraph import base_edge, network_dae, node_t
 
-from ad.cycADa import signSquare
+from simulator.resources.auxiliary import signSquare
 
 
 class resistorMid(base_edge):
@@ -42,3 +44,42 @@ class resistorMid(base_edge):
         zpMid = zMid/pMid
 
         return A_over_length*(pR - pL) + fric_coeff*zpMid*signSquare(q)
+
+    @staticmethod
+    def vectorized_call(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('drag_factor')/2.0
+
+        pL = x[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+
+        q  = x[..., block.qL_ids]
+
+        pMid = (pR + pL)/2.0
+
+        zpMid = block.zModel(pMid, bracket_eval = False)/pMid
+
+        return A_over_length*(pR - pL) + fric_coeff*zpMid*np.abs(q)*q,
+
+    @staticmethod
+    def vectorized_partials(block, dx, x, t):
+        A_over_length = block.parameter('scaled_area_over_length')
+        fric_coeff    = block.parameter('drag_factor')/2.0
+
+        pL = x[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+
+        q  = x[..., block.qL_ids]
+
+        pMid = (pR + pL)/2.0
+
+        zMid, dzMid = block.zModel_partials(pMid, bracket_eval = False)
+
+        zpMid = zMid/pMid
+        dp_friction = fric_coeff*((dzMid*pMid - zMid)/(2.0*pMid*pMid))*np.abs(q)*q
+
+        rows = block.var_ids[:, 0]
+
+        return [(rows, block.pR_ids, 0.0, A_over_length + dp_friction),
+                (rows, block.pL_ids, 0.0, -A_over_length + dp_friction),
+                (rows, block.qL_ids, 0.0, 2.0*fric_coeff*zpMid*np.abs(q))]
@@ -32,3 +32,21 @@ class shortPipe(base_edge):
         px = pR - pL
 
         return 1.0e-10*(dpR - dpL + dq) + px
+
+    @staticmethod
+    def vectorized_call(block, dx, x, t):
+        pL = x[..., block.pL_ids]
+        dpL = dx[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+        dpR = dx[..., block.pR_ids]
+        dq = dx[..., block.qL_ids]
+
+        return 1.0e-10*(dpR - dpL + dq) + (pR - pL),
+
+    @staticmethod
+    def vectorized_partials(block, dx, x, t):
+        rows = block.var_ids[:, 0]
+
+        return [(rows, block.pR_ids, 1.0e-10, 1.0),
+                (rows, block.pL_ids, -1.0e-10, -1.0),
+                (rows, block.qL_ids, 1.0e-10, 0.0)]
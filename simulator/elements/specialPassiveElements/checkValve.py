@@ -9,9 +9,11 @@ __credits__ = tuple()  # alphabetical order of surnames
     imports
     =======
 '''
+import numpy as np
+
 from simulator.netgraph import base_edge, network_dae, node_t
 
-from ad.cycADa import maximum
+from simulator.resources.auxiliary import maximum
 
 
 class checkValve(base_edge):
@@ -28,3 +30,25 @@ class checkValve(base_edge):
         q = self.q_flowThrough
 
         return maximum(-q, pL - pR)
+
+    @staticmethod
+    def vectorized_call(block, dx, x, t):
+        pL = x[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+        q = x[..., block.qL_ids]
+
+        return np.maximum(-q, pL - pR),
+
+    @staticmethod
+    def vectorized_partials(block, dx, x, t):
+        pL = x[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+        q = x[..., block.qL_ids]
+
+        pressure_active = (pL - pR) > -q
+
+        rows = block.var_ids[:, 0]
+
+        return [(rows, block.pL_ids, 0.0, np.where(pressure_active, 1.0, 0.0)),
+                (rows, block.pR_ids, 0.0, np.where(pressure_active, -1.0, 0.0)),
+                (rows, block.qL_ids, 0.0, np.where(pressure_active, 0.0, -1.0))]
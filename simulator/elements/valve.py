@@ -9,10 +9,12 @@ __credits__ = tuple()  # alphabetical order of surnames
     imports
     =======
 '''
+import numpy as np
+
 from simulator.netgraph import base_edge, network_dae, node_t
 from simulator.resources.profiles import default_io
 
-from ad.cycADa import cond_assign
+from simulator.resources.auxiliary import cond_assign
 
 
 ''' discontinuous modelling '''
@@ -37,6 +39,26 @@ class valve(base_edge):
 
         return cond_assign(io > 0.0, px, q)
 
+    @staticmethod
+    def vectorized_call(block, dx, x, t):
+        pL = x[..., block.pL_ids]
+        pR = x[..., block.pR_ids]
+        q = x[..., block.qL_ids]
+
+        io = block.profile('io_func', t)
+
+        return np.where(io > 0.0, pR - pL, q),
+
+    @staticmethod
+    def vectorized_partials(block, dx, x, t):
+        is_open = np.where(block.profile('io_func', t) > 0.0, 1.0, 0.0)
+
+        rows = block.var_ids[:, 0]
+
+        return [(rows, block.pR_ids, 0.0, is_open),
+                (rows, block.pL_ids, 0.0, -is_open),
+                (rows, block.qL_ids, 0.0, 1.0 - is_open)]
+
 
 ''' continuous modelling '''
 # class valve(base_edge):
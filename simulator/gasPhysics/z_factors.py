@@ -60,6 +60,8 @@ def create_scaled_aga_bracketAga(gasMix : gas_mixture):
             return aga, aga**2.0
         return aga
 
+    aga_bracketAga.coefficients = (1.0, alpha) # z(p) == a + b*p and bracket == z(p)**2/a
+
     return aga_bracketAga
 
 
@@ -106,6 +108,8 @@ def create_c_bracketC(gasMix : gas_mixture):
             return z_c, z_c
         return z_c
 
+    c_bracketC.coefficients = (z_c, 0.0) # z(p) == a + b*p and bracket == z(p)**2/a
+
     return c_bracketC
 
 
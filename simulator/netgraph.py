@@ -11,9 +11,11 @@ __credits__ = tuple() # alphabetical order of surnames
     =======
 '''
 import numpy as np
+from scipy.sparse import csr_matrix
 from typing import Union, Tuple, Optional, List
 
-from simulator.resources.auxiliary import ModellingError
+from simulator.resources.auxiliary import ModellingError, VectorizationError
+from simulator.assembly import assembly_plan
 from simulator.resources.units import length_to_meter, acceleration_to_m_per_s_2, pressure_to_pascal
 from simulator.gasPhysics.mixtures import gas_mixture
 from simulator.gasPhysics.z_factors import zModel_t
@@ -22,6 +24,12 @@ from simulator.gasPhysics.friction_factors import fModel_t
 
 class network_dae(object):
 
+    profile_attributes = ('pBoundFunc', 'qBoundFunc',
+                          'io_func', 'by_io_func',
+                          'target_upper_pR', 'target_lower_pR',
+                          'target_upper_pL', 'target_lower_pL',
+                          'target_q') # names under which elements hold their time dependent profiles
+
     def __init__(self, name = 'generic'):
         self.name = name
 
@@ -53,6 +61,10 @@ class network_dae(object):
         self.input : Optional[np.ndarray] = None
         self.dinput : Optional[np.ndarray] = None
 
+        self.vectorized = True # evaluate all elements of a type at once (see simulator.assembly) where possible
+        self._assembly_plan : Optional[assembly_plan] = None
+        self._structure_update_id = 0
+
     @property
     def gasMix(self) -> gas_mixture:
         if self.gasMix_update_id == 0:
@@ -98,7 +110,27 @@ class network_dae(object):
         self._fModel_update_id += 1
         self._fModel = fModel
 
+    @property
+    def assembly_key(self) -> tuple:
+        return self._structure_update_id, self.gasMix_update_id, self.zModel_update_id, self.fModel_update_id
+
+    def invalidate_assembly_plan(self):
+        '''
+            forces a recompilation of the assembly plan before the next evaluation. Topology, node behaviours, profiles,
+            edge geometries and gas models are tracked automatically; call this after changing any other element
+            attribute (e.g. drag_factor) once the net was evaluated.
+        '''
+        self._structure_update_id += 1
+
+    @property
+    def assembly_plan(self) -> assembly_plan:
+        if (self._assembly_plan is None) or (self._assembly_plan.key != self.assembly_key):
+            self._assembly_plan = assembly_plan(self)
+        return self._assembly_plan
+
     def append(self, obj : "base_element"):
+        self.invalidate_assembly_plan()
+
         obj.block_idx = self.dim
         self.dim += obj.dim
 
@@ -121,7 +153,70 @@ class network_dae(object):
                 if not ('hidden' in obj.type): self.all_edge_types.append(obj.type)
                 else: self.all_hidden_edge_types.append(obj.type)
 
+    def profiles(self):
+        '''
+            :return: generator over (element, attribute name, profile) of all profiles set on elements of the net
+        '''
+        for element in self.components:
+            for attr in self.profile_attributes:
+                profile = getattr(element, attr, None)
+                if not (profile is None): yield element, attr, profile
+
+    def breakpoints(self) -> List[float]:
+        '''
+            :return: sorted time points where any profile set on elements of the net jumps or has kinks (see
+                     table_lookup.breakpoints), e.g. to be landed on exactly by integrators
+        '''
+        return sorted({float(ti) for _, _, profile in self.profiles() for ti in getattr(profile, 'breakpoints', [])})
+
+    def tape_signature(self, t : float) -> tuple:
+        '''
+            all values that enter the network function as constants for a fixed t (i.e. profile values and thus the
+            branches of cond_assign, too). As long as the signature doesn't change a recorded tape remains valid.
+
+            :param t: time point
+            :return: hashable signature
+        '''
+        return (self.gasMix_update_id, self.zModel_update_id, self.fModel_update_id) + \
+               tuple(self.assembly_plan.profile_bank(t).tolist())
+
     def __call__(self, dx : np.ndarray, x : np.ndarray, t : float, **kwargs):
+        if self.vectorized and (x.dtype != object) and (dx.dtype != object):
+            return self.assembly_plan(self, dx, x, t, **kwargs)
+        return self._call_elementwise(dx, x, t, **kwargs)
+
+    def jacobian(self, dx : np.ndarray, x : np.ndarray, t : float, c : float = 1.0, **kwargs) -> csr_matrix:
+        '''
+            closed form jacobian c*dF/d(dx) + dF/dx of the network function F(dx, x, t) (doesn't require cycADa)
+
+            :param dx: derivative of the state
+            :param x: state
+            :param t: time point
+            :param c: factor for the derivative w.r.t. dx (e.g. 1/h for implicit Euler)
+            :return: jacobian in csr format with a fixed sparsity pattern
+        '''
+        try:
+            return self.assembly_plan.jacobian(dx, x, t, c)
+        except VectorizationError as e:
+            raise ModellingError("analytic jacobian isn't available: {}!".format(e))
+
+    def jacobian_blocks(self, dx : np.ndarray, x : np.ndarray, t : float, **kwargs) -> Tuple[csr_matrix, csr_matrix]:
+        '''
+            closed form blocks of the jacobian: E = dF/d(dx) (the mass matrix) and K = dF/dx. The residuals of all
+            elements are linear in dx, hence the iteration matrix c*E + K of a time step can be reassembled for any c
+            (e.g. after step size changes) without re-evaluating the network.
+
+            :param dx: derivative of the state
+            :param x: state
+            :param t: time point
+            :return: E and K in csr format sharing the sparsity pattern of jacobian
+        '''
+        try:
+            return self.assembly_plan.jacobian_blocks(dx, x, t)
+        except VectorizationError as e:
+            raise ModellingError("analytic jacobian isn't available: {}!".format(e))
+
+    def _call_elementwise(self, dx : np.ndarray, x : np.ndarray, t : float, **kwargs):
         self.input  = x
         self.dinput = dx
 
@@ -143,6 +238,8 @@ class network_dae(object):
 
 class base_element(object):
 
+    vectorized_call = None # optional numpy kernel evaluating all elements of a type at once (see simulator.assembly)
+
     def __init__(self, name : str, element_type : str, net : network_dae, dim : int):
         '''
             :param name:
@@ -176,6 +273,10 @@ class base_element(object):
     def var_ids(self):
         return [self.variable_id(idx) for idx in range(self.dim)]
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in network_dae.profile_attributes: self.net.invalidate_assembly_plan() # profiles are packed by the plan
+
     def __str__(self):
         return "<elem name: {} | type: {}>".format(self.name, self.type)
 
@@ -248,6 +349,8 @@ class node(base_element):
             if new_behav == 0: self._callFunc = self.pCond
             else: self._callFunc = self.qCond
 
+            self.net.invalidate_assembly_plan()
+
     def pCond(self, t):
         return self.p_press - self.pBoundFunc(t)
 
@@ -264,6 +367,46 @@ class node(base_element):
     def __call__(self, t, **kwargs):
         return self._callFunc(t)
 
+    @staticmethod
+    def vectorized_setup(block):
+        if block.var_ids.shape[1] != 1:
+            block.elementwise = True
+            return
+
+        behaviours = np.array([nodeInstance.behaviour for nodeInstance in block.elements])
+        block.p_nodes = np.flatnonzero(behaviours == 0)
+        block.q_nodes = np.flatnonzero(behaviours != 0)
+
+        ''' incidence of the flows: +qR of right edges and -qL of left edges for each q-node '''
+        entries = []
+        for row, idx in enumerate(block.q_nodes):
+            nodeInstance = block.elements[idx]
+            entries.extend((row, edgeR.qR_rightFlow_id, 1.0) for edgeR in nodeInstance.right_edges)
+            entries.extend((row, edgeL.qL_leftFlow_id, -1.0) for edgeL in nodeInstance.left_edges)
+        rows, cols, vals = zip(*entries) if len(entries) > 0 else ((), (), ())
+        block.incidence = csr_matrix((vals, (rows, cols)), shape = (len(block.q_nodes), block.elements[0].net.dim))
+
+    @staticmethod
+    def vectorized_call(block, dx, x, t):
+        result = np.empty(x.shape[:-1] + (len(block),), dtype = x.dtype)
+
+        p_press = x[..., block.var_ids[block.p_nodes, 0]]
+        result[..., block.p_nodes] = p_press - block.profile('pBoundFunc', t, block.p_nodes)
+
+        flows = block.incidence.dot(x.T).T
+        result[..., block.q_nodes] = flows + block.profile('qBoundFunc', t, block.q_nodes)
+
+        return result,
+
+    @staticmethod
+    def vectorized_partials(block, dx, x, t):
+        p_press_ids = block.var_ids[block.p_nodes, 0]
+
+        incidence = block.incidence.tocoo()
+
+        return [(p_press_ids, p_press_ids, 0.0, 1.0),
+                (block.var_ids[block.q_nodes[incidence.row], 0], incidence.col, 0.0, incidence.data)]
+
 
 node_t = Union[node, Tuple[str, int]]
 
@@ -348,6 +491,7 @@ class base_edge(base_element):
             raise ModellingError(err_msg)
 
         self._single_flow = new_state
+        self.net.invalidate_assembly_plan()
 
     def assign_topo_info(self,
                          gasMix = None,
@@ -383,6 +527,7 @@ class base_edge(base_element):
         self.slopeFactor = g*hx
 
         self._compute_scaled_area_over_length()
+        self.net.invalidate_assembly_plan()
 
     @property
     def diameter(self):
@@ -401,6 +546,7 @@ class base_edge(base_element):
         self.scaled_area = self.scale*self.area
 
         self._compute_scaled_area_over_length()
+        self.net.invalidate_assembly_plan()
 
     def _compute_scaled_area_over_length(self):
         if (not (self.length is None)) and (not (self.diameter is None)):
@@ -416,6 +562,7 @@ class base_edge(base_element):
 
         self._roughness = length_to_meter(roughness, roughness_unit)
         self._roughness_reset = True
+        self.net.invalidate_assembly_plan()
 
     @property
     def gasMix(self):
@@ -431,6 +578,7 @@ class base_edge(base_element):
     def gasMix(self, gasMix):
         self._gasMix = gasMix
         self._gasMix_reset = True
+        self.net.invalidate_assembly_plan()
 
     @property
     def fModel(self):
@@ -446,6 +594,7 @@ class base_edge(base_element):
     def fModel(self, fModel):
         self._fModel = fModel
         self._fModel_reset = True
+        self.net.invalidate_assembly_plan()
 
     def _recompute_kappa_and_lam_if_necessary(self):
         if (self._diameter_reset is None) or (self._gasMix_reset is None):
@@ -479,6 +628,7 @@ class base_edge(base_element):
     @zModel.setter
     def zModel(self, zModel_factory):
         self._zModel_factory = zModel_factory
+        self.net.invalidate_assembly_plan()
 
     @property
     def kappa(self):
@@ -0,0 +1,252 @@
+'''
+    topology aware preconditioner of the jacobians of a network_dae (for Krylov solvers)
+
+    each non-root node of a spanning forest of the network is paired with the edge towards its parent: the balance
+    equation of the node and the equations of the edge form one square block together with the pressure of the node
+    and the flows of the edge. Roots are pressure nodes (if available) and edges outside of the forest (chords) form
+    blocks of their own. All couplings besides those within blocks and between blocks of a parent and a child are
+    dropped, i.e. for tree shaped networks the preconditioner is exact. Ordered from the leaves towards the roots the
+    remaining matrix is factorized without fill-in across blocks (exact elimination along tree branches); chords are
+    attached to the blocks of their left nodes as leaves, i.e. block-Jacobi for pipes outside of the forest.
+
+    The dropped couplings occupy only a few columns per chord (i.e. per mesh of the network), hence they are
+    corrected by the Sherman-Morrison-Woodbury formula (one additional solve per column while building): the
+    preconditioner then inverts the matrix it was built from and Krylov iterations only account for changes of the
+    jacobian since then (e.g. Newton iterations and time steps). Densely meshed networks (more dropped columns than
+    max_correction_rank) are preconditioned by an incomplete LU decomposition of the whole matrix instead, since the
+    forest part alone is a poor approximation there.
+'''
+
+__author__ = ('Tom Streubel',) # alphabetical order of surnames
+__credits__ = tuple() # alphabetical order of surnames
+
+
+'''
+    imports
+    =======
+'''
+import numpy as np
+from scipy.sparse import csr_matrix, coo_matrix
+from scipy.sparse.linalg import splu, spilu
+
+from paso.solvers.nlin.sparse_nl_solver.newton_krylov.preconditioners import colored_jacobian_preconditioner
+
+from simulator.netgraph import network_dae, node, base_edge
+
+from typing import Callable, Optional, List, Dict, Tuple
+
+
+'''
+    body
+    ====
+'''
+class spanning_tree_preconditioner(object):
+
+    def __init__(self, net : network_dae, diag_pivot_thresh : float = 1.0, max_correction_rank : Optional[int] = 400):
+        '''
+            :param net: network whose jacobians (or scaled jacobians, i.e. same pattern) shall be preconditioned
+            :param diag_pivot_thresh: threshold for partial (row) pivoting, see scipy.sparse.linalg.splu
+            :param max_correction_rank: max number of columns of dropped couplings corrected by Sherman-Morrison-Woodbury,
+                                        spilu of the whole matrix beyond (0: forest part only, None: no limit)
+        '''
+        self.net : network_dae = net
+        self.diag_pivot_thresh : float = diag_pivot_thresh
+        self.max_correction_rank : Optional[int] = max_correction_rank
+
+        self._key = None
+        self.block_of : Optional[np.ndarray] = None     # block of each variable (== equation)
+        self.block_parent : Optional[np.ndarray] = None # parent block of each block, -1 for roots
+        self.perm : Optional[np.ndarray] = None         # variables ordered by blocks from the leaves to the roots
+        self.chords : List[base_edge] = []
+
+        self.num_of_factorizations : int = 0
+        self.num_of_fallbacks : int = 0 # singular forest part or too many dropped columns => spilu of the whole matrix
+        self.correction_rank : int = 0 # number of corrected columns of the latest build
+
+    @staticmethod
+    def _edge_weight(edge : base_edge) -> float:
+        if not ("pipe" in edge.type): return -np.inf # algebraic elements (valves, compressors, ...) first
+        return edge.length
+
+    def _setup(self):
+        net = self.net
+        nodes : List[node] = [c for c in net.components if isinstance(c, node)]
+        edges : List[base_edge] = [c for c in net.components if isinstance(c, base_edge)]
+        node_idx : Dict[int, int] = {id(n) : idx for idx, n in enumerate(nodes)}
+
+        ''' spanning forest (Kruskal): algebraic edges first, then pipes from short to long '''
+        union = list(range(len(nodes)))
+        def find(idx):
+            while union[idx] != idx:
+                union[idx] = union[union[idx]]
+                idx = union[idx]
+            return idx
+
+        adjacency : List[list] = [[] for _ in nodes]
+        self.chords = []
+        for edge in sorted(edges, key = self._edge_weight):
+            left, right = node_idx[id(edge.left)], node_idx[id(edge.right)]
+            root_left, root_right = find(left), find(right)
+            if root_left == root_right: self.chords.append(edge)
+            else:
+                union[root_left] = root_right
+                adjacency[left].append((right, edge))
+                adjacency[right].append((left, edge))
+
+        ''' orientation: breadth first from pressure nodes (or any node of components without) '''
+        candidates = sorted(range(len(nodes)), key = lambda idx: 0 if nodes[idx].behaviour == 0 else 1)
+        visited = np.zeros(shape = (len(nodes),), dtype = bool)
+        order, parent_edge, parent_node = [], {}, {}
+        for root in candidates:
+            if visited[root]: continue
+            visited[root] = True
+            queue = [root]
+            while len(queue) > 0:
+                current = queue.pop(0)
+                order.append(current)
+                for neighbour, edge in adjacency[current]:
+                    if visited[neighbour]: continue
+                    visited[neighbour] = True
+                    parent_edge[neighbour], parent_node[neighbour] = edge, current
+                    queue.append(neighbour)
+
+        ''' blocks: chords first, then (edge towards the parent, node) from the leaves to the roots '''
+        blocks : List[List[int]] = [list(edge.var_ids) for edge in self.chords]
+        block_of_node : Dict[int, int] = {}
+        for idx in reversed(order):
+            block_of_node[idx] = len(blocks)
+            var_ids = list(nodes[idx].var_ids)
+            if idx in parent_edge: var_ids = list(parent_edge[idx].var_ids) + var_ids
+            blocks.append(var_ids)
+
+        block_parent = -np.ones(shape = (len(blocks),), dtype = np.intp)
+        for idx, parent in parent_node.items(): block_parent[block_of_node[idx]] = block_of_node[parent]
+        for block, edge in enumerate(self.chords): block_parent[block] = block_of_node[node_idx[id(edge.left)]]
+
+        block_of = -np.ones(shape = (net.dim,), dtype = np.intp)
+        for block, var_ids in enumerate(blocks): block_of[var_ids] = block
+        leftovers = np.flatnonzero(block_of < 0) # not expected: variables of neither nodes nor edges
+        block_of[leftovers] = len(blocks) + np.arange(len(leftovers))
+        block_parent = np.concatenate([block_parent, -np.ones(shape = (len(leftovers),), dtype = np.intp)])
+
+        self.block_of, self.block_parent = block_of, block_parent
+        self.perm = np.argsort(block_of, kind = 'stable')
+        self._key = net.assembly_key
+
+    def forest_part(self, A : csr_matrix) -> csr_matrix:
+        '''
+            :param A: jacobian (or a scaled jacobian) of the network
+            :return: A without the couplings across blocks other than those between parents and children
+        '''
+        if self._key != self.net.assembly_key: self._setup() # topology or behaviours of nodes changed
+
+        A = coo_matrix(A)
+        block_row, block_col = self.block_of[A.row], self.block_of[A.col]
+        keep = (block_row == block_col) | (self.block_parent[block_row] == block_col) | \
+               (self.block_parent[block_col] == block_row)
+
+        return csr_matrix((A.data[keep], (A.row[keep], A.col[keep])), shape = A.shape)
+
+    def __call__(self, A : csr_matrix) -> Callable[[np.ndarray], np.ndarray]:
+        '''
+            :param A: jacobian (or a scaled jacobian) of the network
+            :return: function applying the inverse of the preconditioner to a vector
+        '''
+        A = csr_matrix(A)
+        T = self.forest_part(A)
+        perm = self.perm
+        self.num_of_factorizations += 1
+        try: lu = splu(T[perm][:, perm].tocsc(), permc_spec = 'NATURAL', diag_pivot_thresh = self.diag_pivot_thresh)
+        except RuntimeError: # e.g. singular blocks of active elements in the current mode
+            self.num_of_fallbacks += 1
+            self.correction_rank = 0
+            return spilu(A.tocsc()).solve
+
+        def solve_forest(b : np.ndarray) -> np.ndarray:
+            x = np.empty(shape = b.shape, dtype = np.result_type(b, lu.U.dtype))
+            x[perm] = lu.solve(b[perm])
+            return x
+
+        ''' Sherman-Morrison-Woodbury: A == T + D[:, cols]*I[cols, :] '''
+        D = (A - T).tocsc()
+        D.eliminate_zeros()
+        cols = np.flatnonzero(np.diff(D.indptr) > 0)
+        if (len(cols) == 0) or (self.max_correction_rank == 0):
+            self.correction_rank = 0
+            return solve_forest
+        if (not (self.max_correction_rank is None)) and (len(cols) > self.max_correction_rank):
+            self.num_of_fallbacks += 1
+            self.correction_rank = 0
+            return spilu(A.tocsc()).solve
+
+        Z = solve_forest(D[:, cols].toarray()) # T^-1*D[:, cols]
+        capacitance = np.eye(len(cols)) + Z[cols, :]
+        try: capacitance_inv = np.linalg.inv(capacitance)
+        except np.linalg.LinAlgError:
+            self.correction_rank = 0
+            return solve_forest
+        self.correction_rank = len(cols)
+
+        def solve(b : np.ndarray) -> np.ndarray:
+            y = solve_forest(b)
+            return y - Z @ (capacitance_inv @ y[cols])
+
+        return solve
+
+
+
+def structural_pattern(net : network_dae) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+        equations of nodes depend on the variables of the node and its edges, equations of edges on the variables of
+        the edge and its end nodes (node and edge variable ids double as equation ids)
+
+        :return: (indices, indptr) of the structural sparsity pattern of the jacobian of the network in CSR format
+    '''
+    rows : List[set] = [set() for _ in range(net.dim)]
+    for edge in [c for c in net.components if isinstance(c, base_edge)]:
+        coupled = set(edge.var_ids) | set(edge.left.var_ids) | set(edge.right.var_ids)
+        for var_id in edge.var_ids: rows[var_id].update(coupled)
+        for var_id in list(edge.left.var_ids) + list(edge.right.var_ids): rows[var_id].update(edge.var_ids)
+    for nodeInstance in [c for c in net.components if isinstance(c, node)]:
+        for var_id in nodeInstance.var_ids: rows[var_id].update(nodeInstance.var_ids)
+
+    indices = np.array([j for row in rows for j in sorted(row)], dtype = np.intp)
+    indptr = np.concatenate([[0], np.cumsum([len(row) for row in rows])]).astype(np.intp)
+    return indices, indptr
+
+
+class jacobian_free_tree_preconditioner(object):
+
+    def __init__(self, net : network_dae, **kwargs):
+        '''
+            spanning_tree_preconditioner for Jacobian-free Newton-Krylov: the jacobian is recovered from products J*v
+            on the structural pattern of the network (one product per color of its columns, e.g. about a dozen for
+            pipelines) whenever the preconditioner is (re-)built instead of being assembled by the network.
+
+            :param net: network whose jacobians (i.e. products J*v) shall be preconditioned
+            :param kwargs: options of spanning_tree_preconditioner
+        '''
+        self.net : network_dae = net
+        self.tree : spanning_tree_preconditioner = spanning_tree_preconditioner(net, **kwargs)
+
+        self._key = None
+        self.colored : Optional[colored_jacobian_preconditioner] = None
+
+    def _setup(self):
+        indices, indptr = structural_pattern(self.net)
+        self.colored = colored_jacobian_preconditioner(indices, indptr, shape = (self.net.dim, self.net.dim),
+                                                       factorize = self.tree)
+        self._key = self.net.assembly_key
+
+    @property
+    def num_of_products(self) -> int:
+        if self._key != self.net.assembly_key: self._setup()
+        return self.colored.num_of_products
+
+    def __call__(self, J_v : Callable[[np.ndarray], np.ndarray]) -> Callable[[np.ndarray], np.ndarray]:
+        '''
+            :param J_v: v -> J*v of the (current) jacobian of the network
+            :return: function applying the inverse of the preconditioner to a vector
+        '''
+        if self._key != self.net.assembly_key: self._setup() # topology changed
+        return self.colored(J_v)
@@ -42,6 +42,12 @@ class configuration(object):
         self.path_out_results_boundary_flows_csv  = self.file_path_out + self.name_of_instance + '.boundary_flows_only.result.csv'
         self.write_boundary_flows = write_additional_csvs.get('boundary_flows_only', False)
 
+        self.path_out_results_states_npy = self.file_path_out + self.name_of_instance + '.result.states.npy'
+        self.path_out_results_times_npy = self.file_path_out + self.name_of_instance + '.result.times.npy'
+        self.path_out_results_boundary_flows_npy = self.file_path_out + self.name_of_instance + '.result.boundary_flows.npy'
+        self.path_out_results_index_yaml = self.file_path_out + self.name_of_instance + '.result.index.yaml'
+        self.write_npy = bool(self.raw.get('write_results_npy', False)) # optional: columnar binary store next to the csv
+
         if self.raw.get('generate_results_meta', True):
             self.path_out_results_meta_yaml = self.file_path_out + self.name_of_instance + '.result.meta.yaml'
         else:
@@ -56,6 +62,14 @@ class configuration(object):
             self.file_path_dump = None
 
         self.write_left_right_flows = (not self.raw.get('write_mid_flows_for_pipes', False))
+        self.stream_results = bool(self.raw.get('stream_results', False)) # optional: write results while integrating
+        self.write_results_in_background = bool(self.raw.get('write_results_in_background', False)) # optional: ... on a worker thread (implies stream_results)
+
+        self.step_size_control = self.raw.get('step_size_control', None) # optional: {'atol' : ..., 'rtol' : ...}
+        self.integrator = self.raw.get('integrator', 'ImpEuler') # optional: 'ImpEuler', 'BDF' or 'Rosenbrock'
+        self.linear_solver = self.raw.get('linear_solver', 'splu') # optional: 'splu', 'splu_condensed', 'gmres_ilu', 'gmres_tree' or 'jacobian_free'
+        self.globalization = self.raw.get('globalization', 'damping') # optional: 'damping', 'armijo' or 'trust_region'
+        self.broyden = bool(self.raw.get('broyden', False)) # optional: quasi-Newton updates between jacobian refreshes
 
     @property
     def name_net_yaml(self):
@@ -0,0 +1,87 @@
+'''
+    reader for results of the columnar binary store (see write_results_npy); states and boundary flows are memory
+    mapped, i.e. time series and snapshots are views without copying or parsing
+'''
+
+__author__ = ('Tom Streubel',)  # alphabetical order of surnames
+__credits__ = tuple()  # alphabetical order of surnames
+
+'''
+    imports
+    =======
+'''
+import os
+import numpy as np
+import yaml
+
+from typing import Dict, Optional
+
+
+class result_store(object):
+
+    def __init__(self, path_index_yaml : str):
+        '''
+            :param path_index_yaml: path of the *.result.index.yaml (the *.npy files are expected next to it)
+        '''
+        with open(path_index_yaml, mode = 'r') as index_yaml:
+            self.index = yaml.load(index_yaml, Loader = yaml.SafeLoader)
+
+        directory = os.path.dirname(path_index_yaml)
+        self.states : np.ndarray = np.load(os.path.join(directory, self.index['states']), mmap_mode = 'r') # (time x state)
+        self.times : np.ndarray = np.load(os.path.join(directory, self.index['times']), mmap_mode = 'r')
+        self.boundary_flows : Optional[np.ndarray] = None # (time x node), None for stores written without them
+        if 'boundary_flows' in self.index:
+            self.boundary_flows = np.load(os.path.join(directory, self.index['boundary_flows']), mmap_mode = 'r')
+
+        self.columns : Dict[str, Dict[str, int]] = self.index['columns']
+        self.boundary_flow_columns : Dict[str, int] = self.index.get('boundary_flow_columns', {})
+        self.units : Dict[str, str] = self.index['unit']
+
+    def __len__(self):
+        return len(self.times)
+
+    def column(self, element : str, parameter : Optional[str] = None) -> int:
+        '''
+            :param element: name of the element
+            :param parameter: (optional) P, ML, MR or M; may be omitted for elements with a single state
+            :return: column of the states
+        '''
+        try: columns = self.columns[element]
+        except KeyError: raise KeyError("{} isn't an element of the results!".format(element))
+
+        if parameter is None:
+            if len(columns) != 1:
+                raise KeyError("{} has the parameters {}; choose one!".format(element, list(columns)))
+            return next(iter(columns.values()))
+
+        try: return columns[parameter]
+        except KeyError: raise KeyError("{} has no parameter {} (but {})!".format(element, parameter, list(columns)))
+
+    def time_series(self, element : str, parameter : Optional[str] = None) -> np.ndarray:
+        '''
+            :param element: name of the element
+            :param parameter: (optional) P, ML, MR, M or Q (boundary flows of nodes); may be omitted for elements with a
+                              single state
+            :return: values at all time points (a strided view of the memory mapped states or boundary flows)
+        '''
+        if parameter == 'Q':
+            if self.boundary_flows is None: raise KeyError("the results hold no boundary flows!")
+            try: return self.boundary_flows[:, self.boundary_flow_columns[element]]
+            except KeyError: raise KeyError("{} has no boundary flow!".format(element))
+        return self.states[:, self.column(element, parameter)]
+
+    def time_index(self, t : float) -> int:
+        '''
+            :param t: time point
+            :return: index of the latest time point <= t
+        '''
+        idx = int(np.searchsorted(self.times, t, side = 'right')) - 1
+        if idx < 0: raise ValueError("t = {} lies before the first time point {}!".format(t, self.times[0]))
+        return idx
+
+    def snapshot(self, t : float) -> np.ndarray:
+        '''
+            :param t: time point
+            :return: states at the latest time point <= t (a view of the memory mapped states)
+        '''
+        return self.states[self.time_index(t)]
@@ -14,115 +14,199 @@ from simulator.readerWriter.read_config_yaml import configuration
 from simulator.resources.units import validate_unit
 
 import csv
+import queue
+import threading
 import numpy as np
-from typing import Union, Tuple, List, Optional
+from typing import Union, Tuple, List, Optional, Callable
 
 
 vector_t = Union[float, List[float], Tuple[float, ...], np.ndarray]
 data_array_t = Union[List[vector_t], Tuple[vector_t, ...], np.ndarray]
 
 
-def _generate_csv(csv_path : str, net : network_dae, timeTable : data_array_t, solution : data_array_t,
-                  write_pressures : bool = True,
-                  write_inner_flows : bool = True, write_boundary_flows : bool = True,
-                  write_left_right_flows_for_pipes : bool = True):
-    with open(csv_path, 'w', newline = '') as result_csv:
-        fieldnames = ['Time', 'Alias', 'Object', 'Parameter', 'Value', 'Unit']
-
-        writer = csv.DictWriter(result_csv, fieldnames = fieldnames, delimiter = ';')
-
-        writer.writeheader()
-
-        for ti, solRow in zip(timeTable, solution):
-            for element in net.components:
-                if 'hidden' in element.type:
-                    continue
-
-                if 'node' in element.type:
-                    csvRow = {'Time' : ti,
-                              'Alias' : element.name,
-                              'Object' : element.name,
-                              'Parameter' : 'P',
-                              'Value' : solRow[element.p_press_id],
-                              'Unit' : validate_unit('bar', 'pressure')}
-
-                    if write_pressures: writer.writerow(csvRow)
-
-                    Q = element.qBoundFunc(ti)
-
-                    csvRow = {'Time' : ti,
-                              'Alias' : element.name,
-                              'Object' : element.name,
-                              'Parameter' : 'Q',
-                              'Value' : Q,
-                              'Unit' : validate_unit('kg_per_s', 'flow')}
-
-                    if write_boundary_flows: writer.writerow(csvRow)
-
-                elif 'pipe' in element.type:
-                    if write_left_right_flows_for_pipes:
-                        csvRow = {'Time' : ti,
-                                  'Alias' : element.name,
-                                  'Object' : element.name,
-                                  'Parameter' : 'ML',
-                                  'Value' : solRow[element.qL_leftFlow_id],
-                                  'Unit' : validate_unit('kg_per_s', 'flow')}
-
-                        if write_inner_flows: writer.writerow(csvRow)
-
-                        csvRow = {'Time' : ti,
-                                  'Alias' : element.name,
-                                  'Object' : element.name,
-                                  'Parameter' : 'MR',
-                                  'Value' : solRow[element.qR_rightFlow_id],
-                                  'Unit' : validate_unit('kg_per_s', 'flow')}
-
-                        if write_inner_flows: writer.writerow(csvRow)
-                    else:
-                        csvRow = {'Time' : ti,
-                                  'Alias' : element.name,
-                                  'Object' : element.name,
-                                  'Parameter' : 'M',
-                                  'Value' : 0.5*(solRow[element.qL_leftFlow_id] + solRow[element.qR_rightFlow_id]),
-                                  'Unit' : validate_unit('kg_per_s', 'flow')}
-
-                        if write_inner_flows: writer.writerow(csvRow)
-                else:
-                    csvRow = {'Time' : ti,
-                              'Alias' : element.name,
-                              'Object' : element.name,
-                              'Parameter' : 'M',
-                              'Value' : solRow[element.q_flowThrough_id],
-                              'Unit' : validate_unit('kg_per_s', 'flow')}
-
-                    if write_inner_flows: writer.writerow(csvRow)
+_state, _mean_of_states, _profile = 0, 1, 2 # kinds of values of rows
+
+
+def _row_plan(net : network_dae,
+              write_pressures : bool = True,
+              write_inner_flows : bool = True, write_boundary_flows : bool = True,
+              write_left_right_flows_for_pipes : bool = True) -> List[tuple]:
+    '''
+        rows written per time point, compiled once per net and csv
+
+        :return: list of (name, parameter, kind, reference, unit) where reference is a state index (kind _state), a pair
+                 of state indices (kind _mean_of_states) or a profile (kind _profile)
+    '''
+    pressure_unit, flow_unit = validate_unit('bar', 'pressure'), validate_unit('kg_per_s', 'flow')
+
+    plan = []
+    for element in net.components:
+        if 'hidden' in element.type:
+            continue
+
+        if 'node' in element.type:
+            if write_pressures: plan.append((element.name, 'P', _state, element.p_press_id, pressure_unit))
+            if write_boundary_flows: plan.append((element.name, 'Q', _profile, element.qBoundFunc, flow_unit))
+
+        elif 'pipe' in element.type:
+            if not write_inner_flows: continue
+            if write_left_right_flows_for_pipes:
+                plan.append((element.name, 'ML', _state, element.qL_leftFlow_id, flow_unit))
+                plan.append((element.name, 'MR', _state, element.qR_rightFlow_id, flow_unit))
+            else:
+                plan.append((element.name, 'M', _mean_of_states, (element.qL_leftFlow_id, element.qR_rightFlow_id),
+                             flow_unit))
+        else:
+            if write_inner_flows: plan.append((element.name, 'M', _state, element.q_flowThrough_id, flow_unit))
+    return plan
+
+
+def _rows(plan : List[tuple], ti : float, solRow : vector_t):
+    for name, parameter, kind, reference, unit in plan:
+        if kind == _state: value = solRow[reference]
+        elif kind == _profile: value = reference(ti)
+        else: value = 0.5*(solRow[reference[0]] + solRow[reference[1]])
+        yield ti, name, name, parameter, value, unit
+
+
+def _csv_targets(config : configuration) -> List[Tuple[str, dict]]:
+    targets = [(config.path_out_results_csv, {'write_left_right_flows_for_pipes' : config.write_left_right_flows})]
+    for write, csv_path, flags in [(config.write_pressures, config.path_out_results_pressures_csv,
+                                    {'write_pressures' : True, 'write_inner_flows' : False, 'write_boundary_flows' : False}),
+                                   (config.write_inner_flows, config.path_out_results_inner_flows_csv,
+                                    {'write_pressures' : False, 'write_inner_flows' : True, 'write_boundary_flows' : False}),
+                                   (config.write_boundary_flows, config.path_out_results_boundary_flows_csv,
+                                    {'write_pressures' : False, 'write_inner_flows' : False, 'write_boundary_flows' : True})]:
+        if write: targets.append((csv_path, dict(flags, write_left_right_flows_for_pipes = config.write_left_right_flows)))
+    return targets
+
+
+class result_csv_sink(object):
+
+    def __init__(self, config : configuration, net : network_dae):
+        '''
+            writes the result csv(s) incrementally, one time point per call (e.g. as result_sink of an integrator), such
+            that the trajectory doesn't have to be kept in memory. Only the time points are recorded (see timeTable).
+
+            :param config: configuration holding the paths of the csv(s)
+            :param net: network the states belong to
+        '''
+        self.net = net
+        self.timeTable : List[float] = []
+
+        self._targets = []
+        for csv_path, flags in _csv_targets(config):
+            result_csv = open(csv_path, 'w', newline = '')
+            writer = csv.writer(result_csv, delimiter = ';')
+            writer.writerow(['Time', 'Alias', 'Object', 'Parameter', 'Value', 'Unit'])
+            self._targets.append((result_csv, writer, _row_plan(net, **flags)))
+
+    def __call__(self, ti : float, solRow : vector_t):
+        self.timeTable.append(ti)
+        for _, writer, plan in self._targets:
+            writer.writerows(_rows(plan, ti, solRow))
+
+    def close(self):
+        for result_csv, _, _ in self._targets: result_csv.close()
+        self._targets = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class multi_result_sink(object):
+
+    def __init__(self, *sinks : Callable[[float, vector_t], None]):
+        '''
+            passes each time point on to all sinks (e.g. result_csv_sink and result_npy_sink)
+
+            :param sinks: sinks; the time points are taken from the first one
+        '''
+        self.sinks = sinks
+
+    @property
+    def timeTable(self) -> List[float]:
+        return self.sinks[0].timeTable
+
+    def __call__(self, ti : float, solRow : vector_t):
+        for sink in self.sinks: sink(ti, solRow)
+
+    def close(self):
+        for sink in self.sinks:
+            close_sink = getattr(sink, 'close', None)
+            if not (close_sink is None): close_sink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class threaded_result_sink(object):
+
+    def __init__(self, sink : Callable[[float, vector_t], None], max_queue_size : int = 64):
+        '''
+            hands time points and states over to a worker thread calling sink (e.g. result_csv_sink), such that
+            formatting and writing overlap with the integration. The bounded queue blocks the caller while the worker
+            falls behind (backpressure). Errors of the worker are raised by the next call, flush or close.
+
+            :param sink: wrapped sink; its close is called by close (if existing)
+            :param max_queue_size: maximal number of pending time points
+        '''
+        self.sink = sink
+        self._queue = queue.Queue(maxsize = max_queue_size)
+        self._error : Optional[BaseException] = None
+
+        self._worker = threading.Thread(target = self._work, name = 'result writer', daemon = True)
+        self._worker.start()
+
+    @property
+    def timeTable(self) -> List[float]: # complete after flush or close
+        return self.sink.timeTable
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None: return
+                if self._error is None: self.sink(*item) # after an error pending items are dropped only
+            except BaseException as error:
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if not (self._error is None):
+            raise RuntimeError("writing results failed on the worker thread!") from self._error
+
+    def __call__(self, ti : float, solRow : vector_t):
+        self._raise_error()
+        self._queue.put((ti, np.array(solRow, copy = True))) # blocks while the queue is full
+
+    def flush(self):
+        ''' waits until all pending time points are written '''
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        if self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        close_sink = getattr(self.sink, 'close', None)
+        if not (close_sink is None): close_sink()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
 
 def generate_csv(config : configuration, net : network_dae, timeTable : data_array_t, solution : data_array_t):
-    _generate_csv(csv_path = config.path_out_results_csv,
-                  net = net, timeTable = timeTable, solution = solution,
-                  write_left_right_flows_for_pipes = config.write_left_right_flows)
-
-    if config.write_pressures:
-        _generate_csv(csv_path = config.path_out_results_pressures_csv,
-                      net = net, timeTable = timeTable, solution = solution,
-                      write_pressures = True,
-                      write_inner_flows = False,
-                      write_boundary_flows = False,
-                      write_left_right_flows_for_pipes = config.write_left_right_flows)
-
-    if config.write_inner_flows:
-        _generate_csv(csv_path = config.path_out_results_inner_flows_csv,
-                      net = net, timeTable = timeTable, solution = solution,
-                      write_pressures = False,
-                      write_inner_flows = True,
-                      write_boundary_flows = False,
-                      write_left_right_flows_for_pipes = config.write_left_right_flows)
-
-    if config.write_boundary_flows:
-        _generate_csv(csv_path = config.path_out_results_boundary_flows_csv,
-                      net = net, timeTable = timeTable, solution = solution,
-                      write_pressures = False,
-                      write_inner_flows = False,
-                      write_boundary_flows = True,
-                      write_left_right_flows_for_pipes = config.write_left_right_flows)
+    with result_csv_sink(config = config, net = net) as sink:
+        for ti, solRow in zip(timeTable, solution): sink(ti, solRow)
@@ -16,6 +16,7 @@ from simulator.readerWriter.read_config_yaml import configuration
 from simulator.resources.units import validate_unit, density_to_kilogramm_per_m_cube
 from simulator.readerWriter.write_results_csv import data_array_t
 
+import numpy as np
 import yaml
 
 from typing import Union
@@ -33,10 +34,12 @@ def generate_meta_yaml(config : configuration, net : network_dae, timeTable : da
                           'flow' : validate_unit('kg/s', 'flow'),
                           'norm density' : validate_unit('kg/m^3', 'density')}}
 
+    ts = np.asarray(timeTable, dtype = np.float64) # profiles are evaluated on the whole time table at once
+
     for element in net.components:
         if 'common-valve' in element.type: #for vlvInstance in netInstance.topoCookieArcs['vlvs']:
             element : valve = element
-            yamlDict["valve"][element.name] = {'opening-states' : [float(element.io_func(ti)) for ti in timeTable]}
+            yamlDict["valve"][element.name] = {'opening-states' : np.asarray(element.io_func(ts), dtype = np.float64).tolist()}
 
         if ('control-valve' in element.type) or ('compressor' in element.type):
             if 'control-valve' in element.type: yaml_type = 'controlValve'
@@ -44,16 +47,16 @@ def generate_meta_yaml(config : configuration, net : network_dae, timeTable : da
 
             element : Union[idealCompressor, idealControlValve] = element
 
-            yamlDict[yaml_type][element.name] = {'opening-states' : [float(element.io_func(ti)) for ti in timeTable],
-                                                 'bypass-states' : [min(float(element.io_func(ti)),
-                                                                        float(element.by_io_func(ti))) for ti in timeTable]}
+            io = np.asarray(element.io_func(ts), dtype = np.float64)
+            yamlDict[yaml_type][element.name] = {'opening-states' : io.tolist(),
+                                                 'bypass-states' : np.minimum(io, element.by_io_func(ts)).tolist()}
 
             for func, funcName in [(element.target_lower_pL, 'p_target_lower_pL'),
                                    (element.target_upper_pL, 'p_target_upper_pL'),
                                    (element.target_lower_pR, 'p_target_lower_pR'),
                                    (element.target_upper_pR, 'p_target_upper_pR'),
                                    (element.target_q, 'q_target_q')]:
-                yamlDict[yaml_type][element.name][funcName] = [float(func(ti)) for ti in timeTable]
+                yamlDict[yaml_type][element.name][funcName] = np.asarray(func(ts), dtype = np.float64).tolist()
 
     with open(config.path_out_results_meta_yaml, 'w') as out_yaml:
         yaml.dump(yamlDict, out_yaml, indent = 4, default_flow_style = None)
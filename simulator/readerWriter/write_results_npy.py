@@ -0,0 +1,143 @@
+'''
+    writer for results as columnar binary store: the states as (time x state) float64 *.npy (memory mappable), the time
+    points as *.npy, the boundary flows of the nodes (profiles, i.e. no states) as (time x node) *.npy and an index yaml
+    naming the column of each element and parameter (see read_results_npy)
+'''
+
+__author__ = ('Tom Streubel',)  # alphabetical order of surnames
+__credits__ = tuple()  # alphabetical order of surnames
+
+'''
+    imports
+    =======
+'''
+from simulator.netgraph import network_dae
+from simulator.readerWriter.read_config_yaml import configuration
+from simulator.readerWriter.write_results_csv import vector_t, data_array_t
+from simulator.resources.units import validate_unit
+
+import os
+import struct
+import numpy as np
+import yaml
+
+from typing import Dict, List, Optional, BinaryIO
+
+
+_npy_header_size = 128 # multiple of 64, i.e. rows of memory mapped states stay aligned
+
+
+def _npy_header(num_of_rows : int, dim : int) -> bytes:
+    '''
+        header of a C ordered float64 *.npy (format version 1.0) of shape (num_of_rows, dim) padded to a fixed size, such
+        that it can be rewritten in place once the number of rows is known
+
+        :param num_of_rows: number of time points
+        :param dim: dimension of the states
+        :return: header of _npy_header_size bytes
+    '''
+    magic = np.lib.format.magic(1, 0)
+    header_len = _npy_header_size - len(magic) - 2 # 2 bytes: little endian unsigned short holding header_len
+    header = "{{'descr': '<f8', 'fortran_order': False, 'shape': ({}, {}), }}".format(num_of_rows, dim)
+    if len(header) + 1 > header_len: raise ValueError("shape ({}, {}) exceeds the npy header!".format(num_of_rows, dim))
+    return magic + struct.pack('<H', header_len) + (header.ljust(header_len - 1) + '\n').encode('latin1')
+
+
+def state_columns(net : network_dae) -> Dict[str, Dict[str, int]]:
+    '''
+        :param net: network the states belong to
+        :return: column of the states per element name and parameter (as in the result csv: P, ML, MR or M)
+    '''
+    columns = {}
+    for element in net.components:
+        if 'node' in element.type: columns[element.name] = {'P' : element.p_press_id}
+        elif element.single_flow: columns[element.name] = {'M' : element.q_flowThrough_id}
+        else: columns[element.name] = {'ML' : element.qL_leftFlow_id, 'MR' : element.qR_rightFlow_id}
+    return columns
+
+
+def boundary_flow_columns(net : network_dae) -> Dict[str, int]:
+    '''
+        :param net: network
+        :return: column of the boundary flows per node name (the nodes of the result csv, i.e. not hidden ones)
+    '''
+    nodes = [element.name for element in net.components if ('node' in element.type) and not ('hidden' in element.type)]
+    return {name : column for column, name in enumerate(nodes)}
+
+
+def boundary_flows(net : network_dae, timeTable : data_array_t) -> np.ndarray:
+    '''
+        :param net: network
+        :param timeTable: time points
+        :return: (time x node) boundary flows Q (columns see boundary_flow_columns), each profile evaluated on the whole
+                 time table at once
+    '''
+    ts = np.asarray(timeTable, dtype = np.float64)
+    columns = boundary_flow_columns(net)
+    flows = np.empty(shape = (len(ts), len(columns)), dtype = np.float64)
+    for element in net.components:
+        if element.name in columns: # constant profiles may return scalars
+            flows[:, columns[element.name]] = np.broadcast_to(np.asarray(element.qBoundFunc(ts), dtype = np.float64),
+                                                              ts.shape)
+    return flows
+
+
+class result_npy_sink(object):
+
+    def __init__(self, config : configuration, net : network_dae):
+        '''
+            writes the states one time point per call (e.g. as result_sink of an integrator) as rows of the states
+            *.npy. The time points, the boundary flows and the index yaml are written by close.
+
+            :param config: configuration holding the paths of the store
+            :param net: network the states belong to
+        '''
+        self.config = config
+        self.net = net
+        self.dim = net.dim
+        self.timeTable : List[float] = []
+
+        self._states : Optional[BinaryIO] = open(config.path_out_results_states_npy, 'wb')
+        self._states.write(_npy_header(0, self.dim)) # rewritten by close
+
+    def __call__(self, ti : float, solRow : vector_t):
+        self.timeTable.append(ti)
+        self._states.write(np.ascontiguousarray(solRow, dtype = '<f8').tobytes())
+
+    def close(self):
+        if self._states is None: return
+
+        self._states.seek(0)
+        self._states.write(_npy_header(len(self.timeTable), self.dim))
+        self._states.close()
+        self._states = None
+
+        np.save(self.config.path_out_results_times_npy, np.array(self.timeTable, dtype = np.float64))
+        np.save(self.config.path_out_results_boundary_flows_npy, boundary_flows(self.net, self.timeTable))
+
+        index = {'name' : self.net.name,
+                 'states' : os.path.basename(self.config.path_out_results_states_npy),
+                 'times' : os.path.basename(self.config.path_out_results_times_npy),
+                 'boundary_flows' : os.path.basename(self.config.path_out_results_boundary_flows_npy),
+                 'num_of_time_points' : len(self.timeTable),
+                 'dim' : self.dim,
+                 'unit' : {'P' : validate_unit('bar', 'pressure'),
+                           'ML' : validate_unit('kg_per_s', 'flow'),
+                           'MR' : validate_unit('kg_per_s', 'flow'),
+                           'M' : validate_unit('kg_per_s', 'flow'),
+                           'Q' : validate_unit('kg_per_s', 'flow')},
+                 'columns' : state_columns(self.net),
+                 'boundary_flow_columns' : boundary_flow_columns(self.net)}
+        with open(self.config.path_out_results_index_yaml, 'w') as out_yaml:
+            yaml.dump(index, out_yaml, indent = 4, default_flow_style = None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def generate_npy(config : configuration, net : network_dae, timeTable : data_array_t, solution : data_array_t):
+    with result_npy_sink(config = config, net = net) as sink:
+        for ti, solRow in zip(timeTable, solution): sink(ti, solRow)
@@ -10,6 +10,8 @@ __credits__ = tuple()  # alphabetical order of surnames
     =======
 '''
 import sys, os
+import numpy as np
+from functools import reduce
 
 
 '''
@@ -30,6 +32,8 @@ class SceneDescriptionError(Exception): pass
 
 class DimensionError(Exception): pass
 
+class VectorizationError(Exception): pass
+
 
 ''' error caused by missing objects '''
 def obligatory_function(name : str, meta : str = None):
@@ -39,6 +43,27 @@ def obligatory_function(name : str, meta : str = None):
     return missing_function
 
 
+'''
+    operations overloaded by cycADa
+    ===============================
+'''
+
+''' pure numpy fallbacks if cycADa isn't available (e.g. when using the closed form jacobian of network_dae) '''
+try:
+    from ad.cycADa import signSquare, cond_assign, minimum, maximum, logical_and, logical_or
+except (ModuleNotFoundError, ImportError):
+    def signSquare(u): return abs(u)*u
+
+    def cond_assign(b, u, w): return np.where(b, u, w)
+
+    def minimum(*args): return reduce(np.minimum, args)
+
+    def maximum(*args): return reduce(np.maximum, args)
+
+    logical_and = np.logical_and
+    logical_or = np.logical_or
+
+
 ''' empty logger -or- no logger as fallback if the user does not provide a proper one! '''
 class no_logger(object):
 
@@ -13,9 +13,10 @@ __credits__ = tuple()  # alphabetical order of surnames
     =======
 '''
 import numpy as np
+from bisect import bisect_right
 from simulator.resources.units import second, minute
 from simulator.resources.auxiliary import ModellingError
-from typing import Union, List, Tuple, Optional
+from typing import Union, List, Tuple, Optional, Dict, Hashable, Callable
 
 
 class table_lookup(object):
@@ -86,109 +87,150 @@ class table_lookup(object):
             self.horizon = horizon
             self.horizon_diameter = horizon[1] - horizon[0]
 
-            ''' compute slopes in case of non-zero horizon '''
+            ''' compute slopes and (for the closed form with horizon) prefix sums of slope changes '''
             self.slopes = np.zeros(shape = (len(self.Ts) + 1,))
-            for i in range(1, len(self.Ts)):
-                self.slopes[i] = (self.FTs[i] - self.FTs[i - 1])/(self.Ts[i] - self.Ts[i-1])
+            self.slopes[1:-1] = np.diff(self.FTs)/np.diff(self.Ts)
+            slope_changes = np.diff(self.slopes) # i.e. slopes[i + 1] - slopes[i] at Ts[i]
+            self._cum_slope_changes = np.concatenate(([0.0], np.cumsum(slope_changes)))
+            self._cum_slope_changes_Ts = np.concatenate(([0.0], np.cumsum(slope_changes*self.Ts)))
         else:
             self.horizon_diameter = 0.0
 
-        if self.horizon_diameter == 0.0:
-            self.last_t_id = 0
+        self.debug_t = None if self.horizon_diameter == 0.0 else t_horizon_debug
+        self._Ts_list : List[float] = self.Ts.tolist() # binary search of single time points without numpy overhead
 
-            self.debug_t = None
-        else:
-            self.last_t_horizon_back_id = 0
-            self.last_t_horizon_front_id = 0
-
-            self.debug_t = t_horizon_debug
-
-    def _search_t_and_id(self, id_start, t):
-        j, i = id_start, None
-        tj, ti = self.Ts[id_start], None
-        for i, ti in enumerate(self.Ts[id_start + 1:], id_start + 1):
-            if t < ti:
-                break
-            j = i
-            tj = ti
-
-        return j, tj, i, ti
-
-    def _closed_form_table_look_up_algorithm(self, t, timepoints, slopes, F_left, F_right):
-        sim1, si = slopes[0], None
-        t_delta = t - timepoints[0]
-        result = (F_left + F_right) + sim1*t_delta
-        for i, (si, tim1) in enumerate(zip(slopes[1:], timepoints)):
-            t_delta = t - tim1
-            result = result + (si - sim1)*abs(t_delta)
-            sim1 = si
-        return (result + si*t_delta)/2.0
-
-    def __call__(self, t):
-        if len(self.Ts) == 1:
-            return self.FTs[0]
-
-        if self.horizon_diameter == 0.0:
-            if t < self.Ts[self.last_t_id]:
-                if t < self.Ts[0]:
-                    return self.FTs[0]
-
-                j, tj, i, ti = self._search_t_and_id(0, t)
-                self.last_t_id = i
-            elif t == self.Ts[self.last_t_id]:
-                return self.FTs[self.last_t_id]
-            else:
-                if t > self.Ts[-1]:
-                    return self.FTs[-1]
+    @property
+    def breakpoints(self) -> np.ndarray:
+        '''
+            :return: time points where the profile jumps (mode pc without smoothing) or has kinks (otherwise), i.e.
+                     all (smoothing) time points of the table unless it is constant
+        '''
+        if len(self.Ts) == 1: return np.array([], dtype = np.float64)
+        return self.Ts
+
+    def _closed_form_table_look_up_algorithm(self, t : np.ndarray, id_back : np.ndarray, id_front : np.ndarray):
+        '''
+            evaluates the piecewise linear function with the kinks Ts[id_back : id_front + 1] only, i.e.
+
+                (F_back + F_front + s_back*(t - T_back) + s_front*(t - T_front) + sum_k (s_k+1 - s_k)*|t - T_k|)/2
 
-                j, tj, i, ti = self._search_t_and_id(self.last_t_id, t)
-                self.last_t_id = j
+            where the sum is split at t and taken from prefix sums (element wise for arrays of t and ids)
+        '''
+        A, B = self._cum_slope_changes, self._cum_slope_changes_Ts
+        id_end = id_front + 1
+        id_t = np.clip(np.searchsorted(self.Ts, t, side = 'right'), id_back, id_end) # kinks left of t: [id_back, id_t)
+        abs_sum = (t*(A[id_t] - A[id_back]) - (B[id_t] - B[id_back])) + \
+                  ((B[id_end] - B[id_t]) - t*(A[id_end] - A[id_t]))
+        return (self.FTs[id_back] + self.FTs[id_front] + self.slopes[id_back]*(t - self.Ts[id_back]) +
+                self.slopes[id_end]*(t - self.Ts[id_front]) + abs_sum)/2.0
+
+    def __call__(self, t : Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        '''
+            stateless evaluation (intervals are found by binary search), i.e. thread safe and cheap for arbitrary jumps
+            back in time (e.g. after rejected steps)
 
+            :param t: time point or array of time points
+            :return: profile value(s) of the same shape as t
+        '''
+        num_of_Ts = len(self.Ts)
+        if (self.horizon_diameter == 0.0) and not isinstance(t, np.ndarray): # single time point (e.g. residual calls)
+            if (num_of_Ts == 1) or (t <= self._Ts_list[0]): return self.FTs[0]
+            if t >= self._Ts_list[-1]: return self.FTs[-1]
+            j = bisect_right(self._Ts_list, t) - 1
             if (self.mode == "lin") or (self.offset > 0.0):
-                return self.FTs[j] + (t - tj)*self.slopes[i]
+                return self.FTs[j] + (t - self.Ts[j])*self.slopes[j + 1]
             return self.FTs[j]
+
+        ts = np.asarray(t, dtype = np.float64)
+
+        if num_of_Ts == 1:
+            values = np.full(ts.shape, self.FTs[0])
+        elif self.horizon_diameter == 0.0:
+            ts_clipped = np.clip(ts, self.Ts[0], self.Ts[-1]) # constant continuation beyond the table
+            j = np.searchsorted(self.Ts, ts_clipped, side = 'right') - 1 # Ts[j] <= t < Ts[j + 1] (right continuous)
+            if (self.mode == "lin") or (self.offset > 0.0):
+                i = np.minimum(j + 1, num_of_Ts - 1)
+                values = self.FTs[j] + (ts_clipped - self.Ts[j])*self.slopes[i]
+            else: values = self.FTs[j]
         else:
-            if self.debug_t is None:
-                t_base = t
-            else:
-                t_base = self.debug_t
+            t_base = ts if self.debug_t is None else np.full(ts.shape, self.debug_t)
 
             t_back = t_base + self.horizon[0]
-            if t_back < self.Ts[self.last_t_horizon_back_id]:
-                if t_back < self.Ts[0]:
-                    j, i = 0, 1
-                else:
-                    j, _, i, _ = self._search_t_and_id(0, t_back)
-                self.last_t_horizon_back_id = i
-            else:
-                if t_back > self.Ts[-1]:
-                    i = len(self.Ts) - 1
-                    j = i - 1
-                else:
-                    j, _, i, _ = self._search_t_and_id(self.last_t_horizon_back_id, t_back)
-                self.last_t_horizon_back_id = j
-            id_back = j
+            id_back = np.clip(np.searchsorted(self.Ts, t_back, side = 'right') - 1, 0, num_of_Ts - 1)
+            id_back = np.where(t_back > self.Ts[-1], num_of_Ts - 2, id_back)
 
             t_front = t_base + self.horizon[1]
-            if t_front < self.Ts[self.last_t_horizon_front_id]:
-                if t_front < self.Ts[0]:
-                    j, i = 0, 1
-                else:
-                    j, _, i, _ = self._search_t_and_id(0, t_front)
-                self.last_t_horizon_front_id = i
-            else:
-                if t_front > self.Ts[-1]:
-                    i = len(self.Ts) - 1
-                    j = i - 1
-                else:
-                    j, _, i, _ = self._search_t_and_id(self.last_t_horizon_front_id, t_front)
-                self.last_t_horizon_front_id = j
-            id_front = i
-
-            return self._closed_form_table_look_up_algorithm(t,
-                                                             self.Ts[id_back : id_front + 1],
-                                                             self.slopes[id_back : id_front + 2],
-                                                             self.FTs[id_back], self.FTs[id_front])
+            id_front = np.clip(np.searchsorted(self.Ts, t_front, side = 'right'), 1, num_of_Ts - 1)
+
+            values = self._closed_form_table_look_up_algorithm(ts, id_back, id_front)
+
+        return values if ts.ndim else values[()]
+
+
+class profile_bank(object):
+
+    def __init__(self, profiles : Dict[Hashable, Callable[[float], float]]):
+        '''
+            all profiles packed into concatenated arrays (time points, values and right sided slopes) with offsets per
+            profile, such that the values of all of them are obtained for a time point in one vectorized pass.
+            Profiles which can't be packed (table_lookups with horizon or arbitrary callables) are evaluated one by one
+            and only if requested.
+
+            :param profiles: profiles by key (e.g. (element name, attribute name)) in the order of the value vector
+        '''
+        self.keys = list(profiles.keys())
+        self.profiles = list(profiles.values())
+        self.index : Dict[Hashable, int] = {key: idx for idx, key in enumerate(self.keys)}
+
+        self.packed = np.array([isinstance(profile, table_lookup) and (profile.horizon_diameter == 0.0)
+                                for profile in self.profiles], dtype = bool)
+        self.packed_ids = np.flatnonzero(self.packed)
+        packed_profiles : List[table_lookup] = [self.profiles[idx] for idx in self.packed_ids]
+
+        lengths = np.array([len(profile.Ts) for profile in packed_profiles], dtype = np.intp)
+        self.offsets = np.cumsum(lengths) - lengths
+        self.lasts = self.offsets + lengths - 1
+
+        def right_slopes(profile : table_lookup) -> np.ndarray: # slope of [Ts[j], Ts[j + 1]] at j; zero at the end
+            if (profile.mode == "lin") or (profile.offset > 0.0): return profile.slopes[1:]
+            return np.zeros(shape = (len(profile.Ts),)) # i.e. piecewise constant
+
+        concatenate = lambda arrays: np.concatenate(arrays).astype(np.float64) if arrays else np.zeros(shape = (0,))
+        self.Ts = concatenate([profile.Ts for profile in packed_profiles])
+        self.FTs = concatenate([profile.FTs for profile in packed_profiles])
+        self.slopes = concatenate([right_slopes(profile) for profile in packed_profiles])
+        self.Ts_first, self.Ts_last = self.Ts[self.offsets], self.Ts[self.lasts]
+
+        self._cache : Tuple[Optional[float], Optional[np.ndarray]] = (None, None) # (t, values) of the latest call
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def _packed_values(self, t : float) -> np.ndarray:
+        cached_t, values = self._cache
+        if (values is None) or (t != cached_t):
+            values = np.full(shape = (len(self.profiles),), fill_value = np.nan)
+            if len(self.packed_ids):
+                num_of_passed = np.add.reduceat(self.Ts <= t, self.offsets, dtype = np.intp) # per profile
+                j = np.maximum(self.offsets + num_of_passed - 1, self.offsets) # Ts[j] <= t < Ts[j + 1]
+                t_clipped = np.clip(t, self.Ts_first, self.Ts_last) # constant continuation beyond the tables
+                values[self.packed_ids] = self.FTs[j] + (t_clipped - self.Ts[j])*self.slopes[j]
+            self._cache = (t, values)
+        return values
+
+    def __call__(self, t : float, ids : Optional[np.ndarray] = None) -> np.ndarray:
+        '''
+            :param t: time point
+            :param ids: (optional) positions of the requested profiles; defaults to all
+            :return: array of the profile values
+        '''
+        values = self._packed_values(t)
+        if ids is None: ids = np.arange(len(self.profiles))
+
+        result = values[ids]
+        for pos in np.flatnonzero(~self.packed[ids]):
+            result[pos] = self.profiles[ids[pos]](t)
+        return result
 
 
 default_io = table_lookup([0.0], [1.0]) # i.e. will always return 1.0